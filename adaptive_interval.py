@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+from logger_configurator import LoggerConfigurator
+from collections import deque
+import math
+import os
+
+
+class AdaptiveInterval:
+    """Sampling interval of a sensor whose values often stay flat for hours. The
+    interval grows by INCREASE_FACTOR after each sample while the standard
+    deviation of the last WINDOW samples of every field stays within half its
+    tolerance, up to max_interval_sec. It drops back to min_interval_sec at once
+    when a sample differs from the mean of the window by more than the
+    tolerance, so that a change is followed at full rate from its first sample.
+
+    The tolerance of a field is (absolute, relative): the largest of the
+    absolute value and of the relative one times the mean of the window, e.g.
+    (1.0, 0.05) for a light level, which is noisier when brighter.
+
+    Enabled for all the sensors supporting it with AQ_ADAPTIVE_SAMPLING=on,
+    their intervals can be overridden with a list of <name>=<min>:<max> in
+    seconds instead, e.g. LightSensor=3:120,RadonSensor=300:540.
+    The dashboard reports as missing the data older than 10 minutes."""
+    WINDOW = 10
+    INCREASE_FACTOR = 1.5
+
+    def __init__(self, name, min_interval_sec, max_interval_sec, tolerances):
+        if not 0 < min_interval_sec <= max_interval_sec:
+            raise ValueError(f"Invalid sampling intervals of {name}: {min_interval_sec} to {max_interval_sec} sec.")
+        self._logger = LoggerConfigurator.configure_logger(self.__class__.__name__)
+        self._name = name
+        self.min_interval_sec = min_interval_sec
+        self.max_interval_sec = max_interval_sec
+        self._tolerances = tolerances
+        self._windows = {field: deque(maxlen=self.WINDOW) for field in tolerances}
+        self.interval_sec = min_interval_sec
+        self._change_count = 0
+
+    @classmethod
+    def configured(cls, name, min_interval_sec, max_interval_sec, tolerances):
+        """The AdaptiveInterval of the sensor name as set by AQ_ADAPTIVE_SAMPLING, None when disabled"""
+        value = os.environ.get("AQ_ADAPTIVE_SAMPLING", "off").strip()
+        if value.lower() in ("off", "false", "0", ""):
+            return None
+        if value.lower() not in ("on", "true", "1"):
+            intervals = {}
+            for entry in value.split(","):
+                try:
+                    sensor, interval_range = entry.split("=")
+                    low, high = interval_range.split(":")
+                    intervals[sensor.strip()] = (float(low), float(high))
+                except ValueError:
+                    raise ValueError(f"Invalid AQ_ADAPTIVE_SAMPLING entry '{entry}', expected <name>=<min>:<max>")
+            if name in intervals:
+                min_interval_sec, max_interval_sec = intervals[name]
+        if min_interval_sec == max_interval_sec:
+            return None
+        return cls(name, min_interval_sec, max_interval_sec, tolerances)
+
+    def _tolerance(self, field, mean):
+        absolute, relative = self._tolerances[field]
+        return max(absolute, relative * abs(mean))
+
+    def update(self, values):
+        """Interval until the next sample, given {field: value} of the last one, None values being ignored"""
+        changed = False
+        steady = True
+        for field, window in self._windows.items():
+            value = values.get(field)
+            if value is None:
+                continue
+            if window:
+                mean = sum(window) / len(window)
+                tolerance = self._tolerance(field, mean)
+                if abs(value - mean) > tolerance:
+                    changed = True
+                elif len(window) < self.WINDOW or \
+                        math.sqrt(sum((x - mean) ** 2 for x in window) / len(window)) > tolerance / 2:
+                    steady = False
+            else:
+                steady = False
+            window.append(value)
+        if changed:
+            # restart the window from the new level
+            for field, window in self._windows.items():
+                if values.get(field) is not None:
+                    window.clear()
+                    window.append(values[field])
+            if self.interval_sec > self.min_interval_sec:
+                self._change_count += 1
+                self._logger.info(f"{self._name}: change detected after {self.interval_sec:.0f} sec., "
+                                  f"sampling every {self.min_interval_sec} sec. again")
+            self.interval_sec = self.min_interval_sec
+        elif steady:
+            self.interval_sec = min(self.interval_sec * self.INCREASE_FACTOR, self.max_interval_sec)
+        return self.interval_sec
+
+    def get_statistics(self):
+        return {
+            "interval_sec": self.interval_sec,
+            "min_interval_sec": self.min_interval_sec,
+            "max_interval_sec": self.max_interval_sec,
+            "changes": self._change_count
+        }
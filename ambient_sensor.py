@@ -1,17 +1,24 @@
 #!/usr/bin/env python3
 
-from bosh_bme68x.ambient_monitor import AmbientMonitor
+from i2c_sensor import I2CSensor, SharedI2CBus
 from persistent_storage import PersistentStorage
-import time
-from constants import SLEEP_DURATION_SECONDS
 
 
-monitor = AmbientMonitor()
-persistent_storage = PersistentStorage()
+class AmbientSensor(I2CSensor):
+    """BME688 temperature, relative humidity, pressure, gas resistance and IAQ,
+    processed by the BSEC library. The library drives the device on its own
+    schedule, which the BSEC algorithm depends on, so the shared lock is not
+    taken for it."""
 
-while True:
-    data = monitor.get_data()
-    if data is not None:
+    def __init__(self, persistent_storage, bus: SharedI2CBus):
+        super().__init__(persistent_storage, bus)
+        from bosh_bme68x.ambient_monitor import AmbientMonitor
+        self._monitor = AmbientMonitor()
+
+    def sample(self):
+        data = self._monitor.get_data()
+        if data is None:
+            return False
         timestamp = data['timestamp']
         temperature = data['temperature']
         gas = data['gas']
@@ -19,7 +26,10 @@ while True:
         pressure = data['pressure']
         iaq = data['iaq']
         thom_discomfort_index = data['thom_discomfort_index']
-        persistent_storage.write_ambient_data(timestamp, temperature, gas, humidity, pressure, iaq, thom_discomfort_index)
+        self._storage.write_ambient_data(timestamp, temperature, gas, humidity, pressure, iaq, thom_discomfort_index)
+
+        print(f'{self._monitor.elapsed_time}, Temperature: {temperature:.1f} C, Humidity: {humidity:.1f} %, Pressure: {pressure:.1f} hPa, Gas: {gas} ohms, IAQ: {iaq:.1f}, Thom Discomfort Index: {thom_discomfort_index:.1f}', flush=True)
+
 
-        print(f'{monitor.elapsed_time}, Temperature: {temperature:.1f} C, Humidity: {humidity:.1f} %, Pressure: {pressure:.1f} hPa, Gas: {gas} ohms, IAQ: {iaq:.1f}, Thom Discomfort Index: {thom_discomfort_index:.1f}', flush=True)
-    time.sleep(SLEEP_DURATION_SECONDS)
+if __name__ == "__main__":
+    AmbientSensor(PersistentStorage(), SharedI2CBus()).run()
@@ -1,250 +1,456 @@
 #!/usr/bin/env python3
 
-from fastapi import FastAPI, WebSocket
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, WebSocket, HTTPException, Request
+from fastapi.responses import StreamingResponse, Response
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 import asyncio
+import json
+import math
+import time
+import pyarrow
 from persistent_storage import PersistentStorage
 from env_alert_notifier import EnvAlertNotifier
 from fastapi.websockets import WebSocketDisconnect
 from constants import SLEEP_DURATION_SECONDS, normalize_and_format_pandas_timestamp
 from logger_configurator import LoggerConfigurator
+from broadcast_hub import BroadcastHub
+from rollup_engine import RollupEngine
+from static_assets import StaticAssetCache
+from service_restart_supervisor import ServiceRestartSupervisor
+from prometheus_metrics import PrometheusMetrics
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One sampler queries the storage for all connected clients
+    sampler_task = asyncio.create_task(sampler())
+    supervisor_task = asyncio.create_task(supervisor.run())
+    rollups.start()
+    yield
+    sampler_task.cancel()
+    supervisor_task.cancel()
 
-# Serve static files (HTML, JS, CSS)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app = FastAPI(lifespan=lifespan)
+
+# Serve static files (HTML, JS, CSS) from memory
+assets = StaticAssetCache("static")
 
 # InfluxDB connection
 storage = PersistentStorage()
 
+# Rollups used by the history queries
+rollups = RollupEngine(storage)
+
 # Alert notifier
 notifier = EnvAlertNotifier()
 
+# Restarts the services of the sensors with missing data off the event loop
+supervisor = ServiceRestartSupervisor(notifier.report_service_restart)
+notifier.set_restart_handler(supervisor.request_restart)
+
+# Websocket broadcast hub
+hub = BroadcastHub(SLEEP_DURATION_SECONDS)
+
 # Logger
 logger = LoggerConfigurator.configure_logger("AqDashboard")
 
-@app.get("/", response_class=HTMLResponse)
-async def root():
-    with open("static/index.html", "r") as file:
-        return file.read()
+# Number of history points serialized at once when streaming
+HISTORY_CHUNK_POINTS = 500
+# continuation token followed by a zero message length
+ARROW_END_OF_STREAM = b"\xff\xff\xff\xff\x00\x00\x00\x00"
+
+# Pipeline timings exposed by /metrics
+query_latency = PrometheusMetrics.Histogram("aq_query_latency_seconds", "Latency of the latest snapshot queries")
+tick_duration = PrometheusMetrics.Histogram("aq_tick_duration_seconds", "Duration of a sampler tick, from the queries to the frames being queued")
+websocket_send_time = PrometheusMetrics.Histogram("aq_websocket_send_seconds", "Time to send a frame to a websocket client",
+                                                  buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0))
+
+# Without websocket clients the sampler keeps running that long after a scrape of /metrics
+METRICS_SAMPLING_HOLD_SEC = 5 * 60
+last_scrape = -METRICS_SAMPLING_HOLD_SEC
+metrics_scraped = asyncio.Event()
+
+@app.get("/")
+async def root(request: Request):
+    return assets.response("index.html", request)
+
+@app.get("/static/{path:path}")
+async def static(path: str, request: Request):
+    return assets.response(path, request)
+
+def finite_or_none(value):
+    """NaN, e.g. the mean of an empty bucket, and the infinities are not valid JSON"""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+def history_json_chunks(measurement, aggregate, bucket_seconds, table):
+    header = {
+        "measurement": measurement,
+        "aggregate": aggregate,
+        "bucket_seconds": bucket_seconds,
+        "fields": table.column_names[1:]
+    }
+    # points are [time in ms since epoch, field values...]
+    yield json.dumps(header)[:-1] + ', "points": ['
+    separator = ""
+    for batch in table.to_batches(max_chunksize=HISTORY_CHUNK_POINTS):
+        times = batch.column(0).cast(pyarrow.int64()).to_pylist()
+        values = [column.to_pylist() for column in batch.columns[1:]]
+        rows = [json.dumps([t] + [finite_or_none(v[i]) for v in values]) for i, t in enumerate(times)]
+        if rows:
+            yield separator + ",".join(rows)
+            separator = ","
+    yield "]}"
+
+def history_arrow_chunks(table):
+    # an Arrow IPC stream sent message by message: the schema, one message per batch, the end of stream marker
+    yield table.schema.serialize().to_pybytes()
+    for batch in table.to_batches(max_chunksize=HISTORY_CHUNK_POINTS):
+        yield batch.serialize().to_pybytes()
+    yield ARROW_END_OF_STREAM
+
+@app.get("/api/history/{measurement}")
+async def history(measurement: str, fields: str, start: Optional[datetime] = None, stop: Optional[datetime] = None,
+                  points: int = 1000, aggregate: str = "mean", format: str = "json"):
+    """Downsampled history of a comma separated list of fields of a measurement,
+    by default over the last day, the times without a time zone being UTC"""
+    if start is not None and start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if stop is not None and stop.tzinfo is None:
+        stop = stop.replace(tzinfo=timezone.utc)
+    if stop is None:
+        stop = datetime.now(timezone.utc)
+    if start is None:
+        start = stop - timedelta(days=1)
+    if start >= stop:
+        raise HTTPException(status_code=400, detail="The start of the time range must be before its stop")
+    if points <= 0:
+        raise HTTPException(status_code=400, detail="The number of points must be positive")
+    if format not in ("json", "arrow"):
+        raise HTTPException(status_code=400, detail=f"Unknown format '{format}', expected json or arrow")
+    try:
+        bucket_seconds, table = await storage.read_history_async(measurement, [f.strip() for f in fields.split(",") if f.strip()],
+                                                                 start, stop, points, aggregate, rollups)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error reading history of {measurement}: {e}")
+        raise HTTPException(status_code=503, detail="History not available")
+    if "arrow" == format:
+        return StreamingResponse(history_arrow_chunks(table), media_type="application/vnd.apache.arrow.stream")
+    return StreamingResponse(history_json_chunks(measurement, aggregate, bucket_seconds, table), media_type="application/json")
+
+def epoch_seconds(timestamp):
+    # the stored timestamps are naive UTC
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics, computed from the last snapshot read by the sampler
+    without querying the databases"""
+    global last_scrape
+    last_scrape = time.monotonic()
+    metrics_scraped.set()
+    now = time.time()
+    values = []
+    ages = []
+    snapshot_age = []
+    latest = storage.get_latest_snapshot()
+    if latest is not None:
+        read_time, snapshot = latest
+        snapshot_age.append(({}, now - read_time))
+        for db, records in snapshot.items():
+            for measurement, record in sorted(records.items()):
+                labels = {"database": db.value, "measurement": measurement}
+                if record.get("time") is not None:
+                    ages.append((labels, now - epoch_seconds(record["time"])))
+                for field, value in sorted(record.items()):
+                    # bool is an int, the tags and the strings are not exported
+                    if "time" != field and isinstance(value, (int, float)):
+                        values.append((labels | {"field": field}, value))
+    lines = PrometheusMetrics.render_family("aq_measurement_value", "gauge", "Latest value of each measurement field", values)
+    lines += PrometheusMetrics.render_family("aq_measurement_age_seconds", "gauge", "Age of the latest record of each measurement", ages)
+    lines += PrometheusMetrics.render_family("aq_snapshot_age_seconds", "gauge", "Time since the latest snapshot was read", snapshot_age)
+    lines += query_latency.render()
+    lines += tick_duration.render()
+    lines += websocket_send_time.render()
+    lines += storage.instrumentation.render()
+    lines += PrometheusMetrics.render_family("aq_websocket_clients", "gauge", "Connected websocket clients", [({}, hub.subscriber_count)])
+    alert_counts = [({"parameter": parameter, "type": alert_type}, count)
+                    for (parameter, alert_type), count in sorted(notifier.get_alert_counts().items())]
+    lines += PrometheusMetrics.render_family("aq_alerts_total", "counter", "Alerts sent since the start by parameter and type", alert_counts)
+    lines += PrometheusMetrics.render_family("aq_active_alerts", "gauge", "Alerts currently shown", [({}, notifier.get_active_alert_count())])
+    return Response(content="\n".join(lines) + "\n", media_type=PrometheusMetrics.CONTENT_TYPE)
+
+def sample_payload(latest):
+    # Latest data queried from InfluxDB
+    # AQI
+    is_data_missing = True
+    aqi_data = latest["aqi"]
+    if aqi_data is not None:
+        try:
+            ts = normalize_and_format_pandas_timestamp(aqi_data["time"])
+            payload = {
+                "timestamp": ts,
+                "aqi": aqi_data["pm25_cf1_aqi"]
+            }
+            notifier.check_thresholds_and_alert("aqi", aqi_data["pm25_cf1_aqi"], ts, aqi_data["time"])
+            is_data_missing = False
+        except Exception as e:
+            logger.error(f"Error processing AQI data: {e}")
+    if is_data_missing:
+        payload = {}
+        notifier.send_missing_data_alert_if_due("aqi")
+    for i in range(2):
+        pm_data = latest["pm_" + str(i)]
+        if pm_data is not None:
+            try:
+                payload = payload | {
+                    "pm10_" + str(i): pm_data["pm10_cf1"],
+                    "pm25_" + str(i): pm_data["pm25_cf1"],
+                    "pm100_" + str(i): pm_data["pm100_cf1"],
+                    "pm03plus_" + str(i): pm_data["gr03um"],
+                    "pm05plus_" + str(i): pm_data["gr05um"],
+                    "pm10plus_" + str(i): pm_data["gr10um"],
+                    "pm25plus_" + str(i): pm_data["gr25um"],
+                    "pm50plus_" + str(i): pm_data["gr50um"],
+                    "pm100plus_" + str(i): pm_data["gr100um"]
+                }
+            except KeyError as e:
+                logger.error(f"KeyError processing PM{i} data: {e}")
+    # Noise
+    is_data_missing = True
+    noise_level_db = latest["sound"]
+    if noise_level_db is not None:
+        try:
+            ts = normalize_and_format_pandas_timestamp(noise_level_db["time"])
+            payload = payload | {
+                "noise": noise_level_db["sound_pressure_level"]
+            }
+            notifier.check_thresholds_and_alert("noise", noise_level_db["sound_pressure_level"], ts, noise_level_db["time"])
+            is_data_missing = False
+        except Exception as e:
+            logger.error(f"Error processing noise data: {e}")
+    if is_data_missing:
+        notifier.send_missing_data_alert_if_due("noise")
+    # Ambient
+    is_data_missing = True
+    ambient_data = latest["ambient"]
+    if ambient_data is not None:
+        try:
+            ts = normalize_and_format_pandas_timestamp(ambient_data["time"])
+            payload = payload | {
+                "temperature": ambient_data["temperature"],
+                "relative_humidity": ambient_data["relative_humidity"],
+                "pressure": ambient_data["pressure"]
+            }
+            notifier.check_thresholds_and_alert("temperature", ambient_data["temperature"], ts, ambient_data["time"])
+            notifier.check_thresholds_and_alert("relative_humidity", ambient_data["relative_humidity"], ts, ambient_data["time"])
+            notifier.check_thresholds_and_alert("pressure", ambient_data["pressure"], ts, ambient_data["time"])
+            if ambient_data.get("thom_discomfort_index") is not None:
+                payload = payload | {"thom_discomfort_index": ambient_data["thom_discomfort_index"]}
+                notifier.check_thresholds_and_alert("thom_discomfort_index", ambient_data["thom_discomfort_index"], ts, ambient_data["time"])
+            is_data_missing = False
+        except Exception as e:
+            logger.error(f"Error processing ambient data: {e}")
+    if is_data_missing:
+        if notifier.send_missing_data_alert_if_due("temperature, relative_humidity, gas, iaq_index, thom_discomfort_index"):
+            notifier.remove_data_alert("temperature")
+            notifier.remove_data_alert("relative_humidity")
+            notifier.remove_data_alert("pressure")
+            notifier.remove_data_alert("thom_discomfort_index")
+    else:
+        notifier.remove_data_alert("temperature, relative_humidity, gas, iaq_index, thom_discomfort_index")
+    # Light
+    is_data_missing = True
+    light_data = latest["light"]
+    if light_data is not None:
+        try:
+            ts = normalize_and_format_pandas_timestamp(light_data["time"])
+            payload = payload | {
+                "visible_light_lux": light_data["visible_light_lux"],
+                "uv_index": light_data["uv_index"]
+            }
+            notifier.check_thresholds_and_alert("visible_light", light_data["visible_light_lux"], ts, light_data["time"])
+            is_data_missing = False
+        except Exception as e:
+            logger.error(f"Error processing light data: {e}")
+    if is_data_missing:
+        notifier.send_missing_data_alert_if_due("visible_light")
+    # CO2
+    is_data_missing = True
+    co2_data = latest["co2"]
+    if co2_data is not None:
+        try:
+            ts = normalize_and_format_pandas_timestamp(co2_data["time"])
+            payload = payload | {
+                "co2": co2_data["co2"]
+            }
+            notifier.check_thresholds_and_alert("co2", co2_data["co2"], ts, co2_data["time"])
+            is_data_missing = False
+        except Exception as e:
+            logger.error(f"Error processing CO2 data: {e}")
+    if is_data_missing:
+        notifier.send_missing_data_alert_if_due("co2")
+    # VOC and NOx
+    is_data_missing = True
+    sgp41_data = latest["sgp41"]
+    if sgp41_data is not None:
+        try:
+            ts = normalize_and_format_pandas_timestamp(sgp41_data["time"])
+            payload = payload | {
+                "voc": sgp41_data["voc_index"],
+                "nox": sgp41_data["nox_index"]
+            }
+            notifier.check_thresholds_and_alert("voc_index", sgp41_data["voc_index"], ts, sgp41_data["time"])
+            notifier.check_thresholds_and_alert("nox_index", sgp41_data["nox_index"], ts, sgp41_data["time"])
+            is_data_missing = False
+        except Exception as e:
+            logger.error(f"Error processing SGP41 data: {e}")
+    if is_data_missing:
+        if notifier.send_missing_data_alert_if_due("voc_index, nox_index"):
+            notifier.remove_data_alert("voc_index")
+            notifier.remove_data_alert("nox_index")
+    else:
+        notifier.remove_data_alert("voc_index, nox_index")
+    # Radon
+    is_data_missing = True
+    radon_data = latest["radon"]
+    if radon_data is not None:
+        try:
+            ts = normalize_and_format_pandas_timestamp(radon_data["time"])
+            payload = payload | {
+                "radon_1day_avg": radon_data["radon_1day_avg"],
+                "radon_week_avg": radon_data["radon_week_avg"],
+                "radon_year_avg": radon_data["radon_year_avg"]
+            }
+            notifier.check_thresholds_and_alert("radon_1day_avg", radon_data["radon_1day_avg"], ts, radon_data["time"])
+            notifier.check_thresholds_and_alert("radon_week_avg", radon_data["radon_week_avg"], ts, radon_data["time"])
+            notifier.check_thresholds_and_alert("radon_year_avg", radon_data["radon_year_avg"], ts, radon_data["time"])
+            is_data_missing = False
+        except Exception as e:
+            logger.error(f"Error processing radon data: {e}")
+    if is_data_missing:
+        if notifier.send_missing_data_alert_if_due("radon_data"):
+            notifier.remove_data_alert("radon_1day_avg")
+            notifier.remove_data_alert("radon_week_avg")
+            notifier.remove_data_alert("radon_year_avg")
+    else:
+        notifier.remove_data_alert("radon_data")
+    # O3 and NO2
+    is_data_missing = True
+    zmod4510_data = latest["zmod4510"]
+    if zmod4510_data is not None:
+        try:
+            ts = normalize_and_format_pandas_timestamp(zmod4510_data["time"])
+            payload = payload | {
+                "o3": zmod4510_data["o3_ppb"],
+                "no2": zmod4510_data["no2_ppb"]
+            }
+            notifier.check_thresholds_and_alert("o3", zmod4510_data["o3_ppb"], ts, zmod4510_data["time"])
+            notifier.check_thresholds_and_alert("no2", zmod4510_data["no2_ppb"], ts, zmod4510_data["time"])
+            is_data_missing = False
+        except Exception as e:
+            logger.error(f"Error processing ZMOD4510 data: {e}")
+    if is_data_missing:
+        if notifier.send_missing_data_alert_if_due("o3, no2"):
+            notifier.remove_data_alert("o3")
+            notifier.remove_data_alert("no2")
+    else:
+        notifier.remove_data_alert("o3, no2")
+    # CO
+    is_data_missing = True
+    co_data = latest["co"]
+    if co_data is not None:
+        try:
+            ts = normalize_and_format_pandas_timestamp(co_data["time"])
+            payload = payload | {
+                "co": co_data["co_ppm"]
+            }
+            notifier.check_thresholds_and_alert("co", co_data["co_ppm"], ts, co_data["time"])
+            is_data_missing = False
+        except Exception as e:
+            logger.error(f"Error processing CO data: {e}")
+    if is_data_missing:
+        notifier.send_missing_data_alert_if_due("co")
+    return payload
+
+async def wait_for_consumers():
+    """Wait until a websocket client is connected or /metrics was recently scraped"""
+    if hub.subscriber_count or time.monotonic() - last_scrape < METRICS_SAMPLING_HOLD_SEC:
+        return
+    metrics_scraped.clear()
+    waiters = [asyncio.create_task(hub.wait_for_subscribers()), asyncio.create_task(metrics_scraped.wait())]
+    try:
+        await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for waiter in waiters:
+            waiter.cancel()
+
+async def sampler():
+    while True:
+        await wait_for_consumers()
+        try:
+            tick_start = time.perf_counter()
+            latest = await storage.read_latest_async()
+            query_latency.observe(time.perf_counter() - tick_start)
+            hub.publish(sample_payload(latest), notifier.get_notifications())
+            tick_duration.observe(time.perf_counter() - tick_start)
+        except Exception as e:
+            logger.error(f"Error sampling data: {e}")
+        # Wait before sending next update
+        await asyncio.sleep(SLEEP_DURATION_SECONDS)
+
+async def send_frames(websocket: WebSocket, queue):
+    try:
+        while True:
+            for frame in await queue.get():
+                send_start = time.perf_counter()
+                if isinstance(frame, bytes):
+                    await websocket.send_bytes(frame)
+                else:
+                    await websocket.send_text(frame)
+                websocket_send_time.observe(time.perf_counter() - send_start)
+    except (WebSocketDisconnect, RuntimeError):
+        # the client is gone, the receiving side cleans up
+        pass
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
+    try:
+        mode = BroadcastHub.Mode(websocket.query_params.get("mode", BroadcastHub.Mode.Full.value))
+    except ValueError:
+        logger.warning(f"Unknown protocol mode {websocket.query_params.get('mode')}, using full frames")
+        mode = BroadcastHub.Mode.Full
+    queue = hub.subscribe(mode)
+    sender = asyncio.create_task(send_frames(websocket, queue))
     try:
         while True:
-            # Query latest data from InfluxDB
-            # AQI
-            is_data_missing = True
-            aqi_data = storage.read_aqi()
-            if aqi_data is not None:
-                try:
-                    ts = normalize_and_format_pandas_timestamp(aqi_data["time"])
-                    payload = {
-                        "timestamp": ts,
-                        "aqi": aqi_data["pm25_cf1_aqi"]
-                    }
-                    notifier.check_thresholds_and_alert("aqi", aqi_data["pm25_cf1_aqi"], ts, aqi_data["time"])
-                    is_data_missing = False
-                except Exception as e:
-                    logger.error(f"Error processing AQI data: {e}")
-            if is_data_missing:
-                payload = {}
-                notifier.send_missing_data_alert_if_due("aqi")
-            for i in range(2):
-                pm_data = storage.read_pm(i)
-                if pm_data is not None:
-                    try:
-                        payload = payload | {
-                            "pm10_" + str(i): pm_data["pm10_cf1"],
-                            "pm25_" + str(i): pm_data["pm25_cf1"],
-                            "pm100_" + str(i): pm_data["pm100_cf1"],
-                            "pm03plus_" + str(i): pm_data["gr03um"],
-                            "pm05plus_" + str(i): pm_data["gr05um"],
-                            "pm10plus_" + str(i): pm_data["gr10um"],
-                            "pm25plus_" + str(i): pm_data["gr25um"],
-                            "pm50plus_" + str(i): pm_data["gr50um"],
-                            "pm100plus_" + str(i): pm_data["gr100um"]
-                        }
-                    except KeyError as e:
-                        logger.error(f"KeyError processing PM{i} data: {e}")
-            # Noise
-            is_data_missing = True
-            noise_level_db = storage.read_sound_pressure_level()
-            if noise_level_db is not None:
-                try:
-                    ts = normalize_and_format_pandas_timestamp(noise_level_db["time"])
-                    payload = payload | {
-                        "noise": noise_level_db["sound_pressure_level"]
-                    }
-                    notifier.check_thresholds_and_alert("noise", noise_level_db["sound_pressure_level"], ts, noise_level_db["time"])
-                    is_data_missing = False
-                except Exception as e:
-                    logger.error(f"Error processing noise data: {e}")
-            if is_data_missing:
-                notifier.send_missing_data_alert_if_due("noise")
-            # Ambient
-            is_data_missing = True
-            ambient_data = storage.read_ambient_data()
-            if ambient_data is not None:
-                try:
-                    ts = normalize_and_format_pandas_timestamp(ambient_data["time"])
-                    payload = payload | {
-                        "temperature": ambient_data["temperature"],
-                        "relative_humidity": ambient_data["relative_humidity"],
-                        "pressure": ambient_data["pressure"]
-                    }
-                    notifier.check_thresholds_and_alert("temperature", ambient_data["temperature"], ts, ambient_data["time"])
-                    notifier.check_thresholds_and_alert("relative_humidity", ambient_data["relative_humidity"], ts, ambient_data["time"])
-                    notifier.check_thresholds_and_alert("pressure", ambient_data["pressure"], ts, ambient_data["time"])
-                    if ambient_data.get("thom_discomfort_index") is not None:
-                        payload = payload | {"thom_discomfort_index": ambient_data["thom_discomfort_index"]}
-                        notifier.check_thresholds_and_alert("thom_discomfort_index", ambient_data["thom_discomfort_index"], ts, ambient_data["time"])
-                    is_data_missing = False
-                except Exception as e:
-                    logger.error(f"Error processing ambient data: {e}")
-            if is_data_missing:
-                if notifier.send_missing_data_alert_if_due("temperature, relative_humidity, gas, iaq_index, thom_discomfort_index"):
-                    notifier.remove_data_alert("temperature")
-                    notifier.remove_data_alert("relative_humidity")
-                    notifier.remove_data_alert("pressure")
-                    notifier.remove_data_alert("thom_discomfort_index")
-            else:
-                notifier.remove_data_alert("temperature, relative_humidity, gas, iaq_index, thom_discomfort_index")
-            # Light
-            is_data_missing = True
-            light_data = storage.read_light_data()
-            if light_data is not None:
-                try:
-                    ts = normalize_and_format_pandas_timestamp(light_data["time"])
-                    payload = payload | {
-                        "visible_light_lux": light_data["visible_light_lux"],
-                        "uv_index": light_data["uv_index"]
-                    }
-                    notifier.check_thresholds_and_alert("visible_light", light_data["visible_light_lux"], ts, light_data["time"])
-                    is_data_missing = False
-                except Exception as e:
-                    logger.error(f"Error processing light data: {e}")
-            if is_data_missing:
-                notifier.send_missing_data_alert_if_due("visible_light")
-            # CO2
-            is_data_missing = True
-            co2_data = storage.read_co2_data()
-            if co2_data is not None:
-                try:
-                    ts = normalize_and_format_pandas_timestamp(co2_data["time"])
-                    payload = payload | {
-                        "co2": co2_data["co2"]
-                    }
-                    notifier.check_thresholds_and_alert("co2", co2_data["co2"], ts, co2_data["time"])
-                    is_data_missing = False
-                except Exception as e:
-                    logger.error(f"Error processing CO2 data: {e}")
-            if is_data_missing:
-                notifier.send_missing_data_alert_if_due("co2")
-            # VOC and NOx
-            is_data_missing = True
-            sgp41_data = storage.read_sgp41_data()
-            if sgp41_data is not None:
-                try:
-                    ts = normalize_and_format_pandas_timestamp(sgp41_data["time"])
-                    payload = payload | {
-                        "voc": sgp41_data["voc_index"],
-                        "nox": sgp41_data["nox_index"]
-                    }
-                    notifier.check_thresholds_and_alert("voc_index", sgp41_data["voc_index"], ts, sgp41_data["time"])
-                    notifier.check_thresholds_and_alert("nox_index", sgp41_data["nox_index"], ts, sgp41_data["time"])
-                    is_data_missing = False
-                except Exception as e:
-                    logger.error(f"Error processing SGP41 data: {e}")
-            if is_data_missing:
-                if notifier.send_missing_data_alert_if_due("voc_index, nox_index"):
-                    notifier.remove_data_alert("voc_index")
-                    notifier.remove_data_alert("nox_index")
-            else:
-                notifier.remove_data_alert("voc_index, nox_index")
-            # Radon
-            is_data_missing = True
-            radon_data = storage.read_radon_data()
-            if radon_data is not None:
-                try:
-                    ts = normalize_and_format_pandas_timestamp(radon_data["time"])
-                    payload = payload | {
-                        "radon_1day_avg": radon_data["radon_1day_avg"],
-                        "radon_week_avg": radon_data["radon_week_avg"],
-                        "radon_year_avg": radon_data["radon_year_avg"]
-                    }
-                    notifier.check_thresholds_and_alert("radon_1day_avg", radon_data["radon_1day_avg"], ts, radon_data["time"])
-                    notifier.check_thresholds_and_alert("radon_week_avg", radon_data["radon_week_avg"], ts, radon_data["time"])
-                    notifier.check_thresholds_and_alert("radon_year_avg", radon_data["radon_year_avg"], ts, radon_data["time"])
-                    is_data_missing = False
-                except Exception as e:
-                    logger.error(f"Error processing radon data: {e}")
-            if is_data_missing:
-                if notifier.send_missing_data_alert_if_due("radon_data"):
-                    notifier.remove_data_alert("radon_1day_avg")
-                    notifier.remove_data_alert("radon_week_avg")
-                    notifier.remove_data_alert("radon_year_avg")
-            else:
-                notifier.remove_data_alert("radon_data")
-            # O3 and NO2
-            is_data_missing = True
-            zmod4510_data = storage.read_zmod4510_data()
-            if zmod4510_data is not None:
-                try:
-                    ts = normalize_and_format_pandas_timestamp(zmod4510_data["time"])
-                    payload = payload | {
-                        "o3": zmod4510_data["o3_ppb"],
-                        "no2": zmod4510_data["no2_ppb"]
-                    }
-                    notifier.check_thresholds_and_alert("o3", zmod4510_data["o3_ppb"], ts, zmod4510_data["time"])
-                    notifier.check_thresholds_and_alert("no2", zmod4510_data["no2_ppb"], ts, zmod4510_data["time"])
-                    is_data_missing = False
-                except Exception as e:
-                    logger.error(f"Error processing ZMOD4510 data: {e}")
-            if is_data_missing:
-                if notifier.send_missing_data_alert_if_due("o3, no2"):
-                    notifier.remove_data_alert("o3")
-                    notifier.remove_data_alert("no2")
-            else:
-                notifier.remove_data_alert("o3, no2")
-            # CO
-            is_data_missing = True
-            co_data = storage.read_co_data()
-            if co_data is not None:
-                try:
-                    ts = normalize_and_format_pandas_timestamp(co_data["time"])
-                    payload = payload | {
-                        "co": co_data["co_ppm"]
-                    }
-                    notifier.check_thresholds_and_alert("co", co_data["co_ppm"], ts, co_data["time"])
-                    is_data_missing = False
-                except Exception as e:
-                    logger.error(f"Error processing CO data: {e}")
-            if is_data_missing:
-                notifier.send_missing_data_alert_if_due("co")
-            # Send data to client
-            data = {
-                "type": "data",
-                "payload": payload
-            }
-            await websocket.send_json(data)
-            # Send notifications
-            payload = notifier.get_notifications()
-            if payload:
-                data = {
-                    "type": "notification",
-                    "payload": payload
-                }
-                await websocket.send_json(data)
-            # Wait before sending next update
-            await asyncio.sleep(SLEEP_DURATION_SECONDS)
+            # {"type": "subscribe", "groups": ["co2", "aqi"], "interval": 10, "mode": "delta"},
+            # the missing keys mean all groups, every tick and the current mode
+            message = await websocket.receive_text()
+            try:
+                request = json.loads(message)
+                if "subscribe" == request.get("type"):
+                    mode = BroadcastHub.Mode(request.get("mode", mode.value))
+                    hub.resubscribe(queue, mode, request.get("groups"), request.get("interval"))
+                else:
+                    logger.warning(f"Unknown websocket message type {request.get('type')}")
+            except (ValueError, TypeError, AttributeError) as e:
+                logger.warning(f"Invalid websocket message {message}: {e}")
     except WebSocketDisconnect:
         print("Client disconnected")
-
+    finally:
+        sender.cancel()
+        hub.unsubscribe(queue)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="127.0.0.1", port=8888)
+    # permessage-deflate is negotiated with the browsers for the websocket frames
+    uvicorn.run(app, host="127.0.0.1", port=8888, ws_per_message_deflate=True)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+from collections import deque
+from logger_configurator import LoggerConfigurator
+import threading
+import time
+
+
+class BatchWriter:
+    """Queues records and writes them from a background thread, grouped by
+    database, when MAX_BATCH_RECORDS are pending for a database or when its
+    oldest pending record is MAX_BATCH_AGE_SEC old. enqueue() never blocks:
+    beyond MAX_QUEUE_RECORDS the oldest records are dropped and counted. A
+    failed batch is put back in front of the queue and retried after
+    RETRY_INTERVAL_SEC. A batch is taken from its queue and written under a
+    single lock, so that the records of a database are written in order
+    whether by the background thread or by flush()."""
+    MAX_BATCH_RECORDS = 500
+    MAX_BATCH_AGE_SEC = 5
+    MAX_QUEUE_RECORDS = 100000
+    RETRY_INTERVAL_SEC = 5
+
+    def __init__(self, write_records, max_batch_records=MAX_BATCH_RECORDS, max_batch_age_sec=MAX_BATCH_AGE_SEC,
+                 max_queue_records=MAX_QUEUE_RECORDS):
+        """write_records(database, records) writes a batch with a single request"""
+        self._logger = LoggerConfigurator.configure_logger(self.__class__.__name__)
+        self._write_records = write_records
+        self._max_batch_records = max_batch_records
+        self._max_batch_age_sec = max_batch_age_sec
+        self._max_queue_records = max_queue_records
+        self._condition = threading.Condition()
+        # held from taking a batch to writing it, so that the records of a database are written in order
+        self._write_lock = threading.Lock()
+        self._queues = {}      # database: deque of records
+        self._oldest = {}      # database: monotonic time the oldest queued record was enqueued
+        self._retry_after = {} # database: monotonic time before which a failed database is not retried
+        self._queue_depth = 0
+        self._written_count = 0
+        self._dropped_count = 0
+        self._failed_batch_count = 0
+        self._closed = False
+        self._thread = None
+
+    def enqueue(self, database, record):
+        """Queue a record, False if the writer is closed and the record was not queued"""
+        with self._condition:
+            if self._closed:
+                return False
+            queue = self._queues.setdefault(database, deque())
+            if not queue:
+                self._oldest[database] = time.monotonic()
+            queue.append(record)
+            self._queue_depth += 1
+            if self._queue_depth > self._max_queue_records:
+                self._drop_oldest()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            if len(queue) >= self._max_batch_records:
+                self._condition.notify()
+        return True
+
+    def _drop_oldest(self):
+        # called with the condition held, drops from the largest backlog
+        database = max(self._queues, key=lambda k: len(self._queues[k]))
+        self._queues[database].popleft()
+        self._queue_depth -= 1
+        self._dropped_count += 1
+        if 1 == self._dropped_count or 0 == self._dropped_count % 1000:
+            self._logger.error(f"Write queue full, {self._dropped_count} records dropped")
+
+    def _take_batch(self, database):
+        # called with the condition held
+        queue = self._queues[database]
+        batch = [queue.popleft() for _ in range(min(len(queue), self._max_batch_records))]
+        self._queue_depth -= len(batch)
+        if queue:
+            self._oldest[database] = time.monotonic()
+        return batch
+
+    def _write_batch(self, database, batch):
+        """True if written, otherwise the batch is queued again"""
+        try:
+            self._write_records(database, batch)
+        except Exception as e:
+            self._logger.error(f"Cannot write {len(batch)} records to {database}, retrying in {self.RETRY_INTERVAL_SEC} s: {e}")
+            with self._condition:
+                self._failed_batch_count += 1
+                queue = self._queues[database]
+                if not queue:
+                    self._oldest[database] = time.monotonic()
+                queue.extendleft(reversed(batch))
+                self._queue_depth += len(batch)
+                while self._queue_depth > self._max_queue_records:
+                    self._drop_oldest()
+                self._retry_after[database] = time.monotonic() + self.RETRY_INTERVAL_SEC
+            return False
+        with self._condition:
+            self._written_count += len(batch)
+        return True
+
+    def _due_database(self):
+        """(database due to be written, None) or (None, seconds until the next one is due)"""
+        now = time.monotonic()
+        wait = self._max_batch_age_sec
+        for database, queue in self._queues.items():
+            if not queue:
+                continue
+            due = max(self._oldest[database] + self._max_batch_age_sec, self._retry_after.get(database, 0))
+            if len(queue) >= self._max_batch_records and self._retry_after.get(database, 0) <= now:
+                due = now
+            if due <= now:
+                return database, None
+            wait = min(wait, due - now)
+        return None, wait
+
+    def _run(self):
+        while True:
+            with self._condition:
+                database, wait = self._due_database()
+                while database is None:
+                    if self._closed:
+                        return
+                    self._condition.wait(wait)
+                    database, wait = self._due_database()
+            with self._write_lock:
+                with self._condition:
+                    # flush() may have written the queue meanwhile
+                    if not self._queues[database]:
+                        continue
+                    batch = self._take_batch(database)
+                self._write_batch(database, batch)
+
+    def flush(self):
+        """Write all the queued records now, False if some could not be written"""
+        written = True
+        with self._write_lock:
+            for database in list(self._queues):
+                while True:
+                    with self._condition:
+                        if not self._queues[database]:
+                            break
+                        batch = self._take_batch(database)
+                    if not self._write_batch(database, batch):
+                        written = False
+                        break
+        return written
+
+    def close(self):
+        """Stop queuing, write the queued records and stop the background thread"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        written = self.flush()
+        if self._thread is not None:
+            self._thread.join()
+        return written
+
+    def get_statistics(self):
+        with self._condition:
+            return {
+                "queue_depth": self._queue_depth,
+                "written": self._written_count,
+                "dropped": self._dropped_count,
+                "failed_batches": self._failed_batch_count
+            }
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+import math
+import struct
+
+
+class BinaryFrameCodec:
+    """Packs dashboard payloads into fixed layout binary frames. The client
+    receives the field table once (schema message) and afterwards each frame
+    only carries field ids as bitmaps followed by the packed values:
+
+        uint8   frame kind (KEYFRAME or DELTA)
+        uint8   codec version
+        uint16  number of fields in the schema
+        bitmap  fields present in the frame
+        bitmap  fields removed since the previous frame (deltas only)
+        values  float64 per present number field, uint16 length + UTF-8 bytes
+                per present text field, in field id order
+
+    All integers and floats are little endian, missing values are NaN."""
+    VERSION = 1
+    KEYFRAME = 1
+    DELTA = 2
+
+    # (name, unit, kind), the position in the table is the field id
+    FIELDS = (
+        ("timestamp", "", "text"),
+        ("aqi", "", "number"),
+        ("pm10_0", "µg/m³", "number"),
+        ("pm25_0", "µg/m³", "number"),
+        ("pm100_0", "µg/m³", "number"),
+        ("pm03plus_0", "", "number"),
+        ("pm05plus_0", "", "number"),
+        ("pm10plus_0", "", "number"),
+        ("pm25plus_0", "", "number"),
+        ("pm50plus_0", "", "number"),
+        ("pm100plus_0", "", "number"),
+        ("pm10_1", "µg/m³", "number"),
+        ("pm25_1", "µg/m³", "number"),
+        ("pm100_1", "µg/m³", "number"),
+        ("pm03plus_1", "", "number"),
+        ("pm05plus_1", "", "number"),
+        ("pm10plus_1", "", "number"),
+        ("pm25plus_1", "", "number"),
+        ("pm50plus_1", "", "number"),
+        ("pm100plus_1", "", "number"),
+        ("noise", "dB", "number"),
+        ("temperature", "°C", "number"),
+        ("relative_humidity", "%", "number"),
+        ("pressure", "hPa", "number"),
+        ("thom_discomfort_index", "°C", "number"),
+        ("visible_light_lux", "lux", "number"),
+        ("uv_index", "", "number"),
+        ("co2", "ppm", "number"),
+        ("voc", "", "number"),
+        ("nox", "", "number"),
+        ("radon_1day_avg", "Bq/m³", "number"),
+        ("radon_week_avg", "Bq/m³", "number"),
+        ("radon_year_avg", "Bq/m³", "number"),
+        ("o3", "ppb", "number"),
+        ("no2", "ppb", "number"),
+        ("co", "ppm", "number")
+    )
+
+    _ids = {name: i for i, (name, _, _) in enumerate(FIELDS)}
+    _bitmap_size = (len(FIELDS) + 7) // 8
+    _header = struct.Struct("<BBH")
+    _number = struct.Struct("<d")
+    _text_length = struct.Struct("<H")
+
+    @classmethod
+    def schema(cls):
+        return {
+            "type": "schema",
+            "version": cls.VERSION,
+            "fields": [
+                {"id": i, "name": name, "unit": unit, "kind": kind}
+                for i, (name, unit, kind) in enumerate(cls.FIELDS)
+            ]
+        }
+
+    @classmethod
+    def _pack_value(cls, kind, value):
+        if "text" == kind:
+            data = str(value).encode("utf-8") if value is not None else b""
+            return cls._text_length.pack(len(data)) + data
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            number = math.nan
+        return cls._number.pack(number)
+
+    @classmethod
+    def encode(cls, frame_kind, values, removed=()):
+        present_bitmap = bytearray(cls._bitmap_size)
+        removed_bitmap = bytearray(cls._bitmap_size)
+        for name in removed:
+            i = cls._ids.get(name)
+            if i is not None:
+                removed_bitmap[i >> 3] |= 1 << (i & 7)
+        # fields unknown to the schema are not sent, the client could not name them
+        ids = sorted(cls._ids[name] for name in values if name in cls._ids)
+        body = []
+        for i in ids:
+            present_bitmap[i >> 3] |= 1 << (i & 7)
+            name, _, kind = cls.FIELDS[i]
+            body.append(cls._pack_value(kind, values[name]))
+        header = cls._header.pack(frame_kind, cls.VERSION, len(cls.FIELDS))
+        return b"".join([header, bytes(present_bitmap), bytes(removed_bitmap)] + body)
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+
+import asyncio
+import json
+import math
+from enum import Enum
+from logger_configurator import LoggerConfigurator
+from binary_frame_codec import BinaryFrameCodec
+
+
+class BroadcastHub:
+    """Fans out the snapshot built once per tick by the sampler to every
+    connected websocket, so that the number of clients does not change the
+    number of storage queries. Subscribers asking for the same protocol mode,
+    field groups and update interval share a stream, whose frames are
+    serialized once per due tick for all of them."""
+    SUBSCRIBER_QUEUE_SIZE = 2
+    # delta and binary streams send a full frame every that many frames
+    KEYFRAME_INTERVAL_FRAMES = 20
+
+    # payload fields of each group a client can subscribe to
+    FIELD_GROUPS = {
+        "aqi": ("aqi",),
+        "pm": tuple(f"{prefix}_{i}" for i in range(2) for prefix in (
+            "pm10", "pm25", "pm100", "pm03plus", "pm05plus", "pm10plus", "pm25plus", "pm50plus", "pm100plus")),
+        "noise": ("noise",),
+        "ambient": ("temperature", "relative_humidity", "pressure", "thom_discomfort_index"),
+        "light": ("visible_light_lux", "uv_index"),
+        "co2": ("co2",),
+        "voc_nox": ("voc", "nox"),
+        "radon": ("radon_1day_avg", "radon_week_avg", "radon_year_avg"),
+        "o3_no2": ("o3", "no2"),
+        "co": ("co",)
+    }
+    # sent whatever the subscribed groups
+    COMMON_FIELDS = ("timestamp",)
+
+    class Mode(Enum):
+        Full = "full"      # full payload every tick, notifications whenever there are any
+        Delta = "delta"    # changed fields only, notifications only when they change
+        Binary = "binary"  # same as delta, with the data packed by BinaryFrameCodec
+
+    class Stream:
+        def __init__(self, mode, groups, fields, interval_ticks):
+            self.mode = mode
+            self.groups = groups
+            self.fields = fields # None for all fields
+            self.interval_ticks = interval_ticks
+            # state last sent to the subscribers, the deltas are computed against it
+            self.payload = None
+            self.notifications = []
+            self.frame_count = 0
+            self.subscribers = set()
+
+    def __init__(self, tick_seconds):
+        self._logger = LoggerConfigurator.configure_logger(self.__class__.__name__)
+        self._tick_seconds = tick_seconds
+        self._streams = {}       # (mode, groups, interval ticks): stream
+        self._subscriptions = {} # queue: stream
+        self._has_subscribers = asyncio.Event()
+        self._tick = 0
+        self._payload = None
+        self._notifications = []
+        self._schema_frame = json.dumps(BinaryFrameCodec.schema())
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscriptions)
+
+    async def wait_for_subscribers(self):
+        await self._has_subscribers.wait()
+
+    def _stream(self, mode, groups, interval):
+        if groups is not None:
+            groups = frozenset(groups)
+            unknown = groups.difference(self.FIELD_GROUPS)
+            if unknown:
+                raise ValueError(f"Unknown field groups {sorted(unknown)}, expected some of {list(self.FIELD_GROUPS)}")
+        interval_ticks = 1
+        if interval is not None:
+            interval = float(interval)
+            if not math.isfinite(interval) or interval <= 0:
+                raise ValueError(f"Invalid update interval {interval}, expected a positive number of seconds")
+            interval_ticks = max(1, round(interval / self._tick_seconds))
+        key = (mode, groups, interval_ticks)
+        stream = self._streams.get(key)
+        if stream is None:
+            fields = None
+            if groups is not None:
+                fields = set(self.COMMON_FIELDS)
+                for group in groups:
+                    fields.update(self.FIELD_GROUPS[group])
+            stream = BroadcastHub.Stream(mode, groups, fields, interval_ticks)
+            # start from the last tick so that the first subscriber gets data right away
+            if self._payload is not None:
+                stream.payload = BroadcastHub._filter(stream, self._payload)
+                stream.notifications = self._notifications
+            self._streams[key] = stream
+        return stream
+
+    def _join(self, queue, stream, frames):
+        self._leave(queue)
+        # leaving may have removed the stream itself, when the client resubscribes to it alone
+        self._streams[(stream.mode, stream.groups, stream.interval_ticks)] = stream
+        stream.subscribers.add(queue)
+        self._subscriptions[queue] = stream
+        self._has_subscribers.set()
+        if self.Mode.Binary == stream.mode:
+            # schema handshake, the binary frames only carry field ids
+            frames.append(self._schema_frame)
+        if stream.payload is not None:
+            frames += self._keyframe(stream)
+        # frames of a previous subscription are obsolete
+        while not queue.empty():
+            queue.get_nowait()
+        if frames:
+            queue.put_nowait(frames)
+
+    def _leave(self, queue):
+        stream = self._subscriptions.pop(queue, None)
+        if stream is not None:
+            stream.subscribers.discard(queue)
+            if not stream.subscribers:
+                self._streams.pop((stream.mode, stream.groups, stream.interval_ticks), None)
+
+    def subscribe(self, mode=Mode.Full, groups=None, interval=None):
+        """Subscribe a new client, groups None means all fields and interval None every tick"""
+        queue = asyncio.Queue(maxsize=self.SUBSCRIBER_QUEUE_SIZE)
+        self._join(queue, self._stream(mode, groups, interval), [])
+        self._logger.info(f"Client subscribed in {mode.value} mode, {self.subscriber_count} connected")
+        return queue
+
+    def resubscribe(self, queue, mode, groups, interval):
+        """Move a client to another mode, set of field groups or update interval.
+        Raises ValueError for unknown groups or invalid intervals."""
+        stream = self._stream(mode, groups, interval)
+        acknowledgment = json.dumps({
+            "type": "subscribed",
+            "mode": mode.value,
+            "groups": sorted(stream.groups) if stream.groups is not None else list(self.FIELD_GROUPS),
+            "interval": round(stream.interval_ticks * self._tick_seconds, 3)
+        })
+        self._join(queue, stream, [acknowledgment])
+        self._logger.info(f"Client resubscribed: {acknowledgment}")
+
+    def unsubscribe(self, queue):
+        self._leave(queue)
+        if not self._subscriptions:
+            self._has_subscribers.clear()
+        self._logger.info(f"Client unsubscribed, {self.subscriber_count} connected")
+
+    @staticmethod
+    def _filter(stream, payload):
+        if stream.fields is None:
+            return payload
+        return {k: v for k, v in payload.items() if k in stream.fields}
+
+    @staticmethod
+    def _data_frame(payload):
+        return json.dumps({
+            "type": "data",
+            "payload": payload
+        })
+
+    @staticmethod
+    def _notification_frame(notifications):
+        return json.dumps({
+            "type": "notification",
+            "payload": notifications
+        })
+
+    @staticmethod
+    def _is_changed(old, new):
+        # NaN never compares equal to itself, but it did not change either
+        return old != new and (old == old or new == new)
+
+    def _keyframe(self, stream):
+        if self.Mode.Binary == stream.mode:
+            data_frame = BinaryFrameCodec.encode(BinaryFrameCodec.KEYFRAME, stream.payload)
+        else:
+            data_frame = BroadcastHub._data_frame(stream.payload)
+        return [data_frame, BroadcastHub._notification_frame(stream.notifications)]
+
+    def _full_frames(self, stream):
+        frames = [BroadcastHub._data_frame(stream.payload)]
+        if stream.notifications:
+            frames.append(BroadcastHub._notification_frame(stream.notifications))
+        return frames
+
+    def _delta_frames(self, stream, previous_payload, previous_notifications):
+        frames = []
+        changed = {
+            k: v for k, v in stream.payload.items()
+            if k not in previous_payload or BroadcastHub._is_changed(previous_payload[k], v)
+        }
+        removed = [k for k in previous_payload if k not in stream.payload]
+        if changed or removed:
+            if self.Mode.Binary == stream.mode:
+                frames.append(BinaryFrameCodec.encode(BinaryFrameCodec.DELTA, changed, removed))
+            else:
+                frames.append(json.dumps({
+                    "type": "delta",
+                    "payload": changed,
+                    "removed": removed
+                }))
+        if stream.notifications != previous_notifications:
+            frames.append(BroadcastHub._notification_frame(stream.notifications))
+        return frames
+
+    def _publish_stream(self, stream):
+        previous_payload = stream.payload
+        previous_notifications = stream.notifications
+        stream.payload = BroadcastHub._filter(stream, self._payload)
+        stream.notifications = self._notifications
+        stream.frame_count += 1
+
+        if self.Mode.Full == stream.mode:
+            frames = self._full_frames(stream)
+        elif previous_payload is None or 0 == stream.frame_count % self.KEYFRAME_INTERVAL_FRAMES:
+            frames = self._keyframe(stream)
+        else:
+            frames = self._delta_frames(stream, previous_payload, previous_notifications)
+        keyframe = None
+        for queue in stream.subscribers:
+            queue_frames = frames
+            if queue.full():
+                # slow client: drop its backlog rather than stall the sampler
+                schema_dropped = False
+                while not queue.empty():
+                    schema_dropped |= self._schema_frame in queue.get_nowait()
+                if self.Mode.Full != stream.mode:
+                    # it missed changes so it is resynchronized with a keyframe
+                    if keyframe is None:
+                        keyframe = self._keyframe(stream)
+                    queue_frames = keyframe
+                if schema_dropped:
+                    # the client cannot decode the binary frames without it
+                    queue_frames = [self._schema_frame] + queue_frames
+            if queue_frames:
+                queue.put_nowait(queue_frames)
+
+    def publish(self, payload, notifications):
+        self._payload = payload
+        self._notifications = notifications
+        self._tick += 1
+        for stream in self._streams.values():
+            if 0 == self._tick % stream.interval_ticks:
+                self._publish_stream(stream)
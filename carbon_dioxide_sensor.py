@@ -1,35 +1,43 @@
 #!/usr/bin/env python3
 
-import board
-import adafruit_scd4x
 from datetime import datetime, timezone
+from i2c_sensor import I2CSensor, SharedI2CBus
 from persistent_storage import PersistentStorage
-from logger_configurator import LoggerConfigurator
-import time
-from constants import SLEEP_DURATION_SECONDS
-
-
-# Initialize logger
-logger = LoggerConfigurator.configure_logger("CO2Sensor")
-
-# Initialize persistent storage
-persistent_storage = PersistentStorage()
-
-# Initialize I2C bus
-i2c = board.I2C()  # Uses default SDA (GPIO 2) and SCL (GPIO 3) pins on Raspberry Pi
-# Initialize the SCD41 sensor
-scd4x = adafruit_scd4x.SCD4X(i2c)
-# Start continuous measurement
-scd4x.start_periodic_measurement()
-logger.info("Waiting for first measurement...")
-
-while True:
-    if scd4x.data_ready:
-        timestamp = datetime.now(timezone.utc)
-        co2 = scd4x.CO2
-        temperature = scd4x.temperature
-        relative_humidity = scd4x.relative_humidity
-        persistent_storage.write_co2_data(timestamp, co2, temperature, relative_humidity)
+
+
+class CarbonDioxideSensor(I2CSensor):
+    """SCD41 CO2 concentration, temperature and relative humidity. In periodic
+    measurement mode the device has a new sample every 5 seconds, the sensor
+    is woken up then and reads it once the device reports it ready."""
+    PERIOD_SEC = 5
+    ADAPTIVE_TOLERANCES = {"co2": (15, 0.02), "temperature": (0.2, 0.0), "relative_humidity": (1.0, 0.0)}
+
+    def __init__(self, persistent_storage, bus: SharedI2CBus):
+        super().__init__(persistent_storage, bus)
+        import adafruit_scd4x
+        with self._bus.lock:
+            self._scd4x = adafruit_scd4x.SCD4X(self._bus.i2c())
+            # Start continuous measurement
+            self._scd4x.start_periodic_measurement()
+        self._logger.info("Waiting for first measurement...")
+
+    def sample(self):
+        with self._bus.lock:
+            if not self._scd4x.data_ready:
+                return False
+            timestamp = datetime.now(timezone.utc)
+            co2 = self._scd4x.CO2
+            temperature = self._scd4x.temperature
+            relative_humidity = self._scd4x.relative_humidity
+        self._storage.write_co2_data(timestamp, co2, temperature, relative_humidity)
         local_time = timestamp.astimezone().strftime('%d/%m/%Y, %H:%M:%S')
         print(f"Timestamp: {local_time}, CO2: {co2} ppm, Temperature: {temperature:.1f} °C, Humidity: {relative_humidity:.1f} %RH")
-    time.sleep(SLEEP_DURATION_SECONDS)
+        return {"co2": co2, "temperature": temperature, "relative_humidity": relative_humidity}
+
+    def close(self):
+        with self._bus.lock:
+            self._scd4x.stop_periodic_measurement()
+
+
+if __name__ == "__main__":
+    CarbonDioxideSensor(PersistentStorage(), SharedI2CBus()).run()
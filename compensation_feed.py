@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+from logger_configurator import LoggerConfigurator
+from latest_value_bus import LatestValueBus
+import time
+
+
+class CompensationFeed:
+    """Temperature and relative humidity compensating the gas sensors, read
+    from the latest value bus instead of querying the storage backend on each
+    sample. The BME688 of the ambient sensor, next to them, is used when its
+    record is at most MAX_AGE_SEC[PRIMARY] old. Otherwise the temperatures and
+    relative humidities of the other SOURCES fresh enough are averaged, and
+    without any, the sensors are not compensated.
+
+    Without the bus, i.e. unless AQ_LATEST_VALUE_BUS is on, the BME688 record
+    is read from the storage backend at most every STORAGE_REFRESH_SEC."""
+    PRIMARY = ("climate", "bme688")
+    # (database, measurement): largest age in seconds of a record used for compensation
+    MAX_AGE_SEC = {
+        ("climate", "bme688"): 30,
+        ("climate", "scd41"): 2 * 60,
+        ("climate", "bmp390l"): 2 * 60,
+        ("climate", "airthings_radon"): 10 * 60
+    }
+    # fallback sources, averaged, the BMP390L has no relative humidity
+    SOURCES = (("climate", "scd41"), ("climate", "bmp390l"), ("climate", "airthings_radon"))
+    STORAGE_REFRESH_SEC = 60
+
+    def __init__(self, persistent_storage, bus: LatestValueBus = None):
+        self._logger = LoggerConfigurator.configure_logger(self.__class__.__name__)
+        self._storage = persistent_storage
+        # a bus of its own, only read from
+        self._bus = LatestValueBus.configured() if bus is None else bus
+        self._source = None
+        self._storage_value = (None, None)
+        self._storage_read = None
+
+    @staticmethod
+    def _field(fields, name):
+        value = fields.get(name)
+        return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+    def _read_bus(self):
+        """((temperature, relative humidity), source description)"""
+        record = self._bus.read(*self.PRIMARY, self.MAX_AGE_SEC[self.PRIMARY])
+        if record is not None:
+            temperature = self._field(record[1], "temperature")
+            relative_humidity = self._field(record[1], "relative_humidity")
+            if temperature is not None and relative_humidity is not None:
+                return (temperature, relative_humidity), self.PRIMARY[1]
+        temperatures, relative_humidities, names = [], [], []
+        for source in self.SOURCES:
+            record = self._bus.read(*source, self.MAX_AGE_SEC[source])
+            if record is None:
+                continue
+            temperature = self._field(record[1], "temperature")
+            relative_humidity = self._field(record[1], "relative_humidity")
+            if temperature is not None:
+                temperatures.append(temperature)
+            if relative_humidity is not None:
+                relative_humidities.append(relative_humidity)
+            if temperature is not None or relative_humidity is not None:
+                names.append(source[1])
+        if not temperatures or not relative_humidities:
+            return (None, None), "none"
+        return (sum(temperatures) / len(temperatures), sum(relative_humidities) / len(relative_humidities)), \
+            f"mean of {', '.join(names)}"
+
+    def _read_storage(self):
+        now = time.monotonic()
+        if self._storage_read is None or now - self._storage_read >= self.STORAGE_REFRESH_SEC:
+            self._storage_read = now
+            self._storage_value = self._storage.read_temperature_relative_humidity_data()
+        return self._storage_value, "storage"
+
+    def read(self):
+        """(temperature in °C, relative humidity in %), (None, None) when unknown"""
+        if self._bus is not None and self._bus.is_available():
+            value, source = self._read_bus()
+        else:
+            value, source = self._read_storage()
+        if source != self._source:
+            self._source = source
+            if "none" == source:
+                self._logger.warning("No recent temperature and relative humidity, the gas sensor is not compensated")
+            else:
+                self._logger.info(f"Compensating the gas sensor with the temperature and relative humidity of {source}")
+        return value
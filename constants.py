@@ -1,15 +1,21 @@
 #!/usr/bin/env python3
 
-import pandas as pd
+from datetime import timezone
 
 
 SLEEP_DURATION_SECONDS = 3
 AIRTHINGS_SLEEP_DURATION_SECONDS = 300
+# longest interval between two reads with AQ_ADAPTIVE_SAMPLING, within the 10 minutes
+# after which the dashboard reports the data as missing
+AIRTHINGS_MAX_SLEEP_DURATION_SECONDS = 540
 AIRTHINGS_SCAN_TIMEOUT_SECONDS = 8
 
 def normalize_and_format_pandas_timestamp(timestamp):
-    """expects as input a Pandas Timestamp object, e.g. pd.Timestamp.now(tz='UTC')"""
-    if timestamp.tzinfo is None or timestamp.tz is None:
-        timestamp = timestamp.tz_localize('UTC')
-    timestamp = timestamp.to_pydatetime()
+    """expects as input a Pandas Timestamp or a datetime object, naive ones being UTC,
+    e.g. pd.Timestamp.now(tz='UTC')"""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    # a Pandas Timestamp cannot be converted to the local time zone without naming it
+    if hasattr(timestamp, "to_pydatetime"):
+        timestamp = timestamp.to_pydatetime()
     return timestamp.astimezone().strftime('%d/%m/%Y, %H:%M:%S')
@@ -6,8 +6,6 @@ import sys
 import plantower.plantower as plantower
 import time
 from collections import deque
-import numpy as np
-from scipy import stats
 from datetime import timedelta
 import threading as th
 from persistent_storage import PersistentStorage
@@ -195,6 +193,10 @@ class DustSensorUtils:
         if len(self._pm2_5_cf1[0]) < self.MAX_ACCURACY_SENSOR_READINGS_LENGTH:
             return
 
+        # imported on first use, they add seconds to the start of the service on a Raspberry Pi
+        import numpy as np
+        from scipy import stats
+
         # Convert deques to numpy arrays
         arrays = [np.array(deque) for deque in self._pm2_5_cf1]
 
@@ -6,9 +6,8 @@ import os
 import sys
 import json
 import time
-from datetime import datetime
+from datetime import datetime, timezone
 from constants import normalize_and_format_pandas_timestamp
-import pandas as pd
 from logger_configurator import LoggerConfigurator
 import subprocess
 
@@ -511,10 +510,36 @@ class EnvAlertNotifier:
         self._alert_state = {}
         # Alerts
         self._alerts = {}
+        # Number of alerts sent since the start, (parameter, type): count
+        self._alert_counts = {}
+        # Called with the service name instead of restarting it synchronously
+        self._restart_handler = None
+        if os.environ.get("AQ_I2C_SENSOR_RUNTIME", "off").lower() in ("on", "true", "1"):
+            # the I2C sensors run in a single service
+            from i2c_sensor_runtime import I2CSensorRuntime
+            self.SERVICE_RESTARTS = {
+                parameter: I2CSensorRuntime.SERVICE if service in I2CSensorRuntime.REPLACED_SERVICES else service
+                for parameter, service in EnvAlertNotifier.SERVICE_RESTARTS.items()
+            }
+
+    def set_restart_handler(self, restart_handler):
+        """Delegate the service restarts, e.g. to ServiceRestartSupervisor.request_restart"""
+        self._restart_handler = restart_handler
 
     def __del__(self):
         self.save_alert_state()
 
+    def _count_alert(self, parameter, alert_type):
+        key = (parameter, alert_type)
+        self._alert_counts[key] = self._alert_counts.get(key, 0) + 1
+
+    def get_alert_counts(self):
+        """Number of alerts sent since the start, keyed by (parameter, alert type)"""
+        return dict(self._alert_counts)
+
+    def get_active_alert_count(self):
+        return len(self._alerts)
+
     def _get_interval_for_value(self, param, value):
         param_config = self.THRESHOLDS.get(param)
         if not param_config:
@@ -554,10 +579,11 @@ class EnvAlertNotifier:
             "formatted_timestamp": formatted_timestamp,
             "timestamp": timestamp
         }
+        self._count_alert(parameter, "data_alert")
         self._logger.info(f"Sending alert for {parameter}: {msg}, at {formatted_timestamp}")
 
     def _send_missing_data_alert(self, parameter):
-        timestamp = pd.Timestamp.now(tz='UTC').tz_localize(None)
+        timestamp = datetime.now(timezone.utc).replace(tzinfo=None)
         formatted_timestamp = normalize_and_format_pandas_timestamp(timestamp)
         msg = f"No data received for {parameter}"
         self._alerts[parameter] = {
@@ -566,12 +592,29 @@ class EnvAlertNotifier:
             "formatted_timestamp": formatted_timestamp,
             "timestamp": timestamp
         }
+        self._count_alert(parameter, "missing_data")
         self._logger.info(f"Sending missing data alert for {parameter} at {formatted_timestamp}")
 
     def remove_data_alert(self, parameter):
         if parameter in self._alerts:
             del self._alerts[parameter]
             self._logger.debug(f"Removed data alert for {parameter}")
+        # data is back, the restart status of its service is no longer relevant
+        service_name = self.SERVICE_RESTARTS.get(parameter)
+        if service_name is not None:
+            self._alerts.pop(service_name, None)
+
+    def report_service_restart(self, service_name, status, message):
+        """Show the restart status of a service in the notifications"""
+        timestamp = datetime.now(timezone.utc).replace(tzinfo=None)
+        self._alerts[service_name] = {
+            "type": "service_restart",
+            "status": status,
+            "message": message,
+            "formatted_timestamp": normalize_and_format_pandas_timestamp(timestamp),
+            "timestamp": timestamp
+        }
+        self._count_alert(service_name, "service_restart")
 
     def send_missing_data_alert_if_due(self, parameter):
         current_time = time.time()
@@ -580,7 +623,9 @@ class EnvAlertNotifier:
             self._send_missing_data_alert(parameter)
             self._last_missing_data_alert[parameter] = current_time
             service_name = self.SERVICE_RESTARTS.get(parameter)
-            if service_name:
+            if service_name and self._restart_handler is not None:
+                self._restart_handler(service_name)
+            elif service_name:
                 self._restart_service(service_name)
             else:
                 self._logger.warning(f"No service restart configured for parameter '{parameter}'")
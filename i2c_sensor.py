@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+from logger_configurator import LoggerConfigurator
+from constants import SLEEP_DURATION_SECONDS
+from sample_schedule import SampleSchedule
+from adaptive_interval import AdaptiveInterval
+from abc import ABC, abstractmethod
+import threading
+
+
+class SharedI2CBus:
+    """The I2C bus of the Raspberry Pi (/dev/i2c-1) shared by the sensors of a
+    process: a single Blinka I2C object, created on first use, and a lock a
+    sensor holds for each sequence of transactions with its device, so that
+    the sensors run by I2CSensorRuntime never interleave them."""
+    DEVICE = "/dev/i2c-1"
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._i2c = None
+
+    def i2c(self):
+        """Blinka I2C object on the default SDA (GPIO 2) and SCL (GPIO 3) pins"""
+        with self.lock:
+            if self._i2c is None:
+                import board
+                self._i2c = board.I2C()
+            return self._i2c
+
+
+class I2CSensor(ABC):
+    """A sensor of the I2C bus, run alone by its script or as a task of
+    I2CSensorRuntime. A subclass sets up its device in __init__, reads and
+    stores one sample in sample() and releases the device in close(). An
+    exception raised by either is left to the caller: the script exits and is
+    restarted by systemd, the runtime restarts the sensor alone.
+
+    sample() is called by a SampleSchedule every PERIOD_SEC, the native
+    measurement period of the device. It returns False when the device has
+    no new data yet, it is then polled again every POLL_INTERVAL_SEC.
+
+    A sensor setting ADAPTIVE_TOLERANCES returns {field: value} from sample()
+    instead, and with AQ_ADAPTIVE_SAMPLING its period is set by an
+    AdaptiveInterval between PERIOD_SEC and MAX_INTERVAL_SEC."""
+    PERIOD_SEC = SLEEP_DURATION_SECONDS
+    POLL_INTERVAL_SEC = 0.2
+    # {field: (absolute, relative)} tolerances of the values returned by sample(), see AdaptiveInterval
+    ADAPTIVE_TOLERANCES = None
+    MAX_INTERVAL_SEC = 60
+
+    def __init__(self, persistent_storage, bus: SharedI2CBus):
+        self._logger = LoggerConfigurator.configure_logger(self.__class__.__name__)
+        self._storage = persistent_storage
+        self._bus = bus
+        self.schedule = None
+        self.adaptive_interval = None
+
+    @abstractmethod
+    def sample(self):
+        """Read and store one sample, False if the device has no new data yet"""
+
+    def close(self):
+        pass
+
+    def run(self, stop: threading.Event = None, phase_sec=0.0):
+        """Sample on schedule until stop is set, phase_sec shifts the deadlines of the sensor"""
+        if stop is None:
+            stop = threading.Event()
+        name = self.__class__.__name__
+        self.schedule = SampleSchedule(name, self.PERIOD_SEC, phase_sec, self.POLL_INTERVAL_SEC)
+        if self.ADAPTIVE_TOLERANCES:
+            self.adaptive_interval = AdaptiveInterval.configured(name, self.PERIOD_SEC, self.MAX_INTERVAL_SEC,
+                                                                 self.ADAPTIVE_TOLERANCES)
+        try:
+            while self.schedule.wait(stop):
+                values = self.sample()
+                if values is False:
+                    self.schedule.not_ready()
+                    continue
+                if self.adaptive_interval is not None and values:
+                    self.schedule.set_period(self.adaptive_interval.update(values))
+                self.schedule.sampled()
+        finally:
+            self.close()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+from i2c_sensor import SharedI2CBus
+from persistent_storage import PersistentStorage
+from logger_configurator import LoggerConfigurator
+import argparse
+import importlib
+import inspect
+import signal
+import threading
+import time
+
+
+class I2CSensorRuntime:
+    """Runs the I2C sensors as threads of a single process, instead of one
+    service each: one interpreter, one PersistentStorage and one SharedI2CBus
+    whose lock keeps the sensors from competing for the bus.
+
+    Each sensor is supervised on its own. When its setup or a sample raises,
+    including when its driver cannot be imported, the device is closed and set
+    up again after a delay, doubled after each failure up to
+    MAX_RESTART_DELAY_SEC, the other sensors running on meanwhile. A sensor that
+    ran for STABLE_RUN_SEC is restarted after INITIAL_RESTART_DELAY_SEC again.
+    A sensor class that does not implement I2CSensor is not restarted."""
+    # name: (module, class)
+    SENSORS = {
+        "ambient": ("ambient_sensor", "AmbientSensor"),
+        "co2": ("carbon_dioxide_sensor", "CarbonDioxideSensor"),
+        "light": ("light_sensor", "LightSensor"),
+        "pressure": ("pressure_temp_sensor", "PressureTempSensor"),
+        "voc_nox": ("voc_nox_sensor", "VocNoxSensor")
+    }
+    # systemd unit replaced by the runtime, restarted by EnvAlertNotifier when data is missing
+    SERVICE = "i2c_sensor_runtime.service"
+    REPLACED_SERVICES = ("ambient_sensor.service", "carbon_dioxide_sensor.service", "light_sensor.service",
+                         "pressure_temp_sensor.service", "voc_nox_sensor.service")
+    # phase between the deadlines of consecutive sensors, so that they do not read at the same time
+    PHASE_STEP_SEC = 0.25
+    INITIAL_RESTART_DELAY_SEC = 5
+    MAX_RESTART_DELAY_SEC = 5 * 60
+    STABLE_RUN_SEC = 10 * 60
+
+    def __init__(self, persistent_storage, names=None):
+        self._logger = LoggerConfigurator.configure_logger(self.__class__.__name__)
+        self._storage = persistent_storage
+        self._bus = SharedI2CBus()
+        self._names = list(names) if names else list(self.SENSORS)
+        for name in self._names:
+            if name not in self.SENSORS:
+                raise ValueError(f"Unknown sensor '{name}', expected one of {', '.join(self.SENSORS)}")
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._status = {name: "starting" for name in self._names}
+        self._restart_counts = {name: 0 for name in self._names}
+        self._last_errors = {}
+        self._sensors = {}
+
+    def _set_status(self, name, status):
+        with self._lock:
+            self._status[name] = status
+
+    def _run_sensor(self, name):
+        """False if the sensor cannot run at all, e.g. because its class misses an abstract method"""
+        module_name, class_name = self.SENSORS[name]
+        sensor_class = getattr(importlib.import_module(module_name), class_name)
+        if inspect.isabstract(sensor_class):
+            with self._lock:
+                self._last_errors[name] = (time.time(), f"{class_name} does not implement "
+                                                        f"{', '.join(sorted(sensor_class.__abstractmethods__))}")
+            return False
+        sensor = sensor_class(self._storage, self._bus)
+        with self._lock:
+            self._sensors[name] = sensor
+        self._set_status(name, "running")
+        self._logger.info(f"Sensor {name} running")
+        sensor.run(self._stop, self._names.index(name) * self.PHASE_STEP_SEC)
+        return True
+
+    def _supervise(self, name):
+        delay = self.INITIAL_RESTART_DELAY_SEC
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                if not self._run_sensor(name):
+                    # restarting cannot fix it
+                    self._logger.error(f"Sensor {name} cannot run: {self._last_errors[name][1]}")
+                    self._set_status(name, "failed")
+                    return
+            except Exception as e:
+                with self._lock:
+                    self._restart_counts[name] += 1
+                    self._last_errors[name] = (time.time(), f"{type(e).__name__}: {e}")
+                if time.monotonic() - started >= self.STABLE_RUN_SEC:
+                    delay = self.INITIAL_RESTART_DELAY_SEC
+                self._logger.error(f"Sensor {name} failed: {type(e).__name__}: {e}, restarting it in {delay} sec.")
+                self._set_status(name, "restarting")
+                self._stop.wait(delay)
+                delay = min(2 * delay, self.MAX_RESTART_DELAY_SEC)
+        self._set_status(name, "stopped")
+
+    def get_statistics(self):
+        """{sensor name: {"status", "restarts", "last_error": (time, message) or None,
+        "schedule": SampleSchedule.get_statistics() of the last run or None,
+        "adaptive_interval": AdaptiveInterval.get_statistics() or None}}"""
+        with self._lock:
+            sensors = dict(self._sensors)
+            statistics = {
+                name: {
+                    "status": self._status[name],
+                    "restarts": self._restart_counts[name],
+                    "last_error": self._last_errors.get(name)
+                }
+                for name in self._names
+            }
+        for name in self._names:
+            schedule = sensors[name].schedule if name in sensors else None
+            statistics[name]["schedule"] = schedule.get_statistics() if schedule is not None else None
+            adaptive_interval = sensors[name].adaptive_interval if name in sensors else None
+            statistics[name]["adaptive_interval"] = adaptive_interval.get_statistics() if adaptive_interval is not None else None
+        return statistics
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        threads = [threading.Thread(target=self._supervise, args=(name,), name=f"sensor-{name}", daemon=True)
+                   for name in self._names]
+        for thread in threads:
+            thread.start()
+        self._logger.info(f"Running sensors {', '.join(self._names)}")
+        while not self._stop.wait(1):
+            pass
+        for thread in threads:
+            thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run the I2C sensors in a single process')
+    parser.add_argument('sensors', nargs='*', help=f'Sensors to run, all by default: {", ".join(I2CSensorRuntime.SENSORS)}')
+    args = parser.parse_args()
+
+    runtime = I2CSensorRuntime(PersistentStorage(), args.sensors)
+    signal.signal(signal.SIGTERM, lambda signum, frame: runtime.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: runtime.stop())
+    runtime.run()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+#
+# sudo systemctl status influxdb3-core
+# journalctl -u influxdb3-core
+# influxdb3 show databases
+# curl "http://localhost:8181/health" --header "Authorization: Bearer $INFLUXDB3_ADMIN_TOKEN"
+
+from typing import Dict
+from datetime import datetime, timezone
+from logger_configurator import LoggerConfigurator
+from storage_backend import StorageBackend
+from storage_instrumentation import StorageInstrumentation
+from line_protocol import LineProtocol
+import threading
+import pyarrow
+import os, sys
+try:
+    from influxdb_client_3 import InfluxDBClient3, WritePrecision
+except ImportError:
+    InfluxDBClient3 = None
+
+
+class InfluxDBBackend(StorageBackend):
+    """InfluxDB 3 server, one client per database. The records are sent as line
+    protocol and read back with SQL queries."""
+    auth_scheme = "Bearer"
+    host = "http://localhost:8181"
+
+    def __init__(self, instrumentation: StorageInstrumentation):
+        self._logger = LoggerConfigurator.configure_logger(self.__class__.__name__)
+        self._instrumentation = instrumentation
+        if InfluxDBClient3 is None:
+            print("Error: influxdb3-python is not installed.")
+            sys.exit(1)
+        self._token = os.environ.get("INFLUXDB3_AUTH_TOKEN")
+        if not self._token:
+            print("Error: INFLUXDB3_AUTH_TOKEN environment variable is not set.")
+            sys.exit(1)
+
+        self._clients: Dict[str, InfluxDBClient3] = {}
+        self._clients_lock = threading.Lock()
+        self._verify_token()
+
+    def get_client(self, database: str) -> InfluxDBClient3:
+        """Get or create a client for specific database"""
+        with self._clients_lock:
+            if database not in self._clients:
+                with self._instrumentation.measure("connect", database):
+                    self._clients[database] = InfluxDBClient3(
+                        host=self.host,
+                        token=self._token,
+                        database=database,
+                        auth_scheme=self.auth_scheme
+                    )
+            return self._clients[database]
+
+    def _verify_token(self):
+        database = "dust"
+        try:
+            client = self.get_client(database)
+            with self._instrumentation.measure("connect", database, "token_verification"):
+                client.query("SELECT 1")
+            self._logger.info("Token verification successful.")
+        except Exception as e:
+            if "unauthorized" in str(e).lower() or "authentication" in str(e).lower():
+                self._logger.error(f"Token verification failed: {e}")
+            else:
+                self._logger.error(f"An unexpected error occurred during token verification: {e}")
+            sys.exit(1)
+
+    @staticmethod
+    def _format_time(timestamp: datetime):
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        return timestamp.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+    def write(self, db, records):
+        """The line protocol is built by the encoders of LineProtocol, without a Point per record"""
+        lines = LineProtocol.encode_all(records)
+        if not lines:
+            return 0
+        client = self.get_client(db)
+        client.write(record=lines, write_precision=WritePrecision.MS)
+        return len(lines.encode("utf-8"))
+
+    @staticmethod
+    def _to_records(table):
+        """Rows of an Arrow table as dicts, straight from the Arrow columns. The nanosecond
+        timestamps are cast to microseconds first, they would be converted to pandas
+        Timestamps otherwise, so the times are naive UTC datetimes like with the other backends."""
+        for i, field in enumerate(table.schema):
+            if pyarrow.types.is_timestamp(field.type) and "ns" == field.type.unit:
+                table = table.set_column(i, field.name, table.column(i).cast(pyarrow.timestamp("us", tz=field.type.tz), safe=False))
+        return table.to_pylist()
+
+    def read_latest(self, db, measurement, max_age_sec):
+        client = self.get_client(db)
+        table = client.query(
+                    query=f'SELECT * FROM "{measurement}" WHERE time > now() - interval \'{max_age_sec} seconds\' ORDER BY time DESC LIMIT 1',
+                    language="sql",
+                    mode="all"
+                )
+        records = InfluxDBBackend._to_records(table.slice(0, 1))
+        return records[0] if records else None
+
+    def read_schema(self, db):
+        client = self.get_client(db)
+        table = client.query(
+                    query="SELECT table_name, column_name, data_type FROM information_schema.columns WHERE table_schema = 'iox'",
+                    language="sql",
+                    mode="all"
+                )
+        tables = {}
+        for row in table.to_pylist():
+            tables.setdefault(row["table_name"], {})[row["column_name"]] = row["data_type"]
+        return tables
+
+    @staticmethod
+    def _latest_snapshot_query(tables, max_age_sec):
+        """UNION ALL of the newest row of each table. The branches must have the
+        same columns, so the ones a table does not have are filled with typed NULLs."""
+        column_types = {}
+        for columns in tables.values():
+            for column, data_type in columns.items():
+                column_types.setdefault(column, data_type)
+        selects = []
+        for table_name, columns in sorted(tables.items()):
+            projection = [f"'{table_name}' AS measurement"]
+            for column, data_type in sorted(column_types.items()):
+                if column in columns:
+                    projection.append(f'"{column}"')
+                else:
+                    projection.append(f'arrow_cast(NULL, \'{data_type}\') AS "{column}"')
+            selects.append(f'(SELECT {", ".join(projection)} FROM "{table_name}" WHERE time > now() - interval \'{max_age_sec} seconds\' ORDER BY time DESC LIMIT 1)')
+        return " UNION ALL ".join(selects)
+
+    def read_latest_snapshot(self, db, tables, max_age_sec):
+        """Newest record of every table, fetched with a single query"""
+        client = self.get_client(db)
+        table = client.query(
+                    query=InfluxDBBackend._latest_snapshot_query(tables, max_age_sec),
+                    language="sql",
+                    mode="all"
+                )
+        snapshot = {}
+        for row in InfluxDBBackend._to_records(table):
+            columns = tables[row["measurement"]]
+            snapshot[row["measurement"]] = {k: v for k, v in row.items() if k in columns}
+        return snapshot
+
+    def aggregate(self, db, measurement, projections, start: datetime, stop: datetime, bucket_seconds):
+        """Bucketing with date_bin, which aligns the buckets on the epoch"""
+        columns = [f"date_bin(INTERVAL '{bucket_seconds} seconds', time) AS time"]
+        columns += [f'{StorageBackend.sql_projection(*projection)} AS "{alias}"' for alias, projection in projections.items()]
+        client = self.get_client(db)
+        return client.query(
+                    query=f'SELECT {", ".join(columns)} FROM "{measurement}" '
+                          f"WHERE time >= '{InfluxDBBackend._format_time(start)}' AND time < '{InfluxDBBackend._format_time(stop)}' "
+                          'GROUP BY 1 ORDER BY 1',
+                    language="sql",
+                    mode="all"
+                )
+
+    def read_time_range(self, db, measurement):
+        try:
+            client = self.get_client(db)
+            table = client.query(
+                        query=f'SELECT min(time) AS start, max(time) AS stop FROM "{measurement}"',
+                        language="sql",
+                        mode="all"
+                    )
+            table = table.cast(pyarrow.schema([("start", pyarrow.timestamp("us", tz="UTC")), ("stop", pyarrow.timestamp("us", tz="UTC"))]), safe=False)
+            rows = table.to_pylist()
+            if rows and rows[0]["start"] is not None:
+                return rows[0]["start"], rows[0]["stop"]
+        except Exception:
+            # the table does not exist yet
+            pass
+        return None
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+from persistent_storage import PersistentStorage
+from ingestion_gateway_client import IngestionGatewayClient
+from logger_configurator import LoggerConfigurator
+from batch_writer import BatchWriter
+import os
+import signal
+import socket
+import threading
+
+
+class IngestionGateway:
+    """Receives the records of all the sensor services on a Unix datagram
+    socket and writes them to the storage backend with a BatchWriter, as one
+    batch per database every FLUSH_INTERVAL_SEC, over the connections kept
+    alive by the backend. With about 10 services writing every few seconds,
+    this replaces hundreds of HTTP requests per minute by at most one per
+    database and flush. The datagrams are sent by IngestionGatewayClient."""
+    FLUSH_INTERVAL_SEC = 10
+    MAX_BATCH_RECORDS = 5000
+    # records kept while the backend fails, the oldest are dropped beyond
+    MAX_PENDING_RECORDS = 100000
+    MAX_DATAGRAM_SIZE = 65536
+
+    def __init__(self, storage: PersistentStorage, socket_path=IngestionGatewayClient.DEFAULT_SOCKET_PATH):
+        self._logger = LoggerConfigurator.configure_logger(self.__class__.__name__)
+        self._socket_path = socket_path
+        self._batch_writer = BatchWriter(
+            lambda database, records: storage.write_records(PersistentStorage.Database(database), records),
+            max_batch_records=self.MAX_BATCH_RECORDS,
+            max_batch_age_sec=self.FLUSH_INTERVAL_SEC,
+            max_queue_records=self.MAX_PENDING_RECORDS
+        )
+        self._stop = threading.Event()
+
+    def _receive(self, server):
+        while not self._stop.is_set():
+            try:
+                datagram = server.recv(self.MAX_DATAGRAM_SIZE)
+            except socket.timeout:
+                continue
+            try:
+                database, record = IngestionGatewayClient.decode(datagram)
+                database = PersistentStorage.Database(database).value
+            except (ValueError, TypeError) as e:
+                self._logger.warning(f"Invalid record received: {e}")
+                continue
+            self._batch_writer.enqueue(database, record)
+
+    def get_statistics(self):
+        return self._batch_writer.get_statistics()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        if os.path.exists(self._socket_path):
+            # left by a previous instance
+            os.unlink(self._socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        server.bind(self._socket_path)
+        server.settimeout(1)
+        receive_thread = threading.Thread(target=self._receive, args=(server,), daemon=True)
+        receive_thread.start()
+        self._logger.info(f"Listening on {self._socket_path}, flushing every {self.FLUSH_INTERVAL_SEC} s")
+        try:
+            while not self._stop.wait(1):
+                pass
+        finally:
+            receive_thread.join()
+            server.close()
+            os.unlink(self._socket_path)
+            # the services fall back to direct writes, nothing received is lost
+            if not self._batch_writer.close():
+                self._logger.error(f"Records lost on exit: {self._batch_writer.get_statistics()}")
+
+
+if __name__ == "__main__":
+    # the gateway does its own batching
+    gateway = IngestionGateway(PersistentStorage(use_gateway=False, buffered=False),
+                               IngestionGatewayClient.socket_path_from_env() or IngestionGatewayClient.DEFAULT_SOCKET_PATH)
+    signal.signal(signal.SIGTERM, lambda signum, frame: gateway.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: gateway.stop())
+    gateway.run()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+from logger_configurator import LoggerConfigurator
+import json
+import os
+import socket
+
+
+class IngestionGatewayClient:
+    """Sends records to the IngestionGateway service. A datagram is the JSON
+    array [database, measurement, time in ms, {field: value}]. The socket is
+    non blocking, so a stalled gateway never blocks a sensor loop: send()
+    returns False and the caller writes the record itself.
+
+    The services are pointed to the gateway with AQ_INGESTION_GATEWAY, set to
+    "on" for DEFAULT_SOCKET_PATH or to the socket path."""
+    DEFAULT_SOCKET_PATH = "/tmp/aq_ingestion_gateway.sock"
+
+    def __init__(self, socket_path):
+        self._logger = LoggerConfigurator.configure_logger(self.__class__.__name__)
+        self.socket_path = socket_path
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+
+    @staticmethod
+    def socket_path_from_env():
+        """Socket path of the gateway, None to write directly to the storage backend"""
+        value = os.environ.get("AQ_INGESTION_GATEWAY", "off")
+        if value.lower() in ("off", "false", "0", ""):
+            return None
+        if value.lower() in ("on", "true", "1"):
+            return IngestionGatewayClient.DEFAULT_SOCKET_PATH
+        return value
+
+    @staticmethod
+    def encode(database, record):
+        measurement, time_ms, fields = record
+        return json.dumps([database, measurement, time_ms, fields], separators=(",", ":")).encode("utf-8")
+
+    @staticmethod
+    def decode(datagram):
+        """(database, record), raises ValueError or TypeError for an invalid datagram"""
+        database, measurement, time_ms, fields = json.loads(datagram)
+        if not isinstance(fields, dict):
+            raise TypeError("the fields must be an object")
+        return database, (measurement, int(time_ms), fields)
+
+    def send(self, database, record):
+        """False if the gateway is not running or cannot keep up, or if the record is not JSON serializable"""
+        try:
+            datagram = IngestionGatewayClient.encode(database, record)
+        except (TypeError, ValueError) as e:
+            self._logger.warning(f"Cannot send the {record[0]} record of {database} to the gateway: {e}")
+            return False
+        try:
+            self._socket.sendto(datagram, self.socket_path)
+            return True
+        except OSError:
+            return False
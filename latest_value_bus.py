@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+import fcntl
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from logger_configurator import LoggerConfigurator
+
+
+class LatestValueBus:
+    """Newest record of each measurement in a memory mapped file of /dev/shm,
+    written by the sensor services and read by the dashboard without going
+    through the database. Each (database, measurement) of SLOTS has a fixed
+    slot, so the processes need no coordination besides the file itself:
+
+        header  magic, layout version, slot count, slot size, CRC32 of SLOTS
+        slot    uint32 sequence, uint32 CRC32 of the payload,
+                int64 time in ms since epoch, uint16 payload length,
+                payload: JSON object of the fields
+
+    Each slot is protected by a seqlock: the writer makes the sequence odd,
+    writes the slot and makes the sequence even again. A reader copies the
+    slot and retries when the sequence was odd or changed meanwhile. The
+    payload CRC also catches torn reads the sequence alone would miss. There
+    must be a single writer per slot, which is the service of the sensor.
+
+    Enabled with AQ_LATEST_VALUE_BUS=on, which must then be set for all the
+    services, the dashboard reading only the bus once it exists."""
+    MAGIC = b"AQLV"
+    VERSION = 1
+    SLOT_SIZE = 512
+    HEADER_SIZE = 64
+    MAX_READ_RETRIES = 100
+    FILE_NAME = "aq_latest_values"
+
+    # (database, measurement), the position in the table is the slot number
+    SLOTS = (
+        ("dust", "pmsa003_0"),
+        ("dust", "pmsa003_1"),
+        ("dust", "air_quality_index"),
+        ("gas", "bme688"),
+        ("gas", "scd41"),
+        ("gas", "sgp41"),
+        ("gas", "airthings_radon"),
+        ("gas", "zmod4510"),
+        ("gas", "ze07co"),
+        ("climate", "bme688"),
+        ("climate", "scd41"),
+        ("climate", "bmp390l"),
+        ("climate", "airthings_radon"),
+        ("sound", "sound"),
+        ("light", "ltr390")
+    )
+
+    _slot_ids = {slot: i for i, slot in enumerate(SLOTS)}
+    _layout_crc = zlib.crc32(repr(SLOTS).encode("utf-8"))
+    _header = struct.Struct("<4sHHII")
+    _sequence = struct.Struct("<I")
+    _slot_header = struct.Struct("<IIqH")
+    _max_payload = SLOT_SIZE - _slot_header.size
+
+    def __init__(self, path=None):
+        self._logger = LoggerConfigurator.configure_logger(self.__class__.__name__)
+        if path is None:
+            directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+            path = os.path.join(directory, self.FILE_NAME)
+        self._path = path
+        self._size = self.HEADER_SIZE + len(self.SLOTS) * self.SLOT_SIZE
+        self._map = None
+        self._writable = False
+        # the sensors of I2CSensorRuntime publish from several threads, each to its own slots
+        self._open_lock = threading.Lock()
+        self._unencodable = set() # (database, measurement) whose encoding error was logged
+
+    @classmethod
+    def configured(cls):
+        """The LatestValueBus set by AQ_LATEST_VALUE_BUS, None when disabled"""
+        if os.environ.get("AQ_LATEST_VALUE_BUS", "off").strip().lower() not in ("on", "true", "1"):
+            return None
+        return cls()
+
+    def _expected_header(self):
+        return self._header.pack(self.MAGIC, self.VERSION, len(self.SLOTS), self.SLOT_SIZE, self._layout_crc)
+
+    def _open_for_writing(self):
+        fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o664)
+        try:
+            # services starting together must not clear the slots another one already published
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if os.fstat(fd).st_size < self._size:
+                os.ftruncate(fd, self._size)
+            self._map = mmap.mmap(fd, self._size)
+            header = self._expected_header()
+            if self._map[:len(header)] != header:
+                # new file or layout of another version: start from empty slots
+                self._map[:self._size] = bytes(self._size)
+                self._map[:len(header)] = header
+        finally:
+            # also releases the lock
+            os.close(fd)
+        self._writable = True
+
+    def _open_for_reading(self):
+        """True if the bus exists and has the layout of this version"""
+        if self._map is not None:
+            return True
+        try:
+            fd = os.open(self._path, os.O_RDONLY)
+        except FileNotFoundError:
+            return False
+        try:
+            if os.fstat(fd).st_size < self._size:
+                return False
+            self._map = mmap.mmap(fd, self._size, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        header = self._expected_header()
+        if self._map[:len(header)] != header:
+            self._map.close()
+            self._map = None
+            return False
+        return True
+
+    def is_available(self):
+        return self._open_for_reading()
+
+    @staticmethod
+    def _json_value(value):
+        # numpy scalars stand for the Python value they hold, as in LineProtocol
+        if hasattr(value, "item") and "numpy" == type(value).__module__:
+            return value.item()
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+    def publish(self, database, measurement, time_ms, fields):
+        """Replace the record of a measurement, False if it has no slot, cannot be encoded or does not fit in it"""
+        slot = self._slot_ids.get((database, measurement))
+        if slot is None:
+            return False
+        try:
+            payload = json.dumps({k: v for k, v in fields.items() if v is not None}, separators=(",", ":"),
+                                 default=self._json_value).encode("utf-8")
+        except (TypeError, ValueError) as e:
+            if (database, measurement) not in self._unencodable:
+                self._unencodable.add((database, measurement))
+                self._logger.warning(f"Record of {database}.{measurement} cannot be published to the latest value bus: {e}")
+            return False
+        if len(payload) > self._max_payload:
+            self._logger.warning(f"Record of {database}.{measurement} is too large for the latest value bus: {len(payload)} bytes")
+            return False
+        if not self._writable:
+            with self._open_lock:
+                if not self._writable:
+                    if self._map is not None:
+                        self._map.close()
+                    self._open_for_writing()
+        offset = self.HEADER_SIZE + slot * self.SLOT_SIZE
+        sequence = self._sequence.unpack_from(self._map, offset)[0]
+        # odd while the slot is being written
+        self._sequence.pack_into(self._map, offset, (sequence + 1) & 0xFFFFFFFF)
+        self._slot_header.pack_into(self._map, offset, (sequence + 1) & 0xFFFFFFFF, zlib.crc32(payload), time_ms, len(payload))
+        payload_offset = offset + self._slot_header.size
+        self._map[payload_offset:payload_offset + len(payload)] = payload
+        self._sequence.pack_into(self._map, offset, (sequence + 2) & 0xFFFFFFFF)
+        return True
+
+    def _read_slot(self, slot):
+        offset = self.HEADER_SIZE + slot * self.SLOT_SIZE
+        for attempt in range(self.MAX_READ_RETRIES):
+            if attempt:
+                # let the writer finish the slot
+                time.sleep(0)
+            data = self._map[offset:offset + self.SLOT_SIZE]
+            sequence, crc, time_ms, length = self._slot_header.unpack_from(data)
+            if 0 == sequence:
+                # never written
+                return None
+            if sequence & 1 or length > self._max_payload:
+                continue
+            if self._sequence.unpack_from(self._map, offset)[0] != sequence:
+                continue
+            payload = data[self._slot_header.size:self._slot_header.size + length]
+            if zlib.crc32(payload) != crc:
+                continue
+            return time_ms, json.loads(payload)
+        self._logger.warning(f"Cannot read a consistent record of {self.SLOTS[slot]} from the latest value bus")
+        return None
+
+    def read(self, database, measurement, max_age_sec):
+        """(time in ms, fields) of a measurement not older than max_age_sec, None if
+        there is none or the bus does not exist"""
+        slot = self._slot_ids.get((database, measurement))
+        if slot is None or not self._open_for_reading():
+            return None
+        record = self._read_slot(slot)
+        if record is None or record[0] <= (time.time() - max_age_sec) * 1000:
+            return None
+        return record
+
+    def read_all(self, max_age_sec):
+        """{(database, measurement): (time in ms, fields)} of the records not older
+        than max_age_sec, empty if the bus does not exist"""
+        if not self._open_for_reading():
+            return {}
+        oldest_ms = (time.time() - max_age_sec) * 1000
+        records = {}
+        for slot, key in enumerate(self.SLOTS):
+            record = self._read_slot(slot)
+            if record is not None and record[0] > oldest_ms:
+                records[key] = record
+        return records
@@ -1,24 +1,31 @@
 #!/usr/bin/env python3
 
-import board
-import busio
-import adafruit_ltr390
-from persistent_storage import PersistentStorage
 from datetime import datetime, timezone
-import time
-from constants import SLEEP_DURATION_SECONDS
-
-
-i2c = busio.I2C(board.SCL, board.SDA)
-ltr = adafruit_ltr390.LTR390(i2c)
-persistent_storage = PersistentStorage()
-
-while True:
-    timestamp = datetime.now(timezone.utc)
-    visible_light_lux = ltr.lux
-    uv_index = ltr.uvi
-    persistent_storage.write_light_data(timestamp, visible_light_lux, uv_index)
-    
-    local_time = timestamp.astimezone().strftime('%d/%m/%Y, %H:%M:%S')
-    print(f'Timestamp: {local_time}, Visible Light: {visible_light_lux:.1f} lux, UV Index: {uv_index:.1f}', flush=True)
-    time.sleep(SLEEP_DURATION_SECONDS)
+from i2c_sensor import I2CSensor, SharedI2CBus
+from persistent_storage import PersistentStorage
+
+
+class LightSensor(I2CSensor):
+    """LTR390 visible light and UV index"""
+    ADAPTIVE_TOLERANCES = {"visible_light_lux": (1.0, 0.05), "uv_index": (0.1, 0.0)}
+
+    def __init__(self, persistent_storage, bus: SharedI2CBus):
+        super().__init__(persistent_storage, bus)
+        import adafruit_ltr390
+        with self._bus.lock:
+            self._ltr = adafruit_ltr390.LTR390(self._bus.i2c())
+
+    def sample(self):
+        with self._bus.lock:
+            timestamp = datetime.now(timezone.utc)
+            visible_light_lux = self._ltr.lux
+            uv_index = self._ltr.uvi
+        self._storage.write_light_data(timestamp, visible_light_lux, uv_index)
+
+        local_time = timestamp.astimezone().strftime('%d/%m/%Y, %H:%M:%S')
+        print(f'Timestamp: {local_time}, Visible Light: {visible_light_lux:.1f} lux, UV Index: {uv_index:.1f}', flush=True)
+        return {"visible_light_lux": visible_light_lux, "uv_index": uv_index}
+
+
+if __name__ == "__main__":
+    LightSensor(PersistentStorage(), SharedI2CBus()).run()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+import math
+import numbers
+
+
+class LineProtocol:
+    """InfluxDB line protocol of the records, (measurement, time in ms since
+    epoch, {field: value}), without tags and with a time in ms:
+
+        measurement field=1.5,count=3i,flag=true,text="a \\"b\\"" 1700000000000
+
+    None and non finite float values are skipped, InfluxDB rejects the latter.
+    Other number types, e.g. the numpy scalars, are written as the int or
+    float they stand for.
+    A record without any field left has no line. A newline in a string value
+    is written as \\n so that a line is always a record.
+
+    The records are encoded by an Encoder compiled once per measurement and
+    field names, which keeps the escaped measurement and "field=" prefixes and
+    formats the values straight into a list of parts joined once per batch."""
+
+    class Encoder:
+        def __init__(self, measurement, field_names):
+            self.measurement = measurement
+            self.field_names = tuple(field_names)
+            self._prefix = LineProtocol._escape_measurement(measurement) + " "
+            self._keys = tuple(LineProtocol._escape_key(name) + "=" for name in self.field_names)
+
+        def encode_into(self, parts, time_ms, values):
+            """Append the line of the values, in the order of field_names, to parts, False if none is set"""
+            start = len(parts)
+            parts.append(self._prefix)
+            separator = ""
+            for key, value in zip(self._keys, values):
+                if value is None:
+                    continue
+                formatter = LineProtocol._FORMATTERS.get(type(value))
+                value = formatter(value) if formatter is not None else LineProtocol._format_value(value)
+                if value is None:
+                    continue
+                parts.append(separator)
+                parts.append(key)
+                parts.append(value)
+                separator = ","
+            if not separator:
+                del parts[start:]
+                return False
+            parts.append(f" {int(time_ms)}\n")
+            return True
+
+    _encoders = {} # (measurement, field names): Encoder
+
+    @staticmethod
+    def encoder(measurement, field_names):
+        """Encoder of a measurement and field names, compiled on first use"""
+        key = (measurement, tuple(field_names))
+        encoder = LineProtocol._encoders.get(key)
+        if encoder is None:
+            encoder = LineProtocol._encoders[key] = LineProtocol.Encoder(*key)
+        return encoder
+
+    @staticmethod
+    def _escape_key(key):
+        return key.replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+
+    @staticmethod
+    def _escape_measurement(measurement):
+        return measurement.replace(",", "\\,").replace(" ", "\\ ")
+
+    @staticmethod
+    def _format_float(value):
+        return repr(value) if math.isfinite(value) else None
+
+    @staticmethod
+    def _format_value(value):
+        # bool is an int, check it first
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, numbers.Integral):
+            return f"{int(value)}i"
+        if isinstance(value, numbers.Real):
+            value = float(value)
+            return repr(value) if math.isfinite(value) else None
+        if hasattr(value, "item") and "numpy" == type(value).__module__:
+            # numpy.bool_ is not a number
+            return LineProtocol._format_value(value.item())
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        return f'"{value}"'
+
+    # formatter by exact value type, faster than the isinstance chain of _format_value
+    _FORMATTERS = {
+        float: _format_float,
+        int: lambda value: f"{value}i",
+        bool: lambda value: "true" if value else "false",
+        str: _format_value
+    }
+
+    @staticmethod
+    def encode(record):
+        """Line of a record, None if it has no field"""
+        parts = []
+        measurement, time_ms, fields = record
+        if not LineProtocol.encoder(measurement, fields).encode_into(parts, time_ms, fields.values()):
+            return None
+        return "".join(parts)[:-1]
+
+    @staticmethod
+    def encode_all(records):
+        """Lines of the records, each ending with a newline"""
+        parts = []
+        encoders = LineProtocol._encoders
+        for measurement, time_ms, fields in records:
+            encoder = encoders.get((measurement, tuple(fields)))
+            if encoder is None:
+                encoder = LineProtocol.encoder(measurement, fields)
+            encoder.encode_into(parts, time_ms, fields.values())
+        return "".join(parts)
+
+    @staticmethod
+    def _split(line, separators, start):
+        """(unescaped token up to the first unquoted separator, index of the separator or len(line))"""
+        token = []
+        quoted = False
+        i = start
+        while i < len(line):
+            c = line[i]
+            if "\\" == c and i + 1 < len(line):
+                token.append(c + line[i + 1])
+                i += 2
+                continue
+            if '"' == c:
+                quoted = not quoted
+            elif not quoted and c in separators:
+                break
+            token.append(c)
+            i += 1
+        return "".join(token), i
+
+    @staticmethod
+    def _unescape(text):
+        result = []
+        i = 0
+        while i < len(text):
+            if "\\" == text[i] and i + 1 < len(text):
+                result.append("\n" if "n" == text[i + 1] else text[i + 1])
+                i += 2
+            else:
+                result.append(text[i])
+                i += 1
+        return "".join(result)
+
+    @staticmethod
+    def _parse_value(text):
+        if text.startswith('"'):
+            return LineProtocol._unescape(text[1:-1])
+        if text in ("t", "T", "true", "True", "TRUE"):
+            return True
+        if text in ("f", "F", "false", "False", "FALSE"):
+            return False
+        if text.endswith("i") or text.endswith("u"):
+            return int(text[:-1])
+        return float(text)
+
+    @staticmethod
+    def decode(line):
+        """Record of a line written by encode, raises ValueError for an invalid line"""
+        measurement, i = LineProtocol._split(line, ", ", 0)
+        if i >= len(line):
+            raise ValueError(f"Missing fields: {line}")
+        if "," == line[i]:
+            raise ValueError(f"Tags are not supported: {line}")
+        fields = {}
+        while True:
+            pair, i = LineProtocol._split(line, ", ", i + 1)
+            key, separator = LineProtocol._split(pair, "=", 0)
+            if separator >= len(pair):
+                raise ValueError(f"Invalid field '{pair}': {line}")
+            fields[LineProtocol._unescape(key)] = LineProtocol._parse_value(pair[separator + 1:])
+            if i >= len(line) or " " == line[i]:
+                break
+        if i >= len(line):
+            raise ValueError(f"Missing time: {line}")
+        return LineProtocol._unescape(measurement), int(line[i + 1:]), fields
+
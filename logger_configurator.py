@@ -21,10 +21,11 @@ class LoggerConfigurator:
     @staticmethod
     def configure_logger(class_name):
         logger = logging.getLogger(f"AQI.{class_name}")
-
-        lc = LoggerConfigurator()
-        logger.setLevel(lc.log_level)
-        logger.addHandler(lc.file_handler)
+        # the loggers are shared by the instances of a class, e.g. the sensors restarted by I2CSensorRuntime
+        if not logger.handlers:
+            lc = LoggerConfigurator()
+            logger.setLevel(lc.log_level)
+            logger.addHandler(lc.file_handler)
         return logger
     
     @staticmethod
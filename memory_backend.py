@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+from collections import deque
+from datetime import datetime, timezone
+from storage_backend import StorageBackend
+import threading
+import time
+import pyarrow
+
+
+class MemoryBackend(StorageBackend):
+    """Ring of the last RING_SIZE rows of every measurement, kept in the memory
+    of the process. Nothing is shared with other processes nor persisted, so it
+    is meant for benchmarks and tests of a single process, e.g. the dashboard
+    fed by a synthetic writer."""
+    RING_SIZE = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rings = {}   # (database, measurement): deque of [time in ms, {field: value}]
+        self._columns = {} # (database, measurement): {column: data type}
+
+    def write(self, db, records):
+        size = 0
+        with self._lock:
+            for record in records:
+                measurement, time_ms, fields = record
+                fields = {k: v for k, v in fields.items() if v is not None}
+                key = (db, measurement)
+                ring = self._rings.get(key)
+                if ring is None:
+                    ring = deque(maxlen=self.RING_SIZE)
+                    self._rings[key] = ring
+                    self._columns[key] = {"time": "Timestamp(Nanosecond, None)"}
+                columns = self._columns[key]
+                for field, value in fields.items():
+                    columns.setdefault(field, StorageBackend.data_type(value))
+                # same time as the newest row: the fields are merged like InfluxDB does
+                if ring and ring[-1][0] == time_ms:
+                    ring[-1][1].update(fields)
+                else:
+                    ring.append([time_ms, fields])
+                size += StorageBackend.record_size(record)
+        return size
+
+    def _record(self, key, row):
+        record = {column: None for column in self._columns[key]}
+        record.update(row[1])
+        record["time"] = StorageBackend.from_epoch_ms(row[0])
+        return record
+
+    def read_latest(self, db, measurement, max_age_sec):
+        key = (db, measurement)
+        oldest_ms = (time.time() - max_age_sec) * 1000
+        with self._lock:
+            ring = self._rings.get(key)
+            if not ring:
+                return None
+            newest = max(ring, key=lambda row: row[0])
+            if newest[0] <= oldest_ms:
+                return None
+            return self._record(key, newest)
+
+    def read_schema(self, db):
+        with self._lock:
+            return {measurement: dict(columns) for (database, measurement), columns in self._columns.items() if database == db}
+
+    def read_latest_snapshot(self, db, tables, max_age_sec):
+        snapshot = {}
+        for measurement in tables:
+            record = self.read_latest(db, measurement, max_age_sec)
+            if record is not None:
+                snapshot[measurement] = record
+        return snapshot
+
+    @staticmethod
+    def _aggregate_values(function, columns, rows):
+        if "weighted_avg" == function:
+            value_column, weight_column = columns
+            pairs = [(row[value_column], row[weight_column]) for row in rows
+                     if row.get(value_column) is not None and row.get(weight_column) is not None]
+            weight = sum(w for _, w in pairs)
+            return sum(v * w for v, w in pairs) / weight if weight else None
+        values = [row[columns[0]] for row in rows if row.get(columns[0]) is not None]
+        if "count" == function:
+            return len(values)
+        if not values:
+            return None
+        if "min" == function:
+            return min(values)
+        if "max" == function:
+            return max(values)
+        if "sum" == function:
+            return sum(values)
+        if "avg" == function:
+            return sum(values) / len(values)
+        raise ValueError(f"Unknown aggregate function '{function}'")
+
+    def aggregate(self, db, measurement, projections, start: datetime, stop: datetime, bucket_seconds):
+        start_ms = StorageBackend.to_epoch_ms(start)
+        stop_ms = StorageBackend.to_epoch_ms(stop)
+        bucket_ms = bucket_seconds * 1000
+        buckets = {} # bucket start: rows
+        with self._lock:
+            for time_ms, fields in self._rings.get((db, measurement), ()):
+                if start_ms <= time_ms < stop_ms:
+                    buckets.setdefault(time_ms // bucket_ms * bucket_ms, []).append(fields)
+        times = sorted(buckets)
+        columns = {"time": pyarrow.array(times, type=pyarrow.timestamp("ms"))}
+        for alias, (function, *projection_columns) in projections.items():
+            columns[alias] = pyarrow.array([MemoryBackend._aggregate_values(function, projection_columns, buckets[t]) for t in times])
+        return pyarrow.table(columns)
+
+    def read_time_range(self, db, measurement):
+        with self._lock:
+            ring = self._rings.get((db, measurement))
+            if not ring:
+                return None
+            times = [row[0] for row in ring]
+        return (datetime.fromtimestamp(min(times) / 1000, timezone.utc),
+                datetime.fromtimestamp(max(times) / 1000, timezone.utc))
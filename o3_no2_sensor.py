@@ -1,41 +1,56 @@
 #!/usr/bin/env python3
 
-from zmod4510 import ZMOD4510, ZMODStatus
-from persistent_storage import PersistentStorage
-from logger_configurator import LoggerConfigurator
 from datetime import datetime, timezone
+from i2c_sensor import I2CSensor, SharedI2CBus
+from persistent_storage import PersistentStorage
+from compensation_feed import CompensationFeed
+
+
+class O3No2Sensor(I2CSensor):
+    """ZMOD4510 O3 and NO2 concentrations and AQIs, compensated with the
+    temperature and relative humidity of the other sensors when available,
+    read from the CompensationFeed.
+    The OAQ 2nd Gen algorithm of the device takes a sample every 6 seconds,
+    the driver was called in a busy loop before. The driver opens its own
+    handle of the bus, the shared lock still serializes the accesses."""
+    PERIOD_SEC = 6
+
+    def __init__(self, persistent_storage, bus: SharedI2CBus):
+        super().__init__(persistent_storage, bus)
+        self._compensation = CompensationFeed(persistent_storage)
+        from zmod4510 import ZMOD4510, ZMODStatus
+        self._status = ZMODStatus
+        self._sensor = ZMOD4510(logger=self._logger)
+        if not self._sensor.start():
+            raise RuntimeError("Failed to start ZMOD4510 sensor")
+
+    def sample(self):
+        # Get real T/RH
+        temperature, relative_humidity = self._compensation.read()
+
+        # Get and process sensor data
+        with self._bus.lock:
+            if temperature is not None and relative_humidity is not None:
+                self._logger.debug(f"Using temperature: {temperature}, relative_humidity: {relative_humidity}")
+                data = self._sensor.get_data(temperature_celsius_deg=temperature, relative_humidity_percent=relative_humidity)
+            else:
+                data = self._sensor.get_data()
+
+        match data.status:
+            case self._status.STABILIZATION:
+                self._logger.debug("Warming up...")
+            case self._status.OK:
+                timestamp = datetime.now(timezone.utc)
+                self._storage.write_zmod4510_data(timestamp, data.o3_ppb, data.no2_ppb, data.fast_aqi, data.epa_aqi)
+
+                local_time = timestamp.astimezone().strftime('%d/%m/%Y, %H:%M:%S')
+                print(f"Timestamp: {local_time}, O3: {data.o3_ppb:.3f} ppb, NO2: {data.no2_ppb:.3f} ppb, "
+                      f"Fast AQI: {data.fast_aqi}, EPA AQI: {data.epa_aqi}")
+            case self._status.DAMAGE:
+                self._logger.error("Damaged.")
+            case _:
+                self._logger.error(f"Unknown status: {data.status}")
 
 
-logger = LoggerConfigurator.configure_logger("O3No2Sensor")
-persistent_storage = PersistentStorage()
-sensor = ZMOD4510(logger=logger)
-
-if not sensor.start():
-    logger.error("Failed to start ZMOD4510 sensor")
-    exit(1)
-
-while True:
-    # Get real T/RH
-    temperature, relative_humidity = persistent_storage.read_temperature_relative_humidity_data()
-
-    # Get and process sensor data
-    if temperature is not None and relative_humidity is not None:
-        logger.debug(f"Using temperature: {temperature}, relative_humidity: {relative_humidity}")
-        data = sensor.get_data(temperature_celsius_deg=temperature, relative_humidity_percent=relative_humidity)
-    else:
-        data = sensor.get_data()
-            
-    match data.status:
-        case ZMODStatus.STABILIZATION:
-            logger.debug("Warming up...")
-        case ZMODStatus.OK:
-            timestamp = datetime.now(timezone.utc)
-            persistent_storage.write_zmod4510_data(timestamp, data.o3_ppb, data.no2_ppb, data.fast_aqi, data.epa_aqi)
-
-            local_time = timestamp.astimezone().strftime('%d/%m/%Y, %H:%M:%S')
-            print(f"Timestamp: {local_time}, O3: {data.o3_ppb:.3f} ppb, NO2: {data.no2_ppb:.3f} ppb, "
-                        f"Fast AQI: {data.fast_aqi}, EPA AQI: {data.epa_aqi}")
-        case ZMODStatus.DAMAGE:
-            logger.error("Damaged.")
-        case _:
-            logger.error(f"Unknown status: {data.status}")
\ No newline at end of file
+if __name__ == "__main__":
+    O3No2Sensor(PersistentStorage(), SharedI2CBus()).run()
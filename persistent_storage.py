@@ -1,21 +1,65 @@
 #!/usr/bin/env python3
-#
-# sudo systemctl status influxdb3-core
-# journalctl -u influxdb3-core
-# influxdb3 show databases
-# curl "http://localhost:8181/health" --header "Authorization: Bearer $INFLUXDB3_ADMIN_TOKEN"
 
-from influxdb_client_3 import InfluxDBClient3, WritePrecision, Point
 from typing import Dict
 from logger_configurator import LoggerConfigurator
+from storage_instrumentation import StorageInstrumentation
+from storage_backend import StorageBackend
+from latest_value_bus import LatestValueBus
+from ingestion_gateway_client import IngestionGatewayClient
+from batch_writer import BatchWriter
+from write_spool import WriteSpool
+from write_compressor import WriteCompressor
+from process_metrics import ProcessMetrics
 from enum import Enum
-import pandas
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import atexit
+import signal
+import threading
+import time
+import math
 import os, sys
 
 
 class PersistentStorage:
-    auth_scheme = "Bearer"
-    host = "http://localhost:8181"
+    """Writes the sensor data and reads it back through a StorageBackend,
+    selected with the AQ_STORAGE_BACKEND environment variable:
+        influxdb  InfluxDB 3 server (default)
+        sqlite    SQLite files in WAL mode, in AQ_SQLITE_DIRECTORY
+        memory    ring buffers in the memory of the process, for benchmarks
+
+    The backends, and pyarrow with them, are imported when the backend is
+    created. With the ingestion gateway, this happens on first use only, so
+    that a sensor service writing through the gateway starts without them."""
+    BACKENDS = ("influxdb", "sqlite", "memory")
+    DEFAULT_SQLITE_DIRECTORY = "data"
+    DEFAULT_SPOOL_DIRECTORY = "spool"
+    # the latest records are looked for in that time window
+    LATEST_MAX_AGE_SEC = 10 * 60
+    # upper bound of concurrent queries issued by the async read path
+    READ_WORKERS = 8
+    # how often the table layout used by the latest snapshot query is refreshed
+    SNAPSHOT_SCHEMA_REFRESH_SEC = 5 * 60
+    # history queries are downsampled to at most that many buckets
+    HISTORY_MAX_POINTS = 10000
+    # projections of StorageBackend.aggregate
+    HISTORY_AGGREGATES = {
+        "mean": ("avg", "{field}"),
+        "min": ("min", "{field}"),
+        "max": ("max", "{field}")
+    }
+    # same aggregates computed from the min/mean/max/count columns of a rollup table
+    ROLLUP_HISTORY_AGGREGATES = {
+        "mean": ("weighted_avg", "{field}_mean", "{field}_count"),
+        "min": ("min", "{field}_min"),
+        "max": ("max", "{field}_max")
+    }
+    ROLLUP_TABLE_INFIX = "_rollup_"
+    # fields of a PMSA003 sample written by write_pm and write_pm_many
+    PM_FIELDS = ("pm10_cf1", "pm25_cf1", "pm100_cf1", "pm10_std", "pm25_std", "pm100_std",
+                 "gr03um", "gr05um", "gr10um", "gr25um", "gr50um", "gr100um")
+    NUMERIC_DATA_TYPES = ("Float64", "Int64", "UInt64")
 
     class Database(Enum):
         Dust = "dust"
@@ -37,69 +81,226 @@ class PersistentStorage:
         ZE07CO = "ze07co"
         AIRTHINGS_RADON = "airthings_radon"
 
-    def __init__(self):
+    def __init__(self, use_gateway=True, buffered=None):
+        """use_gateway False writes directly to the backend even when AQ_INGESTION_GATEWAY is set,
+        as the gateway itself does. buffered True queues the writes on a BatchWriter and returns
+        immediately, by default when AQ_BUFFERED_WRITES is on."""
         self._logger = LoggerConfigurator.configure_logger(self.__class__.__name__)
-        self._token = os.environ.get("INFLUXDB3_AUTH_TOKEN")
-        if not self._token:
-            print("Error: INFLUXDB3_AUTH_TOKEN environment variable is not set.")
+        self.instrumentation = StorageInstrumentation()
+        self._backend_instance = None
+        self._backend_lock = threading.Lock()
+        self._startup_logged = False
+        self._read_executor = None
+        self._snapshot_schema = {} # database: (timestamp, {table: {column: data type}})
+        self._latest_snapshot = None # (timestamp, snapshot) of the last read_latest_snapshot*
+        # newest records shared with the dashboard with AQ_LATEST_VALUE_BUS on, otherwise read from the backend
+        self._bus = LatestValueBus.configured()
+        # writes sent to the ingestion gateway service, if it is enabled and running
+        self._gateway = None
+        socket_path = IngestionGatewayClient.socket_path_from_env() if use_gateway else None
+        if socket_path is not None:
+            self._gateway = IngestionGatewayClient(socket_path)
+            self._logger.info(f"Sending the writes to the ingestion gateway at {socket_path}")
+        if self._gateway is None:
+            # an invalid configuration or token exits right away
+            self._backend_instance = self._create_backend()
+        if buffered is None:
+            buffered = os.environ.get("AQ_BUFFERED_WRITES", "off").lower() in ("on", "true", "1")
+        self._batch_writer = None
+        if buffered:
+            self._batch_writer = BatchWriter(self._write_database_records)
+        # records that cannot be written are kept on disk and replayed, with AQ_WRITE_SPOOL on or set to a directory
+        self._spool = None
+        spool_directory = self._spool_directory_from_env()
+        if spool_directory is not None:
+            self._spool = WriteSpool(spool_directory, self._write_backend)
+            self._logger.info(f"Spooling the records that cannot be written to {spool_directory}")
+        # records the stored series can reconstruct are dropped, with AQ_WRITE_COMPRESSION on or set to tolerances
+        self._compressor = WriteCompressor.configured()
+        if self._compressor is not None:
+            self._logger.info("Compressing the records written with the swinging door algorithm")
+        if self._batch_writer is not None or self._spool is not None or self._compressor is not None:
+            atexit.register(self.close)
+            # systemctl stop sends SIGTERM, which would otherwise exit without running atexit
+            if threading.current_thread() is threading.main_thread() and signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+                signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    @property
+    def _backend(self) -> StorageBackend:
+        if self._backend_instance is None:
+            with self._backend_lock:
+                if self._backend_instance is None:
+                    self._backend_instance = self._create_backend()
+        return self._backend_instance
+
+    def _create_backend(self) -> StorageBackend:
+        backend = os.environ.get("AQ_STORAGE_BACKEND", "influxdb").lower()
+        if "sqlite" == backend:
+            from sqlite_backend import SQLiteBackend
+            directory = os.environ.get("AQ_SQLITE_DIRECTORY", self.DEFAULT_SQLITE_DIRECTORY)
+            self._logger.info(f"Using the SQLite storage backend in {directory}")
+            return SQLiteBackend(directory)
+        if "memory" == backend:
+            from memory_backend import MemoryBackend
+            self._logger.info("Using the in-memory storage backend")
+            return MemoryBackend()
+        if "influxdb" != backend:
+            print(f"Error: unknown AQ_STORAGE_BACKEND '{backend}', expected one of {', '.join(self.BACKENDS)}.")
             sys.exit(1)
+        from influxdb_backend import InfluxDBBackend
+        return InfluxDBBackend(self.instrumentation)
 
-        self._clients: Dict[str, InfluxDBClient3] = {}
-        self._verify_token()
-
-    def get_client(self, database: str) -> InfluxDBClient3:
-        """Get or create a client for specific database"""
-        if database not in self._clients:
-            self._clients[database] = InfluxDBClient3(
-                host=self.host,
-                token=self._token,
-                database=database,
-                auth_scheme=self.auth_scheme
-            )
-        return self._clients[database]
-
-    def _verify_token(self):
-        try:
-            client = self.get_client(self.Database.Dust.value)
-            client.query("SELECT 1")
-            self._logger.info("Token verification successful.")
-        except Exception as e:
-            if "unauthorized" in str(e).lower() or "authentication" in str(e).lower():
-                self._logger.error(f"Token verification failed: {e}")
-            else:
-                self._logger.error(f"An unexpected error occurred during token verification: {e}")
-            sys.exit(1)
-
-    def _write(self, db: Database, point: Point):
-        client = self.get_client(db.value)
-        client.write(record=point, write_precision=WritePrecision.MS)
+    def _spool_directory_from_env(self):
+        value = os.environ.get("AQ_WRITE_SPOOL", "off")
+        if value.lower() in ("off", "false", "0", ""):
+            return None
+        if value.lower() in ("on", "true", "1"):
+            return self.DEFAULT_SPOOL_DIRECTORY
+        return value
+
+    def get_statistics(self):
+        """Latency, error and volume statistics of the storage operations, see StorageInstrumentation.get_statistics,
+        with the write queue statistics of the BatchWriter when the writes are buffered, and the
+        WriteSpool and WriteCompressor statistics when they are enabled"""
+        statistics = self.instrumentation.get_statistics()
+        if self._batch_writer is not None:
+            statistics["write_queue"] = self._batch_writer.get_statistics()
+        if self._spool is not None:
+            statistics["spool"] = self._spool.get_statistics()
+        if self._compressor is not None:
+            statistics["compression"] = self._compressor.get_statistics()
+        statistics["process"] = {"uptime_sec": ProcessMetrics.seconds_since_start(), "rss_bytes": ProcessMetrics.rss_bytes()}
+        return statistics
+
+    def flush(self):
+        """Write the buffered records now, False if some could not be written"""
+        if self._batch_writer is not None:
+            return self._batch_writer.flush()
+        return True
+
+    def close(self):
+        """Write the records held back by the compressor and the buffered ones and stop buffering,
+        then seal the spool"""
+        if self._compressor is not None:
+            for database, records in self._compressor.flush().items():
+                try:
+                    self._send(self.Database(database), records)
+                except Exception as e:
+                    self._logger.error(f"Cannot write {len(records)} compressed records to {database} on close: {e}")
+        if self._batch_writer is not None:
+            batch_writer = self._batch_writer
+            self._batch_writer = None
+            if not batch_writer.close():
+                self._logger.error(f"Records lost on close: {batch_writer.get_statistics()}")
+        if self._spool is not None:
+            spool = self._spool
+            self._spool = None
+            spool.close()
+
+    def _write(self, db: Database, measurement, timestamp, fields: Dict):
+        self._write_all(db, [(measurement, StorageBackend.to_epoch_ms(timestamp), fields)])
+
+    def _log_startup(self):
+        """Time from the start of the process to its first record and memory at that point, which
+        bound the data missed when a service is restarted"""
+        self._startup_logged = True
+        startup_sec = ProcessMetrics.seconds_since_start()
+        if startup_sec is not None:
+            self._logger.info(f"{os.path.basename(sys.argv[0])} wrote its first record {startup_sec:.2f} s after starting, "
+                              f"RSS {ProcessMetrics.rss_bytes() / 2**20:.1f} MB")
+
+    def _write_all(self, db: Database, records):
+        if not self._startup_logged:
+            self._log_startup()
+        if self._bus is not None:
+            measurement, time_ms, fields = max(records, key=lambda record: record[1])
+            try:
+                self._bus.publish(db.value, measurement, time_ms, fields)
+            except Exception as e:
+                self._logger.error(f"Cannot publish {measurement} to the latest value bus: {e}")
+        if self._compressor is not None:
+            records = self._compressor.compress(db.value, records)
+        self._send(db, records)
+
+    def _send(self, db: Database, records):
+        """Write the records through the gateway, the batch writer or the backend"""
+        if not records:
+            return
+        if self._gateway is not None:
+            records = [record for record in records if not self._gateway.send(db.value, record)]
+            if not records:
+                return
+        batch_writer = self._batch_writer
+        if batch_writer is not None:
+            # the records enqueued after the writer was closed are written at once
+            records = [record for record in records if not batch_writer.enqueue(db.value, record)]
+        self.write_records(db, records)
+
+    def write_many(self, db: Database, measurement, timestamps, columns: Dict):
+        """Write many samples of a measurement at once: columns is {field: values}, each
+        with one value per timestamp. Without the gateway or the buffered writes, they are
+        written with a single backend request instead of one per sample."""
+        fields = tuple(columns)
+        records = [
+            (measurement, StorageBackend.to_epoch_ms(timestamp), dict(zip(fields, values)))
+            for timestamp, values in zip(timestamps, zip(*columns.values()))
+        ]
+        if records:
+            self._write_all(db, records)
+
+    def _write_database_records(self, database, records):
+        self.write_records(self.Database(database), records)
+
+    def write_records(self, db: Database, records):
+        """Write (measurement, time in ms, {field: value}) records with a single backend request.
+        With the spool enabled, the records are spooled instead of raising when the backend fails,
+        and for RETRY_INTERVAL_SEC after a failure without trying the backend."""
+        if not records:
+            return
+        spool = self._spool
+        if spool is None:
+            self._write_backend(db.value, records)
+            return
+        if not spool.is_unreachable():
+            try:
+                self._write_backend(db.value, records)
+                return
+            except Exception as e:
+                self._logger.error(f"Cannot write {len(records)} records to {db.value}, spooling them: {e}")
+                spool.report_failure()
+        spool.append(db.value, records)
+
+    def _write_backend(self, database, records):
+        measurement = records[0][0] if all(record[0] == records[0][0] for record in records) else "batch"
+        with self.instrumentation.measure("write", database, measurement):
+            size = self._backend.write(database, records)
+        self.instrumentation.record_bytes_written(database, measurement, size)
 
     def write_pm(self, i, sample):
-        point = (
-            Point(f"{self.Point.PM.value}{i}")
-            .time(sample.timestamp)
-            .field("pm10_cf1", sample.pm10_cf1)
-            .field("pm25_cf1", sample.pm25_cf1)
-            .field("pm100_cf1", sample.pm100_cf1)
-            .field("pm10_std", sample.pm10_std)
-            .field("pm25_std", sample.pm25_std)
-            .field("pm100_std", sample.pm100_std)
-            .field("gr03um", sample.gr03um)
-            .field("gr05um", sample.gr05um)
-            .field("gr10um", sample.gr10um)
-            .field("gr25um", sample.gr25um)
-            .field("gr50um", sample.gr50um)
-            .field("gr100um", sample.gr100um)
-        )
-        self._write(self.Database.Dust, point)
+        self._write(self.Database.Dust, f"{self.Point.PM.value}{i}", sample.timestamp, {
+            "pm10_cf1": sample.pm10_cf1,
+            "pm25_cf1": sample.pm25_cf1,
+            "pm100_cf1": sample.pm100_cf1,
+            "pm10_std": sample.pm10_std,
+            "pm25_std": sample.pm25_std,
+            "pm100_std": sample.pm100_std,
+            "gr03um": sample.gr03um,
+            "gr05um": sample.gr05um,
+            "gr10um": sample.gr10um,
+            "gr25um": sample.gr25um,
+            "gr50um": sample.gr50um,
+            "gr100um": sample.gr100um
+        })
+
+    def write_pm_many(self, i, samples):
+        """Write a sequence of samples of the PMSA003 sensor i with write_many"""
+        self.write_many(self.Database.Dust, f"{self.Point.PM.value}{i}", [sample.timestamp for sample in samples],
+                        {field: [getattr(sample, field) for sample in samples] for field in self.PM_FIELDS})
 
     def write_aqi(self, timestamp, pm25_cf1_aqi):
-        point = (
-            Point(self.Point.AQI.value)
-            .time(timestamp)
-            .field("pm25_cf1_aqi", pm25_cf1_aqi)
-        )
-        self._write(self.Database.Dust, point)
+        self._write(self.Database.Dust, self.Point.AQI.value, timestamp, {
+            "pm25_cf1_aqi": pm25_cf1_aqi
+        })
 
     def write_sound_pressure_level(self, timestamp, spl, diagnostics: Dict = None):
         """Write the calibrated sound pressure level, plus optional diagnostic
@@ -108,137 +309,125 @@ class PersistentStorage:
         is_night_anomaly) so that nighttime anomalies and calibration health
         can be audited after the fact instead of only seeing the final
         calibrated number."""
-        point = (
-            Point(self.Point.Sound.value)
-            .time(timestamp)
-            .field("sound_pressure_level", spl)
-        )
+        fields = {"sound_pressure_level": spl}
         if diagnostics:
             for key in ("la90_raw", "baseline", "offset", "offset_saturation_pct", "night_reference"):
                 value = diagnostics.get(key)
                 if value is not None:
-                    point = point.field(key, float(value))
+                    fields[key] = float(value)
             for key in ("is_transient", "in_quiet_hours", "is_night_anomaly"):
                 value = diagnostics.get(key)
                 if value is not None:
-                    point = point.field(key, bool(value))
-        self._write(self.Database.Sound, point)
+                    fields[key] = bool(value)
+        self._write(self.Database.Sound, self.Point.Sound.value, timestamp, fields)
 
     def write_ambient_data(self, timestamp, temperature, gas, relative_humidity, pressure, iaq, thom_discomfort_index=None):
-        point = (
-            Point(self.Point.BME688.value)
-            .time(timestamp)
-            .field("gas_resistance", gas)
-            .field("iaq", iaq)
-        )
-        self._write(self.Database.Gas, point)
-        point = (
-            Point(self.Point.BME688.value)
-            .time(timestamp)
-            .field("temperature", temperature)
-            .field("relative_humidity", relative_humidity)
-            .field("pressure", pressure)
-        )
-        if thom_discomfort_index is not None:
-            point = point.field("thom_discomfort_index", thom_discomfort_index)
-        self._write(self.Database.Climate, point)
+        self._write(self.Database.Gas, self.Point.BME688.value, timestamp, {
+            "gas_resistance": gas,
+            "iaq": iaq
+        })
+        self._write(self.Database.Climate, self.Point.BME688.value, timestamp, {
+            "temperature": temperature,
+            "relative_humidity": relative_humidity,
+            "pressure": pressure,
+            "thom_discomfort_index": thom_discomfort_index
+        })
 
     def write_light_data(self, timestamp, visible_light_lux, uv_index):
-        point = (
-            Point(self.Point.LTR390.value)
-            .time(timestamp)
-            .field("visible_light_lux", visible_light_lux)
-            .field("uv_index", uv_index)
-        )
-        self._write(self.Database.Light, point)
+        self._write(self.Database.Light, self.Point.LTR390.value, timestamp, {
+            "visible_light_lux": visible_light_lux,
+            "uv_index": uv_index
+        })
 
     def write_co2_data(self, timestamp, co2, temperature, relative_humidity):
-        point = (
-            Point(self.Point.SCD41.value)
-            .time(timestamp)
-            .field("co2", co2)
-        )
-        self._write(self.Database.Gas, point)
-        point = (
-            Point(self.Point.SCD41.value)
-            .time(timestamp)
-            .field("temperature", temperature)
-            .field("relative_humidity", relative_humidity)
-        )
-        self._write(self.Database.Climate, point)
+        self._write(self.Database.Gas, self.Point.SCD41.value, timestamp, {
+            "co2": co2
+        })
+        self._write(self.Database.Climate, self.Point.SCD41.value, timestamp, {
+            "temperature": temperature,
+            "relative_humidity": relative_humidity
+        })
 
     def write_bmp390l_data(self, timestamp, temperature, pressure, altitude):
-        point = (
-            Point(self.Point.BMP390l.value)
-            .time(timestamp)
-            .field("temperature", temperature)
-            .field("pressure", pressure)
-            .field("altitude", altitude)
-        )
-        self._write(self.Database.Climate, point)
+        self._write(self.Database.Climate, self.Point.BMP390l.value, timestamp, {
+            "temperature": temperature,
+            "pressure": pressure,
+            "altitude": altitude
+        })
 
     def write_sgp41_data(self, timestamp, voc_index, nox_index):
-        point = (
-            Point(self.Point.SGP41.value)
-            .time(timestamp)
-            .field("voc_index", voc_index)
-            .field("nox_index", nox_index)
-        )
-        self._write(self.Database.Gas, point)
+        self._write(self.Database.Gas, self.Point.SGP41.value, timestamp, {
+            "voc_index": voc_index,
+            "nox_index": nox_index
+        })
 
     def write_radon_data(self, timestamp, radon_1day_avg, radon_week_avg, radon_year_avg, temperature, relative_humidity):
         if radon_1day_avg is not None or radon_week_avg is not None or radon_year_avg is not None:
-            point = (
-                Point(self.Point.AIRTHINGS_RADON.value)
-                .time(timestamp)
-                .field("radon_1day_avg", radon_1day_avg)
-                .field("radon_week_avg", radon_week_avg)
-                .field("radon_year_avg", radon_year_avg)
-            )
-            self._write(self.Database.Gas, point)
+            self._write(self.Database.Gas, self.Point.AIRTHINGS_RADON.value, timestamp, {
+                "radon_1day_avg": radon_1day_avg,
+                "radon_week_avg": radon_week_avg,
+                "radon_year_avg": radon_year_avg
+            })
         if temperature is not None or relative_humidity is not None:
-            point = (
-                Point(self.Point.AIRTHINGS_RADON.value)
-                .time(timestamp)
-                .field("temperature", temperature)
-                .field("relative_humidity", relative_humidity)
-            )
-            self._write(self.Database.Climate, point)
+            self._write(self.Database.Climate, self.Point.AIRTHINGS_RADON.value, timestamp, {
+                "temperature": temperature,
+                "relative_humidity": relative_humidity
+            })
 
     def write_zmod4510_data(self, timestamp, o3_ppb, no2_ppb, fast_aqi, epa_aqi):
-        point = (
-            Point(self.Point.ZMOD4510.value)
-            .time(timestamp)
-            .field("o3_ppb", o3_ppb)
-            .field("no2_ppb", no2_ppb)
-            .field("fast_aqi", fast_aqi)
-            .field("epa_aqi", epa_aqi)
-        )
-        self._write(self.Database.Gas, point)
+        self._write(self.Database.Gas, self.Point.ZMOD4510.value, timestamp, {
+            "o3_ppb": o3_ppb,
+            "no2_ppb": no2_ppb,
+            "fast_aqi": fast_aqi,
+            "epa_aqi": epa_aqi
+        })
 
     def write_co_data(self, timestamp, co_ppm):
-        point = (
-            Point(self.Point.ZE07CO.value)
-            .time(timestamp)
-            .field("co_ppm", co_ppm)
-        )
-        self._write(self.Database.Gas, point)
+        self._write(self.Database.Gas, self.Point.ZE07CO.value, timestamp, {
+            "co_ppm": co_ppm
+        })
 
     def _read(self, db: Database, point_name):
         try:
-            client = self.get_client(db.value)
-            df = client.query(
-                        query=f'SELECT * FROM "{point_name}" WHERE time > now() - interval \'10 minutes\' ORDER BY time DESC LIMIT 1',
-                        language="sql",
-                        mode="pandas"
-                    )
-            records = df.to_dict(orient="records")
-            return records[-1] if records else None
-        except Exception:
-            pass
-            # self._logger.error(f"Cannot read from {point_name}")
+            with self.instrumentation.measure("read", db.value, point_name):
+                return self._backend.read_latest(db.value, point_name, self.LATEST_MAX_AGE_SEC)
+        except Exception as e:
+            # counted by the instrumentation, a missing table is not worth more than a debug line
+            self._logger.debug(f"Cannot read from {point_name}: {e}")
         return None
 
+    async def _run_in_read_pool(self, func, *args):
+        """Run a blocking read on the bounded read thread pool so that the event loop is never blocked by a query"""
+        if self._read_executor is None:
+            self._read_executor = ThreadPoolExecutor(max_workers=self.READ_WORKERS, thread_name_prefix="storage-read")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._read_executor, func, *args)
+
+    def _read_snapshot_schema(self, db: Database):
+        schema = self._snapshot_schema.get(db)
+        if schema is not None and time.time() - schema[0] < self.SNAPSHOT_SCHEMA_REFRESH_SEC:
+            return schema[1]
+        tables = self._backend.read_schema(db.value)
+        self._snapshot_schema[db] = (time.time(), tables)
+        return tables
+
+    def _read_latest_database(self, db: Database):
+        """Newest record of every measurement in db, fetched with a single query"""
+        for _ in range(2):
+            try:
+                tables = {
+                    k: v for k, v in self._read_snapshot_schema(db).items()
+                    if not PersistentStorage.is_rollup_table(k)
+                }
+                if not tables:
+                    return {}
+                with self.instrumentation.measure("read", db.value, "latest_snapshot"):
+                    return self._backend.read_latest_snapshot(db.value, tables, self.LATEST_MAX_AGE_SEC)
+            except Exception:
+                # a table or column may have appeared or vanished, retry with a fresh layout
+                self._snapshot_schema.pop(db, None)
+        return {}
+
     @staticmethod
     def _merge(left, right):
         if left is None and right is None:
@@ -295,3 +484,166 @@ class PersistentStorage:
     
     def read_co_data(self):
         return self._read(self.Database.Gas, self.Point.ZE07CO.value)
+
+    def _read_latest_bus(self):
+        """Latest snapshot from the latest value bus, None if the bus does not exist"""
+        if self._bus is None or not self._bus.is_available():
+            return None
+        snapshot = {db: {} for db in self.Database}
+        for (database, measurement), (time_ms, fields) in self._bus.read_all(self.LATEST_MAX_AGE_SEC).items():
+            snapshot[self.Database(database)][measurement] = {"time": StorageBackend.from_epoch_ms(time_ms)} | fields
+        return snapshot
+
+    def read_latest_snapshot(self):
+        """Newest record of every measurement, keyed by database and measurement
+        name. Read from the latest value bus when the sensor services publish to
+        it, otherwise costs one query per database."""
+        snapshot = self._read_latest_bus()
+        if snapshot is None:
+            snapshot = {db: self._read_latest_database(db) for db in self.Database}
+        self._latest_snapshot = (time.time(), snapshot)
+        return snapshot
+
+    async def read_latest_snapshot_async(self):
+        """Same as read_latest_snapshot, with the databases queried concurrently"""
+        snapshot = self._read_latest_bus()
+        if snapshot is not None:
+            self._latest_snapshot = (time.time(), snapshot)
+            return snapshot
+        databases = list(self.Database)
+        snapshots = await asyncio.gather(*(self._run_in_read_pool(self._read_latest_database, db) for db in databases))
+        snapshot = dict(zip(databases, snapshots))
+        self._latest_snapshot = (time.time(), snapshot)
+        return snapshot
+
+    def get_latest_snapshot(self):
+        """(time it was read, snapshot) of the last latest snapshot read, without
+        querying the databases, or None if none was read yet"""
+        return self._latest_snapshot
+
+    async def read_latest_async(self):
+        """Read the newest record of every measurement shown by the dashboard.
+        They come from the latest value bus when it exists, otherwise the
+        databases are queried concurrently, so the latency is that of the
+        slowest query instead of their sum. The records are the same as those
+        returned by the synchronous read_* methods, keyed by measurement name."""
+        snapshot = await self.read_latest_snapshot_async()
+        dust = snapshot[self.Database.Dust]
+        gas = snapshot[self.Database.Gas]
+        climate = snapshot[self.Database.Climate]
+        return {
+            "aqi": dust.get(self.Point.AQI.value),
+            "pm_0": dust.get(f'{self.Point.PM.value}0'),
+            "pm_1": dust.get(f'{self.Point.PM.value}1'),
+            "sound": snapshot[self.Database.Sound].get(self.Point.Sound.value),
+            "ambient": PersistentStorage._merge(gas.get(self.Point.BME688.value), climate.get(self.Point.BME688.value)),
+            "light": snapshot[self.Database.Light].get(self.Point.LTR390.value),
+            "co2": PersistentStorage._merge(gas.get(self.Point.SCD41.value), climate.get(self.Point.SCD41.value)),
+            "sgp41": gas.get(self.Point.SGP41.value),
+            "radon": gas.get(self.Point.AIRTHINGS_RADON.value),
+            "zmod4510": gas.get(self.Point.ZMOD4510.value),
+            "co": gas.get(self.Point.ZE07CO.value)
+        }
+
+    def _aggregate(self, db: Database, measurement, projections: Dict[str, tuple], start: datetime, stop: datetime, bucket_seconds: int):
+        """Group the rows of measurement in [start, stop) into buckets of bucket_seconds.
+        projections maps each output column to its (function, column...) aggregate."""
+        with self.instrumentation.measure("read", db.value, measurement):
+            return self._backend.aggregate(db.value, measurement, projections, start, stop, bucket_seconds)
+
+    @staticmethod
+    def rollup_table(measurement, resolution):
+        return f"{measurement}{PersistentStorage.ROLLUP_TABLE_INFIX}{resolution}"
+
+    @staticmethod
+    def is_rollup_table(table_name):
+        return PersistentStorage.ROLLUP_TABLE_INFIX in table_name
+
+    def read_numeric_fields(self, db: Database):
+        """Numeric fields of every measurement of db, rollup tables excluded"""
+        return {
+            table_name: sorted(column for column, data_type in columns.items() if data_type in self.NUMERIC_DATA_TYPES)
+            for table_name, columns in self._read_snapshot_schema(db).items()
+            if not PersistentStorage.is_rollup_table(table_name)
+        }
+
+    def read_time_range(self, db: Database, measurement):
+        """Time of the oldest and of the newest row of measurement, None if it has no rows"""
+        return self._backend.read_time_range(db.value, measurement)
+
+    def aggregate(self, db: Database, measurement, projections: Dict[str, tuple], start: datetime, stop: datetime, bucket_seconds: int):
+        return self._aggregate(db, measurement, projections, start, stop, bucket_seconds)
+
+    def write_table(self, db: Database, measurement, table):
+        """Write the rows of an Arrow table with a time column as points of measurement,
+        null values are skipped"""
+        records = []
+        for row in table.to_pylist():
+            time_ms = StorageBackend.to_epoch_ms(row.pop("time"))
+            records.append((measurement, time_ms, row))
+        self.write_records(db, records)
+
+    @staticmethod
+    def _projection(aggregate, field):
+        function, *columns = aggregate
+        return (function,) + tuple(column.format(field=field) for column in columns)
+
+    def read_history(self, measurement, fields, start: datetime, stop: datetime, points: int, aggregate="mean", rollups=None):
+        """Downsampled time series of the given fields of measurement, at most
+        points buckets between start and stop. Fields stored in different
+        databases (e.g. bme688 temperature and iaq) are joined on the bucket time.
+        When a RollupEngine is given, the buckets are computed from the coarsest
+        rollup finer than the bucket width, and only the time after its watermark
+        from the raw points. Returns the bucket width in seconds and an Arrow table
+        with a UTC millisecond time column followed by one column per field."""
+        if aggregate not in self.HISTORY_AGGREGATES:
+            raise ValueError(f"Unknown aggregate '{aggregate}', expected one of {list(self.HISTORY_AGGREGATES)}")
+        if not fields:
+            raise ValueError("At least one field must be provided")
+        if stop <= start:
+            raise ValueError("The start of the time range must be before its stop")
+        points = max(1, min(points, self.HISTORY_MAX_POINTS))
+        bucket_seconds = max(1, math.ceil((stop - start).total_seconds() / points))
+
+        # locate the database holding each field
+        fields_by_db = {}
+        for field in fields:
+            for db in self.Database:
+                data_type = self._read_snapshot_schema(db).get(measurement, {}).get(field)
+                if data_type is not None:
+                    break
+            if data_type is None:
+                raise ValueError(f"Unknown field '{field}' of measurement '{measurement}'")
+            if data_type not in self.NUMERIC_DATA_TYPES:
+                raise ValueError(f"Field '{field}' of measurement '{measurement}' is not numeric")
+            fields_by_db.setdefault(db, []).append(field)
+
+        split = start
+        rollup = rollups.select([(db, measurement) for db in fields_by_db], bucket_seconds) if rollups is not None else None
+        if rollup is not None:
+            resolution, resolution_seconds, watermark = rollup
+            # whole rollup rows must fall into a single bucket
+            bucket_seconds = math.ceil(bucket_seconds / resolution_seconds) * resolution_seconds
+            watermark_seconds = watermark.timestamp() // bucket_seconds * bucket_seconds
+            split = min(stop, max(start, datetime.fromtimestamp(watermark_seconds, timezone.utc)))
+
+        import pyarrow
+        import pyarrow.compute
+        history = None
+        for db, db_fields in fields_by_db.items():
+            parts = []
+            if split > start:
+                projections = {field: PersistentStorage._projection(self.ROLLUP_HISTORY_AGGREGATES[aggregate], field) for field in db_fields}
+                parts.append(self._aggregate(db, PersistentStorage.rollup_table(measurement, resolution), projections, start, split, bucket_seconds))
+            if stop > split:
+                projections = {field: PersistentStorage._projection(self.HISTORY_AGGREGATES[aggregate], field) for field in db_fields}
+                parts.append(self._aggregate(db, measurement, projections, split, stop, bucket_seconds))
+            table = pyarrow.concat_tables(parts, promote_options="permissive")
+            history = table if history is None else history.join(table, "time", join_type="full outer")
+        history = history.sort_by("time")
+        time_ms = pyarrow.compute.cast(history["time"], pyarrow.timestamp("ms", tz="UTC"), safe=False)
+        history = history.set_column(history.schema.get_field_index("time"), "time", time_ms)
+        return bucket_seconds, history.select(["time"] + list(fields))
+
+    async def read_history_async(self, measurement, fields, start: datetime, stop: datetime, points: int, aggregate="mean", rollups=None):
+        return await self._run_in_read_pool(self.read_history, measurement, fields, start, stop, points, aggregate, rollups)
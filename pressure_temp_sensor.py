@@ -1,37 +1,40 @@
 #!/usr/bin/env python3
 
-import board
-import adafruit_bmp3xx
 from datetime import datetime, timezone
+from i2c_sensor import I2CSensor, SharedI2CBus
 from persistent_storage import PersistentStorage
-from logger_configurator import LoggerConfigurator
-import time
-from constants import SLEEP_DURATION_SECONDS
 
 
-# Initialize logger
-logger = LoggerConfigurator.configure_logger("BMP390l")
+class PressureTempSensor(I2CSensor):
+    """BMP390L pressure, temperature and altitude"""
+    I2C_ADDRESS = 0x76
+    ADAPTIVE_TOLERANCES = {"pressure": (0.1, 0.0), "temperature": (0.1, 0.0)}
 
-# Initialize persistent storage
-persistent_storage = PersistentStorage()
+    def __init__(self, persistent_storage, bus: SharedI2CBus):
+        super().__init__(persistent_storage, bus)
+        import adafruit_bmp3xx
+        with self._bus.lock:
+            self._bmp = adafruit_bmp3xx.BMP3XX_I2C(self._bus.i2c(), address=self.I2C_ADDRESS)
 
-# Create I2C object using board's default SDA/SCL pins
-i2c = board.I2C()  # For STEMMA QT, works with Pi or microcontrollers
+            # Optional: set oversampling (for better accuracy)
+            self._bmp.pressure_oversampling = 8
+            self._bmp.temperature_oversampling = 2
 
-# Create sensor object
-bmp = adafruit_bmp3xx.BMP3XX_I2C(i2c, address=0x76)
+            # Optional: set local sea level pressure for accurate altitude (in hPa)
+            self._bmp.sea_level_pressure = 1013.25
+        self._logger.info("Starting reading measurements...")
 
-# Optional: set oversampling (for better accuracy)
-bmp.pressure_oversampling = 8
-bmp.temperature_oversampling = 2
+    def sample(self):
+        with self._bus.lock:
+            timestamp = datetime.now(timezone.utc)
+            temperature = self._bmp.temperature
+            pressure = self._bmp.pressure
+            altitude = self._bmp.altitude
+        self._storage.write_bmp390l_data(timestamp, temperature, pressure, altitude)
+        local_time = timestamp.astimezone().strftime('%d/%m/%Y, %H:%M:%S')
+        print(f"Timestamp: {local_time}, Pressure: {pressure:6.2f} hPa, Temperature: {temperature:5.2f} C, Altitude: {altitude:6.2f} m")
+        return {"pressure": pressure, "temperature": temperature}
 
-# Optional: set local sea level pressure for accurate altitude (in hPa)
-bmp.sea_level_pressure = 1013.25
 
-logger.info("Starting reading measurements...")
-while True:
-    timestamp = datetime.now(timezone.utc)
-    persistent_storage.write_bmp390l_data(timestamp, bmp.temperature, bmp.pressure, bmp.altitude)
-    local_time = timestamp.astimezone().strftime('%d/%m/%Y, %H:%M:%S')
-    print(f"Timestamp: {local_time}, Pressure: {bmp.pressure:6.2f} hPa, Temperature: {bmp.temperature:5.2f} C, Altitude: {bmp.altitude:6.2f} m")
-    time.sleep(SLEEP_DURATION_SECONDS)
\ No newline at end of file
+if __name__ == "__main__":
+    PressureTempSensor(PersistentStorage(), SharedI2CBus()).run()
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+
+import os
+import resource
+
+
+class ProcessMetrics:
+    """Startup time and memory of the current process, read from /proc on Linux"""
+
+    @staticmethod
+    def seconds_since_start():
+        """Seconds since the process was started, None without /proc"""
+        try:
+            with open("/proc/self/stat") as f:
+                # the fields after the command name, which may contain spaces, start with the 3rd one
+                start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+            with open("/proc/uptime") as f:
+                uptime = float(f.read().split()[0])
+        except (OSError, ValueError, IndexError):
+            return None
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+
+    @staticmethod
+    def rss_bytes():
+        """Resident set size, the peak one without /proc"""
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            # kB on Linux
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+import math
+import threading
+
+
+class PrometheusMetrics:
+    """Minimal implementation of the Prometheus text exposition format, so that
+    the metrics can be scraped without an additional dependency"""
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    @staticmethod
+    def _escape(value):
+        return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+    @staticmethod
+    def format_value(value):
+        if isinstance(value, int):
+            return str(int(value))
+        value = float(value)
+        if math.isnan(value):
+            return "NaN"
+        if math.isinf(value):
+            return "+Inf" if 0 < value else "-Inf"
+        return repr(value)
+
+    @staticmethod
+    def format_sample(name, labels, value):
+        if labels:
+            label_text = ",".join(f'{k}="{PrometheusMetrics._escape(v)}"' for k, v in labels.items())
+            return f"{name}{{{label_text}}} {PrometheusMetrics.format_value(value)}"
+        return f"{name} {PrometheusMetrics.format_value(value)}"
+
+    @staticmethod
+    def render_family(name, metric_type, documentation, samples):
+        """Lines of a metric family, samples being (labels, value) pairs"""
+        lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}"]
+        lines += [PrometheusMetrics.format_sample(name, labels, value) for labels, value in samples]
+        return lines
+
+    class Histogram:
+        """Cumulative histogram, optionally split by label values. It can be
+        observed from several threads."""
+        DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+        def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+            self.name = name
+            self.documentation = documentation
+            self.label_names = tuple(label_names)
+            self.buckets = tuple(sorted(buckets))
+            self._lock = threading.Lock()
+            self._series = {} # label values: [bucket counts..., sum, count]
+
+        def observe(self, value, *label_values):
+            with self._lock:
+                series = self._series.get(label_values)
+                if series is None:
+                    series = [0] * (len(self.buckets) + 2)
+                    self._series[label_values] = series
+                for i, bound in enumerate(self.buckets):
+                    if value <= bound:
+                        series[i] += 1
+                series[-2] += value
+                series[-1] += 1
+
+        def summary(self):
+            """{label values: (count, sum)}"""
+            with self._lock:
+                return {k: (v[-1], v[-2]) for k, v in self._series.items()}
+
+        def render(self):
+            lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+            with self._lock:
+                series = {k: list(v) for k, v in self._series.items()}
+            for label_values, counts in sorted(series.items()):
+                labels = dict(zip(self.label_names, label_values))
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(PrometheusMetrics.format_sample(f"{self.name}_bucket", labels | {"le": PrometheusMetrics.format_value(bound)}, count))
+                lines.append(PrometheusMetrics.format_sample(f"{self.name}_bucket", labels | {"le": "+Inf"}, counts[-1]))
+                lines.append(PrometheusMetrics.format_sample(f"{self.name}_sum", labels, counts[-2]))
+                lines.append(PrometheusMetrics.format_sample(f"{self.name}_count", labels, counts[-1]))
+            return lines
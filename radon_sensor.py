@@ -9,9 +9,10 @@ import sys
 from datetime import datetime, timezone
 from bleak import BleakScanner
 from airthings_ble import AirthingsBluetoothDeviceData, UnsupportedDeviceError
-from constants import AIRTHINGS_SLEEP_DURATION_SECONDS, AIRTHINGS_SCAN_TIMEOUT_SECONDS
+from constants import AIRTHINGS_SLEEP_DURATION_SECONDS, AIRTHINGS_MAX_SLEEP_DURATION_SECONDS, AIRTHINGS_SCAN_TIMEOUT_SECONDS
 from persistent_storage import PersistentStorage
 from logger_configurator import LoggerConfigurator
+from adaptive_interval import AdaptiveInterval
 # Try to import DisconnectedError for finer-grained handling; fall back to None
 try:
     from airthings_ble.parser import DisconnectedError  # type: ignore
@@ -46,7 +47,7 @@ async def read_device_once(address: str, timeout: float, is_metric: bool, logger
     return device
 
 
-def save_radon_data(device) -> None:
+def save_radon_data(device) -> dict:
     timestamp = datetime.now(timezone.utc)
     sensors = device.sensors
     
@@ -86,9 +87,13 @@ def save_radon_data(device) -> None:
     print(f'Timestamp: {local_time}, Radon 1day: {radon_1day:.1f} Bq/m3, '
           f'week: {radon_week:.1f} Bq/m3, year {radon_year:.1f} Bq/m3, '
           f'temperature {temperature:.1f} C, relative humidity {relative_humidity:.1f} %', flush=True)
+    return {"radon_1day_avg": radon_1day, "temperature": temperature}
 
 
 async def monitor_loop(address: str, interval: float, timeout: float):
+    # the 1 day average is updated by the device once an hour
+    adaptive_interval = AdaptiveInterval.configured("RadonSensor", interval, AIRTHINGS_MAX_SLEEP_DURATION_SECONDS,
+                                                    {"radon_1day_avg": (5.0, 0.05), "temperature": (0.2, 0.0)})
     backoff = 5.0
     max_backoff = 300.0
     while True:
@@ -97,7 +102,7 @@ async def monitor_loop(address: str, interval: float, timeout: float):
             if device is None:
                 logger.error("Failed to read device data")
                 return
-            save_radon_data(device)
+            values = save_radon_data(device)
             backoff = 5.0
         except UnsupportedDeviceError:
             logger.error("Unsupported Airthings device at %s", address)
@@ -120,8 +125,11 @@ async def monitor_loop(address: str, interval: float, timeout: float):
             backoff = min(max_backoff, backoff * 2)
             continue
 
-        # Wait for the configured interval
-        await asyncio.sleep(interval)
+        # Wait for the configured interval, or the adaptive one
+        if adaptive_interval is not None:
+            await asyncio.sleep(adaptive_interval.update(values))
+        else:
+            await asyncio.sleep(interval)
 
 
 if __name__ == "__main__":
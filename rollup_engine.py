@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+from persistent_storage import PersistentStorage
+from logger_configurator import LoggerConfigurator
+
+
+class RollupEngine:
+    """Maintains min/mean/max/count aggregates of every numeric field at 1 minute,
+    1 hour and 1 day resolution, in <measurement>_rollup_<resolution> tables next
+    to the raw points. Each resolution is updated incrementally from its
+    watermark (the start of the first bucket not rolled up yet): 1 minute buckets
+    are computed from the raw points, coarser ones from the previous resolution,
+    and only complete buckets are written."""
+    RESOLUTIONS = (("1m", 60), ("1h", 60 * 60), ("1d", 24 * 60 * 60))
+    UPDATE_INTERVAL_SEC = 60
+    # points arriving later than that after their bucket closed are not rolled up
+    LATE_DATA_SEC = 60
+    # bound of the buckets computed by one query while catching up
+    MAX_BUCKETS_PER_QUERY = 1440
+
+    def __init__(self, storage: PersistentStorage):
+        self._logger = LoggerConfigurator.configure_logger(self.__class__.__name__)
+        self._storage = storage
+        self._watermarks = {} # (database, measurement, resolution): watermark
+        self._ready = set()   # (database, measurement, resolution) caught up with the current time
+
+    @staticmethod
+    def _align(timestamp: datetime, seconds):
+        return datetime.fromtimestamp(timestamp.timestamp() // seconds * seconds, timezone.utc)
+
+    @staticmethod
+    def _projections(fields, level):
+        projections = {}
+        for field in fields:
+            if 0 == level:
+                projections[f"{field}_min"] = ("min", field)
+                projections[f"{field}_mean"] = ("avg", field)
+                projections[f"{field}_max"] = ("max", field)
+                projections[f"{field}_count"] = ("count", field)
+            else:
+                projections[f"{field}_min"] = ("min", f"{field}_min")
+                projections[f"{field}_mean"] = ("weighted_avg", f"{field}_mean", f"{field}_count")
+                projections[f"{field}_max"] = ("max", f"{field}_max")
+                projections[f"{field}_count"] = ("sum", f"{field}_count")
+        return projections
+
+    def _source_table(self, measurement, level):
+        if 0 == level:
+            return measurement
+        return PersistentStorage.rollup_table(measurement, self.RESOLUTIONS[level - 1][0])
+
+    def _initial_watermark(self, db, measurement, level):
+        resolution, seconds = self.RESOLUTIONS[level]
+        # resume after the last bucket written before a restart
+        time_range = self._storage.read_time_range(db, PersistentStorage.rollup_table(measurement, resolution))
+        if time_range is not None:
+            return time_range[1] + timedelta(seconds=seconds)
+        # otherwise start from the oldest source row
+        time_range = self._storage.read_time_range(db, self._source_table(measurement, level))
+        if time_range is not None:
+            return RollupEngine._align(time_range[0], seconds)
+        return None
+
+    def _update_level(self, db, measurement, fields, level, end):
+        resolution, seconds = self.RESOLUTIONS[level]
+        key = (db, measurement, resolution)
+        watermark = self._watermarks.get(key)
+        if watermark is None:
+            watermark = self._initial_watermark(db, measurement, level)
+            if watermark is None:
+                return None
+            self._watermarks[key] = watermark
+        end = RollupEngine._align(end, seconds)
+        projections = RollupEngine._projections(fields, level)
+        while watermark < end:
+            chunk_end = min(end, watermark + timedelta(seconds=seconds * self.MAX_BUCKETS_PER_QUERY))
+            table = self._storage.aggregate(db, self._source_table(measurement, level), projections, watermark, chunk_end, seconds)
+            self._storage.write_table(db, PersistentStorage.rollup_table(measurement, resolution), table)
+            watermark = chunk_end
+            self._watermarks[key] = watermark
+        # not caught up yet if the source is behind by more than a bucket
+        if end + timedelta(seconds=seconds) >= datetime.now(timezone.utc) - timedelta(seconds=self.LATE_DATA_SEC):
+            self._ready.add(key)
+        return watermark
+
+    def update(self):
+        """Roll up all the complete buckets since the watermarks"""
+        now = datetime.now(timezone.utc) - timedelta(seconds=self.LATE_DATA_SEC)
+        for db in PersistentStorage.Database:
+            for measurement, fields in self._storage.read_numeric_fields(db).items():
+                if not fields:
+                    continue
+                # a resolution cannot go past the watermark of the finer one it is computed from
+                end = now
+                for level in range(len(self.RESOLUTIONS)):
+                    try:
+                        end = self._update_level(db, measurement, fields, level, end)
+                    except Exception as e:
+                        self._logger.error(f"Cannot roll up {db.value}.{measurement} at {self.RESOLUTIONS[level][0]}: {e}")
+                        end = None
+                    if end is None:
+                        break
+
+    def select(self, keys, bucket_seconds):
+        """Coarsest resolution not coarser than bucket_seconds that is up to date for
+        all (database, measurement) keys, as (resolution, seconds, watermark), or None"""
+        for resolution, seconds in reversed(self.RESOLUTIONS):
+            if seconds > bucket_seconds:
+                continue
+            if all((db, measurement, resolution) in self._ready for db, measurement in keys):
+                watermark = min(self._watermarks[(db, measurement, resolution)] for db, measurement in keys)
+                return resolution, seconds, watermark
+        return None
+
+    def _continuous_update(self):
+        while True:
+            try:
+                self.update()
+            except Exception as e:
+                self._logger.error(f"Rollup update failed: {e}")
+            time.sleep(self.UPDATE_INTERVAL_SEC)
+
+    def start(self):
+        update_thread = threading.Thread(
+            target=self._continuous_update,
+            daemon=True
+        )
+        update_thread.start()
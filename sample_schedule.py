@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+from logger_configurator import LoggerConfigurator
+import math
+import threading
+import time
+
+
+class SampleSchedule:
+    """When a sensor with a native measurement period is sampled. The deadlines
+    are on a grid of the monotonic clock, multiples of the period shifted by a
+    phase, so that the sensors of a process given distinct phases never hit the
+    bus at the same time. A device without new data at its deadline is polled
+    every poll_interval_sec; once it has some, the deadlines follow its own
+    clock instead of the grid.
+
+    A sample completed more than LATE_FRACTION of the period after the wake up
+    is late, e.g. because the bus was busy. A deadline passed without a sample,
+    because the device had no data for a whole period or a sample overran the
+    next deadline, is missed. The counts are logged every REPORT_INTERVAL_SEC
+    when there were late or missed samples. The period can be changed between
+    two samples, the next deadline is then one new period after the last one."""
+    LATE_FRACTION = 0.25
+    REPORT_INTERVAL_SEC = 10 * 60
+
+    def __init__(self, name, period_sec, phase_sec=0.0, poll_interval_sec=0.2):
+        self._logger = LoggerConfigurator.configure_logger(self.__class__.__name__)
+        self._name = name
+        self.period_sec = period_sec
+        self._poll_interval_sec = poll_interval_sec
+        now = time.monotonic()
+        self._deadline = (math.floor((now - phase_sec) / period_sec) + 1) * period_sec + phase_sec
+        self._wake = self._deadline
+        self._polling = False
+        self._lock = threading.Lock()
+        self._sample_count = 0
+        self._late_count = 0
+        self._missed_count = 0
+        self._max_lateness = 0.0
+        self._reported = (0, 0, 0) # sample, late and missed counts at the last report
+        self._last_report = now
+
+    def set_period(self, period_sec):
+        """Change the period from the next deadline on, e.g. set by an AdaptiveInterval"""
+        with self._lock:
+            self.period_sec = period_sec
+
+    def wait(self, stop: threading.Event):
+        """Sleep until the sensor is due, False if stop was set meanwhile"""
+        delay = self._wake - time.monotonic()
+        if delay > 0:
+            return not stop.wait(delay)
+        return not stop.is_set()
+
+    def sampled(self):
+        """The device had new data, which was read"""
+        now = time.monotonic()
+        lateness = max(0.0, now - self._wake)
+        skipped = 0
+        if self._polling:
+            # the device has its own clock, follow it
+            self._polling = False
+            self._deadline = now + self.period_sec
+        else:
+            self._deadline += self.period_sec
+            if now >= self._deadline:
+                # the sample overran the next deadlines
+                skipped = int((now - self._deadline) // self.period_sec) + 1
+                self._deadline += skipped * self.period_sec
+        self._wake = self._deadline
+        with self._lock:
+            self._sample_count += 1
+            self._missed_count += skipped
+            if lateness > self.LATE_FRACTION * self.period_sec:
+                self._late_count += 1
+            self._max_lateness = max(self._max_lateness, lateness)
+        self._report_if_due(now)
+
+    def not_ready(self):
+        """The device had no new data yet"""
+        now = time.monotonic()
+        self._polling = True
+        if now >= self._deadline + self.period_sec:
+            # a whole period without new data
+            with self._lock:
+                self._missed_count += 1
+            self._deadline += self.period_sec
+        self._wake = now + self._poll_interval_sec
+        self._report_if_due(now)
+
+    def _report_if_due(self, now):
+        if now - self._last_report < self.REPORT_INTERVAL_SEC:
+            return
+        with self._lock:
+            counts = (self._sample_count, self._late_count, self._missed_count)
+        samples, late, missed = (count - reported for count, reported in zip(counts, self._reported))
+        if late or missed:
+            self._logger.warning(f"{self._name}: {samples} samples, {late} late and {missed} missed deadlines "
+                                 f"in the last {now - self._last_report:.0f} sec., period {self.period_sec} sec.")
+        self._reported = counts
+        self._last_report = now
+
+    def get_statistics(self):
+        with self._lock:
+            return {
+                "period_sec": self.period_sec,
+                "samples": self._sample_count,
+                "late": self._late_count,
+                "missed": self._missed_count,
+                "max_lateness_sec": self._max_lateness
+            }
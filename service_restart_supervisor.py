@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+import asyncio
+import time
+from logger_configurator import LoggerConfigurator
+
+
+class ServiceRestartSupervisor:
+    """Restarts systemd units from an asyncio job queue, so that a restart never
+    blocks the event loop. Requests for a unit already queued or restarting are
+    merged, at most MAX_CONCURRENT_RESTARTS run at once, and a unit whose restart
+    failed is not retried before its backoff (doubled after each failure) elapsed.
+    Every status change is reported through status_callback(unit, status, message)."""
+    MAX_CONCURRENT_RESTARTS = 2
+    RESTART_TIMEOUT_SEC = 30
+    INITIAL_BACKOFF_SEC = 60
+    MAX_BACKOFF_SEC = 60 * 60
+
+    def __init__(self, status_callback=None):
+        self._logger = LoggerConfigurator.configure_logger(self.__class__.__name__)
+        self._status_callback = status_callback
+        self._queue = asyncio.Queue()
+        self._pending = set()   # units queued or being restarted
+        self._backoff = {}      # unit: seconds to wait after the next failure
+        self._not_before = {}   # unit: monotonic time before which the unit is not restarted
+        self._tasks = set()
+
+    def _report(self, unit, status, message):
+        if "failed" == status:
+            self._logger.error(message)
+        else:
+            self._logger.info(message)
+        if self._status_callback is not None:
+            self._status_callback(unit, status, message)
+
+    def request_restart(self, unit):
+        """Queue a restart of unit, returns False if it was merged or deferred"""
+        if unit in self._pending:
+            self._logger.debug(f"Restart of '{unit}' already pending")
+            return False
+        remaining = self._not_before.get(unit, 0) - time.monotonic()
+        if remaining > 0:
+            self._logger.info(f"Restart of '{unit}' deferred, backing off for another {remaining:.0f} sec.")
+            return False
+        self._pending.add(unit)
+        self._queue.put_nowait(unit)
+        self._report(unit, "queued", f"Restart of service '{unit}' queued")
+        return True
+
+    async def _restart(self, unit, semaphore):
+        async with semaphore:
+            self._report(unit, "restarting", f"Restarting service '{unit}'")
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    'sudo', 'systemctl', 'restart', unit,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                try:
+                    stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=self.RESTART_TIMEOUT_SEC)
+                except asyncio.TimeoutError:
+                    process.kill()
+                    await process.wait()
+                    error = f"timeout expired after {self.RESTART_TIMEOUT_SEC} sec."
+                else:
+                    if stdout:
+                        self._logger.debug(f"Output: {stdout.decode(errors='replace')}")
+                    if stderr:
+                        self._logger.error(f"Warning/Error Output: {stderr.decode(errors='replace')}")
+                    error = None if 0 == process.returncode else f"return code {process.returncode}"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = f"unexpected error: {e}"
+            finally:
+                self._pending.discard(unit)
+
+            if error is None:
+                self._backoff.pop(unit, None)
+                self._not_before.pop(unit, None)
+                self._report(unit, "restarted", f"Service '{unit}' restarted successfully")
+            else:
+                backoff = self._backoff.get(unit, self.INITIAL_BACKOFF_SEC)
+                self._not_before[unit] = time.monotonic() + backoff
+                self._backoff[unit] = min(self.MAX_BACKOFF_SEC, backoff * 2)
+                self._report(unit, "failed", f"Failed to restart service '{unit}' ({error}), next attempt in {backoff} sec. at the earliest")
+
+    async def run(self):
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_RESTARTS)
+        while True:
+            unit = await self._queue.get()
+            task = asyncio.create_task(self._restart(unit, semaphore))
+            # keep a reference until the task is done
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
@@ -6,6 +6,14 @@ if (( EUID != 0 )); then
 fi
 
 services=("dust_sensor" "ambient_sensor" "noise_sensor" "aq_dashboard" "light_sensor" "carbon_dioxide_sensor" "voc_nox_sensor" "pressure_temp_sensor" "o3_no2_sensor" "co_sensor" "radon_sensor")
+# with AQ_I2C_SENSOR_RUNTIME=on, the ambient, light, CO2, VOC/NOx and pressure sensors run in a single service
+if grep -qsE '^[[:space:]]*AQ_I2C_SENSOR_RUNTIME=(on|true|1)[[:space:]]*$' /etc/default/aq_dashboard.env; then
+    services=("dust_sensor" "i2c_sensor_runtime" "noise_sensor" "aq_dashboard" "o3_no2_sensor" "co_sensor" "radon_sensor")
+fi
+# the ingestion gateway only runs when AQ_INGESTION_GATEWAY is on or set to its socket path, before the sensors
+if grep -qsE '^[[:space:]]*AQ_INGESTION_GATEWAY=(on|true|1|/[^[:space:]]+)[[:space:]]*$' /etc/default/aq_dashboard.env; then
+    services=("ingestion_gateway" "${services[@]}")
+fi
 SERVICE_DIR=/etc/systemd/system
 
 # Usage message
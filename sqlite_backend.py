@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+from datetime import datetime, timezone
+from storage_backend import StorageBackend
+import os
+import sqlite3
+import threading
+import time
+import pyarrow
+
+
+class SQLiteBackend(StorageBackend):
+    """One SQLite file per database in WAL mode, so that the sensor services
+    can write while the dashboard reads, with one table per measurement keyed
+    by the time in ms. The columns are added as new fields show up. Meant for
+    small deployments that do not want to run an InfluxDB server."""
+    # declared column type: InfluxDB 3 data type
+    DATA_TYPES = {
+        "INTEGER": "Int64",
+        "REAL": "Float64",
+        "BOOLEAN": "Boolean",
+        "TEXT": "Utf8"
+    }
+    COLUMN_TYPES = {data_type: column_type for column_type, data_type in DATA_TYPES.items()}
+    BUSY_TIMEOUT_MS = 5000
+
+    def __init__(self, directory):
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connections = {} # database: connection
+        self._columns = {}     # (database, measurement): {column: declared type}
+
+    def _connection(self, db):
+        connection = self._connections.get(db)
+        if connection is None:
+            connection = sqlite3.connect(os.path.join(self._directory, f"{db}.sqlite"), check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(f"PRAGMA busy_timeout={self.BUSY_TIMEOUT_MS}")
+            self._connections[db] = connection
+        return connection
+
+    def _table_columns(self, connection, db, measurement):
+        """Columns of a table, None if it does not exist"""
+        rows = connection.execute(f'PRAGMA table_info("{measurement}")').fetchall()
+        if not rows:
+            return None
+        columns = {row[1]: row[2] for row in rows}
+        self._columns[(db, measurement)] = columns
+        return columns
+
+    def _ensure_columns(self, connection, db, measurement, fields):
+        columns = self._columns.get((db, measurement))
+        if columns is None or not set(fields).issubset(columns):
+            # another process may have created the table or added the columns
+            columns = self._table_columns(connection, db, measurement)
+        if columns is None:
+            connection.execute(f'CREATE TABLE IF NOT EXISTS "{measurement}" (time INTEGER PRIMARY KEY)')
+            columns = {"time": "INTEGER"}
+            self._columns[(db, measurement)] = columns
+        for field, value in fields.items():
+            if field not in columns:
+                column_type = self.COLUMN_TYPES[StorageBackend.data_type(value)]
+                connection.execute(f'ALTER TABLE "{measurement}" ADD COLUMN "{field}" {column_type}')
+                columns[field] = column_type
+
+    def write(self, db, records):
+        size = 0
+        with self._lock:
+            connection = self._connection(db)
+            with connection:
+                for record in records:
+                    measurement, time_ms, fields = record
+                    fields = {k: v for k, v in fields.items() if v is not None}
+                    self._ensure_columns(connection, db, measurement, fields)
+                    names = ", ".join(f'"{field}"' for field in fields)
+                    placeholders = ", ".join("?" for _ in fields)
+                    # same time as an existing row: the fields are merged like InfluxDB does
+                    if fields:
+                        updates = ", ".join(f'"{field}" = excluded."{field}"' for field in fields)
+                        connection.execute(f'INSERT INTO "{measurement}" (time, {names}) VALUES (?, {placeholders}) '
+                                           f'ON CONFLICT(time) DO UPDATE SET {updates}', [time_ms] + list(fields.values()))
+                    else:
+                        connection.execute(f'INSERT OR IGNORE INTO "{measurement}" (time) VALUES (?)', [time_ms])
+                    size += StorageBackend.record_size(record)
+        return size
+
+    def _record(self, columns, values):
+        record = dict(zip(columns, values))
+        for column, column_type in columns.items():
+            if "BOOLEAN" == column_type and record[column] is not None:
+                record[column] = bool(record[column])
+        record["time"] = StorageBackend.from_epoch_ms(record["time"])
+        return record
+
+    def read_latest(self, db, measurement, max_age_sec):
+        with self._lock:
+            connection = self._connection(db)
+            columns = self._table_columns(connection, db, measurement)
+            if columns is None:
+                return None
+            names = ", ".join(f'"{column}"' for column in columns)
+            row = connection.execute(f'SELECT {names} FROM "{measurement}" '
+                                     'WHERE time > ? ORDER BY time DESC LIMIT 1',
+                                     [int((time.time() - max_age_sec) * 1000)]).fetchone()
+        return self._record(columns, row) if row is not None else None
+
+    def read_schema(self, db):
+        with self._lock:
+            connection = self._connection(db)
+            names = [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+            tables = {}
+            for name in names:
+                columns = self._table_columns(connection, db, name)
+                if columns is not None:
+                    tables[name] = {
+                        column: "Timestamp(Nanosecond, None)" if "time" == column else self.DATA_TYPES.get(column_type, "Utf8")
+                        for column, column_type in columns.items()
+                    }
+        return tables
+
+    def read_latest_snapshot(self, db, tables, max_age_sec):
+        snapshot = {}
+        for measurement in tables:
+            record = self.read_latest(db, measurement, max_age_sec)
+            if record is not None:
+                snapshot[measurement] = record
+        return snapshot
+
+    def aggregate(self, db, measurement, projections, start: datetime, stop: datetime, bucket_seconds):
+        bucket_ms = bucket_seconds * 1000
+        columns = [f"time / {bucket_ms} * {bucket_ms}"]
+        columns += [StorageBackend.sql_projection(*projection) for projection in projections.values()]
+        with self._lock:
+            connection = self._connection(db)
+            rows = connection.execute(f'SELECT {", ".join(columns)} FROM "{measurement}" '
+                                      'WHERE time >= ? AND time < ? GROUP BY 1 ORDER BY 1',
+                                      [StorageBackend.to_epoch_ms(start), StorageBackend.to_epoch_ms(stop)]).fetchall()
+        table = {"time": pyarrow.array([row[0] for row in rows], type=pyarrow.timestamp("ms"))}
+        for i, alias in enumerate(projections, 1):
+            table[alias] = pyarrow.array([row[i] for row in rows])
+        return pyarrow.table(table)
+
+    def read_time_range(self, db, measurement):
+        with self._lock:
+            connection = self._connection(db)
+            if self._table_columns(connection, db, measurement) is None:
+                return None
+            start, stop = connection.execute(f'SELECT min(time), max(time) FROM "{measurement}"').fetchone()
+        if start is None:
+            return None
+        return (datetime.fromtimestamp(start / 1000, timezone.utc),
+                datetime.fromtimestamp(stop / 1000, timezone.utc))
@@ -59,6 +59,42 @@ function t(key) {
     return (translations[lang] && translations[lang][key]) || (translations['en'] && translations['en'][key]) || key;
 }
 
+// Binary websocket frames, see binary_frame_codec.py for the layout
+const BINARY_KEYFRAME = 1;
+let binarySchema = [];
+const textDecoder = new TextDecoder();
+
+function decodeBinaryFrame(buffer) {
+	const view = new DataView(buffer);
+	const kind = view.getUint8(0);
+	const fieldCount = view.getUint16(2, true);
+	const bitmapSize = Math.ceil(fieldCount / 8);
+	const presentOffset = 4;
+	const removedOffset = presentOffset + bitmapSize;
+	let offset = removedOffset + bitmapSize;
+	const values = {};
+	const removed = [];
+	for (let id = 0; id < fieldCount && id < binarySchema.length; id++) {
+		const field = binarySchema[id];
+		const mask = 1 << (id & 7);
+		if (view.getUint8(presentOffset + (id >> 3)) & mask) {
+			if (field.kind === 'text') {
+				const length = view.getUint16(offset, true);
+				offset += 2;
+				values[field.name] = textDecoder.decode(new Uint8Array(buffer, offset, length));
+				offset += length;
+			} else {
+				const value = view.getFloat64(offset, true);
+				offset += 8;
+				values[field.name] = Number.isNaN(value) ? null : value;
+			}
+		} else if (view.getUint8(removedOffset + (id >> 3)) & mask) {
+			removed.push(field.name);
+		}
+	}
+	return { kind, values, removed };
+}
+
 // Get the canvas element
 const canvas = document.getElementById("aqi-arc");
 const ctx = canvas.getContext("2d");
@@ -430,13 +466,44 @@ document.addEventListener("DOMContentLoaded", async function() {
 		if (!path.endsWith('/')) {
 			path += '/';
 		}
-		const wsUrl = `${protocol}//${host}${path}ws`;
+		// binary mode: packed frames with only the changed fields between periodic full frames
+		const wsUrl = `${protocol}//${host}${path}ws?mode=binary`;
 		const socket = new WebSocket(wsUrl);
+		socket.binaryType = 'arraybuffer';
+
+		// kiosk pages can restrict the field groups and the update interval,
+		// e.g. ?groups=co2,aqi&interval=10
+		socket.onopen = function() {
+			const params = new URLSearchParams(globalThis.location.search);
+			if (params.has('groups') || params.has('interval')) {
+				const request = { type: "subscribe" };
+				if (params.has('groups')) {
+					request.groups = params.get('groups').split(',').filter(group => group);
+				}
+				if (params.has('interval')) {
+					request.interval = Number(params.get('interval'));
+				}
+				socket.send(JSON.stringify(request));
+			}
+		};
 
 		socket.onmessage = function(event) {
+			if (event.data instanceof ArrayBuffer) {
+				const frame = decodeBinaryFrame(event.data);
+				const merged = frame.kind === BINARY_KEYFRAME ? frame.values : { ...currentData, ...frame.values };
+				frame.removed.forEach(key => delete merged[key]);
+				updateDashboard(merged);
+				return;
+			}
 			const data = JSON.parse(event.data);
-			if (data.type === "data") {
+			if (data.type === "schema") {
+				binarySchema = data.fields;
+			} else if (data.type === "data") {
 				updateDashboard(data.payload);
+			} else if (data.type === "delta") {
+				const merged = { ...currentData, ...data.payload };
+				data.removed.forEach(key => delete merged[key]);
+				updateDashboard(merged);
 			} else if (data.type === "notification") {
 				updateNotifications(data.payload);
 			}
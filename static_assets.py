@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+import os
+import gzip
+import hashlib
+import mimetypes
+from fastapi import Request, Response
+from logger_configurator import LoggerConfigurator
+# brotli is optional, without it only gzip variants are served
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class StaticAssetCache:
+    """Serves the dashboard files from memory. A file is read once (again only
+    when its mtime changes), its gzip and brotli variants are precomputed, and
+    the responses carry an ETag so that revalidations are answered with 304."""
+    # always revalidate, which costs a 304 as long as the file did not change
+    CACHE_CONTROL = "no-cache"
+    COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+    GZIP_LEVEL = 9
+    BROTLI_QUALITY = 11
+
+    def __init__(self, directory):
+        self._logger = LoggerConfigurator.configure_logger(self.__class__.__name__)
+        self._directory = os.path.realpath(directory)
+        self._assets = {} # relative path: asset
+
+    def _resolve(self, relative_path):
+        path = os.path.realpath(os.path.join(self._directory, relative_path))
+        # never serve anything outside of the static directory
+        if not path.startswith(self._directory + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+    def _load(self, path, mtime):
+        with open(path, "rb") as file:
+            content = file.read()
+        content_type, _ = mimetypes.guess_type(path)
+        content_type = content_type or "application/octet-stream"
+        digest = hashlib.sha1(content).hexdigest()[:16]
+        variants = {"identity": (content, f'"{digest}"')}
+        if content_type.startswith(self.COMPRESSIBLE_TYPES):
+            if content_type.startswith("text/") or content_type.endswith(("json", "javascript")):
+                content_type += "; charset=utf-8"
+            compressed = gzip.compress(content, compresslevel=self.GZIP_LEVEL, mtime=0)
+            if len(compressed) < len(content):
+                variants["gzip"] = (compressed, f'"{digest}-gz"')
+            if brotli is not None:
+                compressed = brotli.compress(content, quality=self.BROTLI_QUALITY)
+                if len(compressed) < len(content):
+                    variants["br"] = (compressed, f'"{digest}-br"')
+        self._logger.info(f"Loaded {path}: {', '.join(f'{k} {len(v[0])} bytes' for k, v in variants.items())}")
+        return {
+            "mtime": mtime,
+            "content_type": content_type,
+            "variants": variants
+        }
+
+    def get(self, relative_path):
+        path = self._resolve(relative_path)
+        if path is None:
+            return None
+        mtime = os.stat(path).st_mtime_ns
+        asset = self._assets.get(path)
+        if asset is None or asset["mtime"] != mtime:
+            asset = self._load(path, mtime)
+            self._assets[path] = asset
+        return asset
+
+    @staticmethod
+    def _accepted_encodings(accept_encoding):
+        encodings = set()
+        for item in accept_encoding.split(","):
+            encoding, _, params = item.strip().partition(";")
+            params = params.replace(" ", "")
+            if params.startswith("q=") and 0 == float(params[2:] or 0):
+                continue
+            encodings.add(encoding.strip().lower())
+        return encodings
+
+    def response(self, relative_path, request: Request):
+        asset = self.get(relative_path)
+        if asset is None:
+            return Response(status_code=404)
+        variants = asset["variants"]
+        try:
+            accepted = StaticAssetCache._accepted_encodings(request.headers.get("accept-encoding", ""))
+        except ValueError:
+            accepted = set()
+        encoding = next((e for e in ("br", "gzip") if e in variants and (e in accepted or "*" in accepted)), "identity")
+        content, etag = variants[encoding]
+        headers = {
+            "ETag": etag,
+            "Cache-Control": self.CACHE_CONTROL,
+            "Vary": "Accept-Encoding"
+        }
+        # any variant of the current content is still valid for the client
+        if_none_match = request.headers.get("if-none-match", "")
+        client_etags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if "*" in client_etags or any(tag in client_etags for _, tag in variants.values()):
+            return Response(status_code=304, headers=headers)
+        if "identity" != encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(content=content, media_type=asset["content_type"], headers=headers)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+import numbers
+
+
+class StorageBackend(ABC):
+    """Read/write surface PersistentStorage needs from a time series store.
+
+    Databases are the PersistentStorage.Database values. A record is a
+    (measurement, time in ms since epoch, {field: value}) tuple, None values
+    being skipped. Read records are dicts with a naive UTC datetime "time" key.
+    The column data types use the InfluxDB 3 names (Float64, Int64, Boolean,
+    Utf8...). Projections are {output column: (function, column...)} with the
+    functions of AGGREGATE_FUNCTIONS."""
+    # (function, column) except weighted_avg: (weighted_avg, value column, weight column)
+    AGGREGATE_FUNCTIONS = ("min", "max", "avg", "sum", "count", "weighted_avg")
+
+    @staticmethod
+    def to_epoch_ms(timestamp):
+        """Milliseconds since epoch of a datetime (naive ones are UTC) or of an int already in ms.
+        Raises TypeError for anything else, e.g. a float in seconds, rather than guessing its unit."""
+        if isinstance(timestamp, datetime):
+            if timestamp.tzinfo is None:
+                timestamp = timestamp.replace(tzinfo=timezone.utc)
+            return int(timestamp.timestamp() * 1000)
+        if isinstance(timestamp, numbers.Integral) and not isinstance(timestamp, bool):
+            return int(timestamp)
+        raise TypeError(f"Expected a datetime or an int in ms since epoch, got {type(timestamp).__name__}: {timestamp!r}")
+
+    @staticmethod
+    def from_epoch_ms(time_ms):
+        return datetime.fromtimestamp(time_ms / 1000, timezone.utc).replace(tzinfo=None)
+
+    @staticmethod
+    def data_type(value):
+        # bool is an int, check it first
+        if isinstance(value, bool):
+            return "Boolean"
+        if isinstance(value, int):
+            return "Int64"
+        if isinstance(value, float):
+            return "Float64"
+        return "Utf8"
+
+    @staticmethod
+    def record_size(record):
+        """Approximate payload size of a record for the backends without a wire format"""
+        _, _, fields = record
+        return 8 + sum(len(v.encode("utf-8")) if isinstance(v, str) else 8 for v in fields.values() if v is not None)
+
+    @staticmethod
+    def sql_projection(function, *columns):
+        """SQL expression of a projection, the same for InfluxDB 3 and SQLite"""
+        if "weighted_avg" == function:
+            value, weight = columns
+            return f'sum("{value}" * "{weight}") / sum("{weight}")'
+        if function not in StorageBackend.AGGREGATE_FUNCTIONS:
+            raise ValueError(f"Unknown aggregate function '{function}'")
+        return f'{function}("{columns[0]}")'
+
+    @abstractmethod
+    def write(self, db, records):
+        """Write the records, returns the number of bytes written"""
+
+    @abstractmethod
+    def read_latest(self, db, measurement, max_age_sec):
+        """Newest record of measurement not older than max_age_sec, None if there is none"""
+
+    @abstractmethod
+    def read_schema(self, db):
+        """{measurement: {column: data type}} of every measurement of db"""
+
+    @abstractmethod
+    def read_latest_snapshot(self, db, tables, max_age_sec):
+        """{measurement: newest record} of the measurements of tables, as returned by read_schema"""
+
+    @abstractmethod
+    def aggregate(self, db, measurement, projections, start: datetime, stop: datetime, bucket_seconds):
+        """Arrow table of the rows of measurement in [start, stop) grouped into epoch
+        aligned buckets of bucket_seconds: a time column with the bucket start,
+        followed by one column per projection"""
+
+    @abstractmethod
+    def read_time_range(self, db, measurement):
+        """(oldest, newest) timezone aware UTC datetimes of the rows of measurement, None if it has no rows"""
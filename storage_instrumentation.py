@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+import time
+import threading
+from contextlib import contextmanager
+from logger_configurator import LoggerConfigurator
+from prometheus_metrics import PrometheusMetrics
+
+
+class StorageInstrumentation:
+    """Latency, error and volume statistics of the storage operations (connect,
+    read, write), per database and measurement. A summary line per operation
+    and database is logged every SUMMARY_INTERVAL_SEC by the thread recording
+    the first operation after the interval, so no extra thread is needed."""
+    SUMMARY_INTERVAL_SEC = 5 * 60
+    LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self._logger = LoggerConfigurator.configure_logger(self.__class__.__name__)
+        self._lock = threading.Lock()
+        self._latency = PrometheusMetrics.Histogram("aq_storage_latency_seconds", "Latency of the successful storage operations",
+                                                    ("operation", "database", "measurement"), self.LATENCY_BUCKETS)
+        self._errors = {}       # (operation, database, exception class): count
+        self._bytes_written = {} # (database, measurement): line protocol bytes
+        self._last_success = {} # (operation, database): time
+        self._last_error = {}   # (operation, database): (time, message)
+        self._last_summary = time.monotonic()
+
+    @contextmanager
+    def measure(self, operation, database, measurement=""):
+        """Time the operation in the with block, an exception is counted and raised again"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record_error(operation, database, e)
+            raise
+        self._latency.observe(time.perf_counter() - start, operation, database, measurement)
+        with self._lock:
+            self._last_success[(operation, database)] = time.time()
+        self._log_summary_if_due()
+
+    def record_error(self, operation, database, error):
+        key = (operation, database, type(error).__name__)
+        with self._lock:
+            self._errors[key] = self._errors.get(key, 0) + 1
+            self._last_error[(operation, database)] = (time.time(), str(error))
+        self._log_summary_if_due()
+
+    def record_bytes_written(self, database, measurement, size):
+        key = (database, measurement)
+        with self._lock:
+            self._bytes_written[key] = self._bytes_written.get(key, 0) + size
+
+    def get_statistics(self):
+        """Snapshot of the statistics:
+            latency: {(operation, database, measurement): (count, total seconds)}
+            errors: {(operation, database, exception class): count}
+            bytes_written: {(database, measurement): bytes}
+            last_success: {(operation, database): time}
+            last_error: {(operation, database): (time, message)}"""
+        with self._lock:
+            return {
+                "latency": self._latency.summary(),
+                "errors": dict(self._errors),
+                "bytes_written": dict(self._bytes_written),
+                "last_success": dict(self._last_success),
+                "last_error": dict(self._last_error)
+            }
+
+    def render(self):
+        """Prometheus exposition lines of the statistics"""
+        statistics = self.get_statistics()
+        lines = self._latency.render()
+        lines += PrometheusMetrics.render_family(
+            "aq_storage_errors_total", "counter", "Failed storage operations by exception class",
+            [({"operation": o, "database": d, "exception": e}, count) for (o, d, e), count in sorted(statistics["errors"].items())])
+        lines += PrometheusMetrics.render_family(
+            "aq_storage_written_bytes_total", "counter", "Line protocol bytes written",
+            [({"database": d, "measurement": m}, size) for (d, m), size in sorted(statistics["bytes_written"].items())])
+        lines += PrometheusMetrics.render_family(
+            "aq_storage_last_success_timestamp_seconds", "gauge", "Time of the last successful storage operation",
+            [({"operation": o, "database": d}, t) for (o, d), t in sorted(statistics["last_success"].items())])
+        return lines
+
+    def _log_summary_if_due(self):
+        with self._lock:
+            if time.monotonic() - self._last_summary < self.SUMMARY_INTERVAL_SEC:
+                return
+            self._last_summary = time.monotonic()
+        statistics = self.get_statistics()
+        totals = {} # (operation, database): [count, seconds, errors]
+        for (operation, database, _), (count, seconds) in statistics["latency"].items():
+            total = totals.setdefault((operation, database), [0, 0.0, 0])
+            total[0] += count
+            total[1] += seconds
+        for (operation, database, _), count in statistics["errors"].items():
+            totals.setdefault((operation, database), [0, 0.0, 0])[2] += count
+        now = time.time()
+        for (operation, database), (count, seconds, errors) in sorted(totals.items()):
+            mean_ms = 1000 * seconds / count if count else 0
+            last_success = statistics["last_success"].get((operation, database))
+            since = f"{now - last_success:.0f} s ago" if last_success is not None else "never"
+            message = f"Storage {operation} {database}: {count} ok, mean {mean_ms:.1f} ms, {errors} errors, last success {since}"
+            last_error = statistics["last_error"].get((operation, database))
+            if last_error is not None:
+                message += f", last error {now - last_error[0]:.0f} s ago: {last_error[1]}"
+            if errors:
+                self._logger.warning(message)
+            else:
+                self._logger.info(message)
+        for (database, measurement), size in sorted(statistics["bytes_written"].items()):
+            self._logger.info(f"Storage written {database}.{measurement}: {size} bytes")
@@ -0,0 +1,85 @@
+import pytest
+
+from adaptive_interval import AdaptiveInterval
+
+
+@pytest.fixture
+def interval():
+    return AdaptiveInterval("LightSensor", 3, 60, {"lux": (1.0, 0.05)})
+
+
+def test_the_interval_grows_while_the_values_are_flat(interval):
+    intervals = [interval.update({"lux": 10.0 + (0.1 if i % 2 else 0)}) for i in range(30)]
+    assert [3] * AdaptiveInterval.WINDOW == intervals[:AdaptiveInterval.WINDOW]
+    assert intervals[AdaptiveInterval.WINDOW] == 3 * AdaptiveInterval.INCREASE_FACTOR
+    assert 60 == intervals[-1]
+
+
+def test_a_change_drops_back_to_the_minimum_at_once(interval):
+    for _ in range(30):
+        interval.update({"lux": 10.0})
+    assert 3 == interval.update({"lux": 50.0})
+    assert 1 == interval.get_statistics()["changes"]
+    # the window starts again from the new level
+    assert 3 == interval.update({"lux": 50.0})
+
+
+def test_a_noisy_signal_stays_at_the_minimum(interval):
+    intervals = [interval.update({"lux": 10.0 + (0.9 if i % 2 else -0.9)}) for i in range(30)]
+    assert {3} == set(intervals)
+
+
+def test_the_relative_tolerance_applies_to_bright_light(interval):
+    for i in range(30):
+        interval.update({"lux": 1000.0 + (20 if i % 2 else -20)})
+    assert 60 == interval.interval_sec
+
+
+def test_none_values_are_ignored(interval):
+    for _ in range(30):
+        interval.update({"lux": 10.0})
+    assert 60 == interval.update({"lux": None})
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("off", None),
+    ("on", (3, 60)),
+    ("LightSensor=1:120", (1, 120)),
+    ("RadonSensor=300:540", (3, 60)),
+    ("LightSensor=3:3", None)
+])
+def test_configured_from_the_environment(monkeypatch, value, expected):
+    monkeypatch.setenv("AQ_ADAPTIVE_SAMPLING", value)
+    interval = AdaptiveInterval.configured("LightSensor", 3, 60, {"lux": (1.0, 0.0)})
+    if expected is None:
+        assert interval is None
+    else:
+        assert expected == (interval.min_interval_sec, interval.max_interval_sec)
+
+
+def test_invalid_configurations_are_rejected(monkeypatch):
+    monkeypatch.setenv("AQ_ADAPTIVE_SAMPLING", "LightSensor=3")
+    with pytest.raises(ValueError):
+        AdaptiveInterval.configured("LightSensor", 3, 60, {"lux": (1.0, 0.0)})
+    with pytest.raises(ValueError):
+        AdaptiveInterval("LightSensor", 60, 3, {"lux": (1.0, 0.0)})
+
+
+def test_the_interval_sets_the_period_of_a_sensor(monkeypatch):
+    import threading
+    from i2c_sensor import I2CSensor
+
+    class FlatSensor(I2CSensor):
+        PERIOD_SEC = 0.01
+        MAX_INTERVAL_SEC = 0.04
+        ADAPTIVE_TOLERANCES = {"lux": (1.0, 0.0)}
+
+        def sample(self):
+            return {"lux": 10.0}
+
+    monkeypatch.setenv("AQ_ADAPTIVE_SAMPLING", "on")
+    sensor = FlatSensor(None, None)
+    stop = threading.Event()
+    threading.Timer(0.5, stop.set).start()
+    sensor.run(stop)
+    assert 0.04 == sensor.schedule.get_statistics()["period_sec"]
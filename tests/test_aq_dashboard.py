@@ -0,0 +1,61 @@
+import asyncio
+import importlib
+import json
+from datetime import datetime, timezone
+
+import pyarrow
+import pyarrow.ipc
+import pytest
+from fastapi import HTTPException
+
+
+@pytest.fixture
+def dashboard(monkeypatch):
+    monkeypatch.setenv("AQ_STORAGE_BACKEND", "memory")
+    monkeypatch.setenv("AQ_LATEST_VALUE_BUS", "off")
+    return importlib.import_module("aq_dashboard")
+
+
+def test_history_json_has_null_for_empty_buckets(dashboard):
+    table = pyarrow.table({
+        "time": pyarrow.array([1000, 2000, 3000], pyarrow.timestamp("ms")),
+        "co2": [float("nan"), 1.5, float("inf")],
+        "count": pyarrow.array([None, 2, 3], pyarrow.int64())
+    })
+    history = json.loads("".join(dashboard.history_json_chunks("scd41", "mean", 1, table)))
+    assert ["co2", "count"] == history["fields"]
+    assert [[1000, None, None], [2000, 1.5, 2], [3000, None, 3]] == history["points"]
+
+
+def test_history_reads_naive_times_as_utc(dashboard, monkeypatch):
+    ranges = []
+
+    async def read_history_async(measurement, fields, start, stop, points, aggregate, rollups):
+        ranges.append((start, stop))
+        return 60, pyarrow.table({"time": pyarrow.array([], pyarrow.timestamp("ms")), "co2": pyarrow.array([], pyarrow.float64())})
+    monkeypatch.setattr(dashboard.storage, "read_history_async", read_history_async)
+    asyncio.run(dashboard.history("scd41", "co2", start=datetime(2026, 10, 18), stop=datetime(2026, 10, 18, 1)))
+    assert [(datetime(2026, 10, 18, tzinfo=timezone.utc), datetime(2026, 10, 18, 1, tzinfo=timezone.utc))] == ranges
+
+
+@pytest.mark.parametrize("start, stop, points", [
+    (datetime(2026, 10, 18, 1), datetime(2026, 10, 18), 1000),
+    (datetime(2026, 10, 18), datetime(2026, 10, 18, tzinfo=timezone.utc), 1000),
+    (datetime(2026, 10, 18), datetime(2026, 10, 18, 1), 0)
+])
+def test_history_refuses_an_empty_range_or_no_points(dashboard, start, stop, points):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(dashboard.history("scd41", "co2", start=start, stop=stop, points=points))
+    assert 400 == error.value.status_code
+
+
+def test_history_arrow_is_streamed_one_message_per_batch(dashboard, monkeypatch):
+    monkeypatch.setattr(dashboard, "HISTORY_CHUNK_POINTS", 2)
+    table = pyarrow.table({
+        "time": pyarrow.array([1000, 2000, 3000, 4000, 5000], pyarrow.timestamp("ms")),
+        "co2": [400.0, 410.0, 420.0, 430.0, 440.0]
+    })
+    chunks = list(dashboard.history_arrow_chunks(table))
+    # schema, 3 batches, end of stream
+    assert 5 == len(chunks)
+    assert table.equals(pyarrow.ipc.open_stream(b"".join(chunks)).read_all())
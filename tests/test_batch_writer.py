@@ -0,0 +1,68 @@
+import threading
+import time
+
+from batch_writer import BatchWriter
+
+
+class Recorder:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def __call__(self, database, records):
+        time.sleep(self.delay)
+        with self.lock:
+            self.batches.append((database, list(records)))
+
+    def written(self, database):
+        return [record for db, batch in self.batches if db == database for record in batch]
+
+
+def test_close_writes_the_queued_records():
+    recorder = Recorder()
+    writer = BatchWriter(recorder, max_batch_age_sec=60)
+    for i in range(10):
+        assert writer.enqueue("gas", ("m", i, {"a": i}))
+    assert writer.close()
+    assert [("m", i, {"a": i}) for i in range(10)] == recorder.written("gas")
+
+
+def test_enqueue_after_close_is_refused():
+    writer = BatchWriter(Recorder())
+    writer.close()
+    assert not writer.enqueue("gas", ("m", 1, {"a": 1}))
+
+
+def test_records_are_written_in_order_when_flushing_concurrently():
+    recorder = Recorder(delay=0.001)
+    writer = BatchWriter(recorder, max_batch_records=5, max_batch_age_sec=0.001)
+    stop = threading.Event()
+
+    def flush():
+        while not stop.is_set():
+            writer.flush()
+
+    flusher = threading.Thread(target=flush)
+    flusher.start()
+    for i in range(500):
+        writer.enqueue("gas", ("m", i, {"a": i}))
+    stop.set()
+    flusher.join()
+    assert writer.close()
+    assert list(range(500)) == [record[1] for record in recorder.written("gas")]
+
+
+def test_failed_batches_are_retried():
+    calls = []
+
+    def write_records(database, records):
+        calls.append(len(records))
+        if 1 == len(calls):
+            raise OSError("unreachable")
+
+    writer = BatchWriter(write_records, max_batch_age_sec=60)
+    writer.enqueue("gas", ("m", 1, {"a": 1}))
+    assert not writer.flush()
+    assert writer.flush()
+    assert {"queue_depth": 0, "written": 1, "dropped": 0, "failed_batches": 1} == writer.get_statistics()
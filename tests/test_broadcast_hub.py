@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+import pytest
+
+from broadcast_hub import BroadcastHub
+
+
+@pytest.fixture
+def hub():
+    return BroadcastHub(3)
+
+
+def frames(queue):
+    received = []
+    while not queue.empty():
+        received += queue.get_nowait()
+    return received
+
+
+def test_subscribers_of_the_same_stream_share_it(hub):
+    first = hub.subscribe(BroadcastHub.Mode.Full)
+    second = hub.subscribe(BroadcastHub.Mode.Full)
+    assert 1 == len(hub._streams)
+    hub.publish({"timestamp": "t", "co2": 400}, [])
+    for queue in (first, second):
+        assert {"type": "data", "payload": {"timestamp": "t", "co2": 400}} == json.loads(frames(queue)[0])
+
+
+def test_resubscribing_to_the_same_stream_keeps_receiving(hub):
+    queue = hub.subscribe(BroadcastHub.Mode.Delta, None, 3)
+    hub.resubscribe(queue, BroadcastHub.Mode.Delta, None, 3)
+    assert 1 == len(hub._streams)
+    frames(queue)
+    hub.publish({"timestamp": "t", "co2": 400}, [])
+    assert frames(queue)
+
+
+def test_resubscribing_moves_the_client_to_the_new_stream(hub):
+    queue = hub.subscribe(BroadcastHub.Mode.Full)
+    hub.resubscribe(queue, BroadcastHub.Mode.Full, ["co2"], None)
+    assert 1 == len(hub._streams)
+    assert "subscribed" == json.loads(frames(queue)[0])["type"]
+    hub.publish({"timestamp": "t", "co2": 400, "aqi": 20}, [])
+    assert {"timestamp": "t", "co2": 400} == json.loads(frames(queue)[0])["payload"]
+
+
+@pytest.mark.parametrize("interval", [float("inf"), float("nan"), 1e309, 0, -3])
+def test_invalid_intervals_are_rejected(hub, interval):
+    queue = hub.subscribe(BroadcastHub.Mode.Full)
+    with pytest.raises(ValueError):
+        hub.resubscribe(queue, BroadcastHub.Mode.Full, None, interval)
+    hub.publish({"timestamp": "t"}, [])
+    assert frames(queue)
+
+
+def test_unknown_groups_are_rejected(hub):
+    queue = hub.subscribe(BroadcastHub.Mode.Full)
+    with pytest.raises(ValueError):
+        hub.resubscribe(queue, BroadcastHub.Mode.Full, ["unknown"], None)
+
+
+def test_unsubscribe_removes_the_stream(hub):
+    queue = hub.subscribe(BroadcastHub.Mode.Full)
+    hub.unsubscribe(queue)
+    assert 0 == hub.subscriber_count
+    assert not hub._streams
+
+
+def test_a_slow_binary_client_keeps_the_schema(hub):
+    queue = hub.subscribe(BroadcastHub.Mode.Binary)
+    for i in range(5):
+        hub.publish({"timestamp": str(i), "co2": 400 + i}, [])
+    received = frames(queue)
+    assert "schema" == json.loads(received[0])["type"]
+    # then a keyframe, binary
+    assert isinstance(received[1], bytes)
+
+
+def test_a_slow_delta_client_is_resynchronized_with_a_keyframe(hub):
+    queue = hub.subscribe(BroadcastHub.Mode.Delta)
+    for i in range(5):
+        hub.publish({"timestamp": str(i), "co2": 400 + i}, [])
+    received = frames(queue)
+    assert {"type": "data", "payload": {"timestamp": "4", "co2": 404}} == json.loads(received[0])
@@ -0,0 +1,56 @@
+import time
+
+import pytest
+
+from compensation_feed import CompensationFeed
+from latest_value_bus import LatestValueBus
+
+
+class Storage:
+    def __init__(self):
+        self.reads = 0
+
+    def read_temperature_relative_humidity_data(self):
+        self.reads += 1
+        return 20.0, 40.0
+
+
+@pytest.fixture
+def bus(tmp_path):
+    return LatestValueBus(str(tmp_path / "bus"))
+
+
+def now_ms(age_sec=0):
+    return int((time.time() - age_sec) * 1000)
+
+
+def test_the_bme688_record_is_used_when_fresh(bus):
+    bus.publish("climate", "bme688", now_ms(), {"temperature": 22.5, "relative_humidity": 45.0})
+    bus.publish("climate", "scd41", now_ms(), {"temperature": 30.0, "relative_humidity": 30.0})
+    assert (22.5, 45.0) == CompensationFeed(Storage(), bus).read()
+
+
+def test_a_stale_bme688_record_falls_back_to_the_mean_of_the_other_sources(bus):
+    bus.publish("climate", "bme688", now_ms(60), {"temperature": 22.5, "relative_humidity": 45.0})
+    bus.publish("climate", "scd41", now_ms(), {"temperature": 24.0, "relative_humidity": 41.0})
+    bus.publish("climate", "bmp390l", now_ms(), {"temperature": 23.0, "pressure": 1000.0})
+    bus.publish("climate", "airthings_radon", now_ms(3600), {"temperature": 10.0, "relative_humidity": 90.0})
+    assert (23.5, 41.0) == CompensationFeed(Storage(), bus).read()
+
+
+def test_no_fresh_relative_humidity_means_no_compensation(bus):
+    bus.publish("climate", "bmp390l", now_ms(), {"temperature": 23.0, "pressure": 1000.0})
+    assert (None, None) == CompensationFeed(Storage(), bus).read()
+
+
+def test_without_the_bus_the_storage_is_read_once_per_refresh_interval(bus):
+    storage = Storage()
+    feed = CompensationFeed(storage, bus)
+    assert (20.0, 40.0) == feed.read()
+    assert (20.0, 40.0) == feed.read()
+    assert 1 == storage.reads
+
+
+def test_the_storage_is_read_unless_the_bus_is_enabled(monkeypatch):
+    monkeypatch.delenv("AQ_LATEST_VALUE_BUS", raising=False)
+    assert (20.0, 40.0) == CompensationFeed(Storage()).read()
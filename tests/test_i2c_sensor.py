@@ -0,0 +1,50 @@
+import threading
+
+import pytest
+
+from i2c_sensor import I2CSensor
+from i2c_sensor_runtime import I2CSensorRuntime
+
+
+class CountingSensor(I2CSensor):
+    PERIOD_SEC = 0.01
+
+    def __init__(self, persistent_storage, bus):
+        super().__init__(persistent_storage, bus)
+        self.samples = 0
+        self.closed = False
+
+    def sample(self):
+        self.samples += 1
+
+    def close(self):
+        self.closed = True
+
+
+class IncompleteSensor(I2CSensor):
+    pass
+
+
+def test_a_sensor_without_sample_cannot_be_created():
+    with pytest.raises(TypeError):
+        IncompleteSensor(None, None)
+
+
+def test_run_samples_until_stopped_and_closes():
+    sensor = CountingSensor(None, None)
+    stop = threading.Event()
+    timer = threading.Timer(0.2, stop.set)
+    timer.start()
+    sensor.run(stop)
+    assert sensor.samples > 5
+    assert sensor.closed
+
+
+def test_the_runtime_does_not_restart_an_incomplete_sensor(monkeypatch):
+    monkeypatch.setattr(I2CSensorRuntime, "SENSORS", {"incomplete": (__name__, "IncompleteSensor")})
+    runtime = I2CSensorRuntime(None)
+    runtime._supervise("incomplete")
+    statistics = runtime.get_statistics()["incomplete"]
+    assert "failed" == statistics["status"]
+    assert 0 == statistics["restarts"]
+    assert "sample" in statistics["last_error"][1]
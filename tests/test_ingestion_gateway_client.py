@@ -0,0 +1,34 @@
+import socket
+from datetime import datetime
+from decimal import Decimal
+
+import numpy
+import pytest
+
+from ingestion_gateway_client import IngestionGatewayClient
+
+
+@pytest.fixture
+def gateway(tmp_path):
+    path = str(tmp_path / "gateway.sock")
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    server.bind(path)
+    yield path, server
+    server.close()
+
+
+def test_a_record_is_sent_as_a_datagram(gateway):
+    path, server = gateway
+    client = IngestionGatewayClient(path)
+    assert client.send("climate", ("scd41", 1000, {"co2": 415}))
+    assert ("climate", ("scd41", 1000, {"co2": 415})) == IngestionGatewayClient.decode(server.recv(65536))
+
+
+@pytest.mark.parametrize("value", [Decimal("1.5"), datetime(2026, 10, 18), numpy.int64(415)])
+def test_a_record_that_cannot_be_encoded_is_not_sent(gateway, value):
+    path, _ = gateway
+    assert not IngestionGatewayClient(path).send("climate", ("scd41", 1000, {"co2": value}))
+
+
+def test_send_returns_false_without_a_gateway(tmp_path):
+    assert not IngestionGatewayClient(str(tmp_path / "missing.sock")).send("climate", ("scd41", 1000, {"co2": 415}))
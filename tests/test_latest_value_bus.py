@@ -0,0 +1,74 @@
+import time
+from decimal import Decimal
+
+import numpy
+import pytest
+
+from latest_value_bus import LatestValueBus
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "bus")
+
+
+def test_a_published_record_is_read_by_another_mapping(path):
+    writer = LatestValueBus(path)
+    reader = LatestValueBus(path)
+    assert not reader.is_available()
+    now_ms = int(time.time() * 1000)
+    assert writer.publish("climate", "bme688", now_ms, {"temperature": 21.5, "relative_humidity": 40, "pressure": None})
+    assert (now_ms, {"temperature": 21.5, "relative_humidity": 40}) == reader.read("climate", "bme688", 60)
+    assert {("climate", "bme688"): (now_ms, {"temperature": 21.5, "relative_humidity": 40})} == reader.read_all(60)
+
+
+def test_stale_and_unknown_records_are_not_read(path):
+    writer = LatestValueBus(path)
+    writer.publish("climate", "scd41", int(time.time() * 1000) - 120000, {"temperature": 20.0})
+    assert writer.read("climate", "scd41", 60) is None
+    assert writer.read("climate", "bme688", 60) is None
+    assert {} == writer.read_all(60)
+    assert not writer.publish("climate", "unknown", 0, {})
+
+
+def test_a_record_too_large_for_its_slot_is_refused(path):
+    writer = LatestValueBus(path)
+    assert not writer.publish("gas", "sgp41", 0, {"text": "x" * LatestValueBus.SLOT_SIZE})
+
+
+def test_a_torn_slot_is_not_read(path):
+    writer = LatestValueBus(path)
+    now_ms = int(time.time() * 1000)
+    writer.publish("gas", "sgp41", now_ms, {"voc_index": 100})
+    # a writer interrupted in the middle of the slot leaves its sequence odd
+    offset = LatestValueBus.HEADER_SIZE + LatestValueBus.SLOTS.index(("gas", "sgp41")) * LatestValueBus.SLOT_SIZE
+    sequence = LatestValueBus._sequence.unpack_from(writer._map, offset)[0]
+    LatestValueBus._sequence.pack_into(writer._map, offset, sequence + 1)
+    assert LatestValueBus(path).read("gas", "sgp41", 60) is None
+
+
+@pytest.mark.parametrize("value, enabled", [(None, False), ("off", False), ("on", True), ("1", True)])
+def test_the_bus_is_opt_in(monkeypatch, value, enabled):
+    if value is None:
+        monkeypatch.delenv("AQ_LATEST_VALUE_BUS", raising=False)
+    else:
+        monkeypatch.setenv("AQ_LATEST_VALUE_BUS", value)
+    assert enabled == (LatestValueBus.configured() is not None)
+
+
+def test_a_writer_opening_the_bus_keeps_the_published_records(path):
+    now_ms = int(time.time() * 1000)
+    LatestValueBus(path).publish("climate", "bme688", now_ms, {"temperature": 21.5})
+    LatestValueBus(path).publish("climate", "scd41", now_ms, {"co2": 415})
+    assert {("climate", "bme688"), ("climate", "scd41")} == set(LatestValueBus(path).read_all(60))
+
+
+def test_numpy_scalars_are_published_as_numbers(path):
+    writer = LatestValueBus(path)
+    now_ms = int(time.time() * 1000)
+    assert writer.publish("gas", "scd41", now_ms, {"co2": numpy.int64(415), "temperature": numpy.float32(21.5)})
+    assert {("gas", "scd41"): (now_ms, {"co2": 415, "temperature": 21.5})} == writer.read_all(60)
+
+
+def test_a_record_that_cannot_be_encoded_is_refused(path):
+    assert not LatestValueBus(path).publish("gas", "scd41", 0, {"co2": Decimal("415")})
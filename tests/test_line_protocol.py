@@ -0,0 +1,45 @@
+import numpy
+import pytest
+
+from line_protocol import LineProtocol
+
+
+def test_value_types():
+    line = LineProtocol.encode(("m", 1, {"f": 1.5, "i": 3, "b": True, "s": 'a "b"\nc'}))
+    assert 'm f=1.5,i=3i,b=true,s="a \\"b\\"\\nc" 1' == line
+
+
+def test_numpy_scalars_keep_their_number_type():
+    line = LineProtocol.encode(("m", 1, {"a": numpy.int64(3), "b": numpy.float32(1.5),
+                                         "c": numpy.float64(2.25), "d": numpy.bool_(True)}))
+    assert "m a=3i,b=1.5,c=2.25,d=true 1" == line
+
+
+def test_none_and_non_finite_values_are_skipped():
+    assert "m b=1i 1" == LineProtocol.encode(("m", 1, {"a": None, "b": 1, "c": float("nan"), "d": numpy.float64("inf")}))
+    assert LineProtocol.encode(("m", 1, {"a": None})) is None
+
+
+def test_escaping():
+    line = LineProtocol.encode(("m e,a", 1, {"f x=,": 1.0}))
+    assert "m\\ e\\,a f\\ x\\=\\,=1.0 1" == line
+    assert ("m e,a", 1, {"f x=,": 1.0}) == LineProtocol.decode(line)
+
+
+def test_encode_all_ends_every_line():
+    records = [("m", 1, {"a": 1.0}), ("m", 2, {"a": None}), ("n", 3, {"b": 2})]
+    assert "m a=1.0 1\nn b=2i 3\n" == LineProtocol.encode_all(records)
+
+
+@pytest.mark.parametrize("record", [
+    ("m", 1700000000000, {"f": -0.5, "i": -7, "b": False, "s": "x\\y"}),
+    ("pmsa003_0", 5, {"pm25_cf1": 12})
+])
+def test_decode_round_trip(record):
+    assert record == LineProtocol.decode(LineProtocol.encode(record))
+
+
+def test_decode_rejects_invalid_lines():
+    for line in ("m", "m,tag=1 f=1 1", "m f 1", "m f=1"):
+        with pytest.raises(ValueError):
+            LineProtocol.decode(line)
@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+
+import sample_schedule
+from sample_schedule import SampleSchedule
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(sample_schedule.time, "monotonic", clock)
+    return clock
+
+
+def test_deadlines_are_on_the_grid_shifted_by_the_phase(clock):
+    schedule = SampleSchedule("s", 3, phase_sec=0.5)
+    assert 1002.5 == schedule._wake
+    clock.now = schedule._wake
+    schedule.sampled()
+    assert 1005.5 == schedule._wake
+
+
+def test_samples_on_time_are_neither_late_nor_missed(clock):
+    schedule = SampleSchedule("s", 3)
+    for _ in range(10):
+        clock.now = schedule._wake + 0.1
+        schedule.sampled()
+    assert {"period_sec": 3, "samples": 10, "late": 0, "missed": 0} == \
+        {k: v for k, v in schedule.get_statistics().items() if k != "max_lateness_sec"}
+
+
+def test_a_sample_ending_after_a_quarter_of_the_period_is_late(clock):
+    schedule = SampleSchedule("s", 4)
+    clock.now = schedule._wake + 1.5
+    schedule.sampled()
+    statistics = schedule.get_statistics()
+    assert 1 == statistics["late"]
+    assert 0 == statistics["missed"]
+    assert 1.5 == statistics["max_lateness_sec"]
+
+
+def test_a_sample_overrunning_deadlines_misses_them(clock):
+    schedule = SampleSchedule("s", 2)
+    deadline = schedule._wake
+    clock.now = deadline + 5
+    schedule.sampled()
+    assert 2 == schedule.get_statistics()["missed"]
+    assert deadline + 6 == schedule._wake
+
+
+def test_a_period_without_data_is_missed_and_the_device_is_polled(clock):
+    schedule = SampleSchedule("s", 5, poll_interval_sec=0.2)
+    deadline = schedule._wake
+    clock.now = deadline
+    schedule.not_ready()
+    assert deadline + 0.2 == pytest.approx(schedule._wake)
+    assert 0 == schedule.get_statistics()["missed"]
+    clock.now = deadline + 5
+    schedule.not_ready()
+    assert 1 == schedule.get_statistics()["missed"]
+    # the deadlines then follow the clock of the device
+    clock.now = deadline + 5.3
+    schedule.sampled()
+    assert deadline + 10.3 == pytest.approx(schedule._wake)
+
+
+def test_set_period_applies_from_the_next_deadline(clock):
+    schedule = SampleSchedule("s", 3)
+    clock.now = schedule._wake
+    schedule.set_period(10)
+    schedule.sampled()
+    assert clock.now + 10 == schedule._wake
+    assert 10 == schedule.get_statistics()["period_sec"]
+
+
+def test_wait_returns_false_once_stopped(clock):
+    schedule = SampleSchedule("s", 3)
+    stop = threading.Event()
+    clock.now = schedule._wake
+    assert schedule.wait(stop)
+    stop.set()
+    assert not schedule.wait(stop)
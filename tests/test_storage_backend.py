@@ -0,0 +1,35 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from memory_backend import MemoryBackend
+from sqlite_backend import SQLiteBackend
+from storage_backend import StorageBackend
+
+
+def test_a_backend_missing_a_method_cannot_be_created():
+    class IncompleteBackend(StorageBackend):
+        def write(self, db, records):
+            return 0
+
+    with pytest.raises(TypeError):
+        IncompleteBackend()
+
+
+def test_the_backends_implement_the_interface(tmp_path):
+    MemoryBackend()
+    SQLiteBackend(str(tmp_path))
+
+
+def test_to_epoch_ms():
+    aware = datetime(2026, 1, 1, 0, 0, 1, 500000, tzinfo=timezone.utc)
+    assert 1767225601500 == StorageBackend.to_epoch_ms(aware)
+    assert 1767225601500 == StorageBackend.to_epoch_ms(aware.replace(tzinfo=None))
+    assert 1767225601500 == StorageBackend.to_epoch_ms(1767225601500)
+    assert aware.replace(tzinfo=None) == StorageBackend.from_epoch_ms(1767225601500)
+
+
+@pytest.mark.parametrize("timestamp", [1767225601.5, "1767225601500", True, None])
+def test_to_epoch_ms_rejects_other_types(timestamp):
+    with pytest.raises(TypeError):
+        StorageBackend.to_epoch_ms(timestamp)
@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+from write_compressor import WriteCompressor
+
+
+@pytest.fixture
+def compressor():
+    return WriteCompressor({"ltr390": {"visible_light_lux": 0.5}}, heartbeat_sec=60)
+
+
+def light(time_sec, lux):
+    return "ltr390", int(time_sec * 1000), {"visible_light_lux": lux}
+
+
+def compress_all(compressor, records):
+    kept = []
+    for record in records:
+        kept += compressor.compress("light", [record])
+    return kept + compressor.flush().get("light", [])
+
+
+def test_a_ramp_keeps_its_ends_only(compressor):
+    records = [light(3 * i, 100 + 2 * i) for i in range(15)]
+    assert [records[0], records[-1]] == compress_all(compressor, records)
+
+
+def test_a_step_is_kept(compressor):
+    records = [light(3 * i, 100 if i < 8 else 200) for i in range(15)]
+    kept = compress_all(compressor, records)
+    assert [records[0], records[7], records[8], records[-1]] == kept
+
+
+def test_the_dropped_records_are_within_the_tolerance(compressor):
+    noise = random.Random(1)
+    records = [light(3 * i, 100 + noise.gauss(0, 0.2) + (i // 50) * 2) for i in range(200)]
+    kept = compress_all(compressor, records)
+    assert len(kept) < len(records)
+    for _, time_ms, fields in records:
+        after = next(i for i, record in enumerate(kept) if record[1] >= time_ms)
+        if kept[after][1] == time_ms:
+            continue
+        (_, t0, f0), (_, t1, f1) = kept[after - 1], kept[after]
+        interpolated = f0["visible_light_lux"] + (f1["visible_light_lux"] - f0["visible_light_lux"]) * (time_ms - t0) / (t1 - t0)
+        assert abs(interpolated - fields["visible_light_lux"]) <= 0.5 + 1e-9
+
+
+def test_a_record_is_kept_every_heartbeat(compressor):
+    kept = compress_all(compressor, [light(3 * i, 100) for i in range(100)])
+    times = [record[1] for record in kept]
+    assert max(b - a for a, b in zip(times, times[1:])) <= 60000
+
+
+def test_other_measurements_are_not_compressed(compressor):
+    records = [("air_quality_index", i, {"pm25_cf1_aqi": 10}) for i in range(5)]
+    assert records == compressor.compress("dust", records)
+
+
+def test_non_numeric_values_are_kept(compressor):
+    records = [light(0, 100), light(3, 100), light(6, None), light(9, 100)]
+    assert records == compress_all(compressor, records)
+
+
+def test_compression_ratio(compressor):
+    compress_all(compressor, [light(3 * i, 100) for i in range(10)])
+    statistics = compressor.get_statistics()["light/ltr390"]
+    assert 10 == statistics["received"]
+    assert 2 == statistics["stored"]
+    assert 5 == statistics["ratio"]
+    assert 5 == statistics["fields"]["visible_light_lux"]["ratio"]
+
+
+def test_configured_from_the_environment(monkeypatch):
+    monkeypatch.delenv("AQ_WRITE_COMPRESSION", raising=False)
+    assert WriteCompressor.configured() is None
+    monkeypatch.setenv("AQ_WRITE_COMPRESSION", "ltr390.visible_light_lux=2,heartbeat=120")
+    compressor = WriteCompressor.configured()
+    assert 2 == compressor._tolerances["ltr390"]["visible_light_lux"]
+    assert 120000 == compressor._heartbeat_ms
+    monkeypatch.setenv("AQ_WRITE_COMPRESSION", "ltr390=2")
+    with pytest.raises(ValueError):
+        WriteCompressor.configured()
@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+from write_spool import WriteSpool
+
+
+class Backend:
+    def __init__(self):
+        self.reachable = False
+        self.records = []
+
+    def write_records(self, database, records):
+        if not self.reachable:
+            raise OSError("unreachable")
+        self.records += [(database, record) for record in records]
+
+
+@pytest.fixture
+def backend():
+    return Backend()
+
+
+@pytest.fixture
+def spool(tmp_path, backend):
+    spool = WriteSpool(str(tmp_path / "spool"), backend.write_records)
+    yield spool
+    spool.close()
+
+
+def test_spooled_records_are_replayed_once_the_backend_is_back(spool, backend):
+    records = [("scd41", 1000 + i, {"co2": 400 + i, "ok": True}) for i in range(10)]
+    spool.report_failure()
+    assert spool.is_unreachable()
+    spool.append("gas", records)
+    assert 0 < spool.get_statistics()["pending_bytes"]
+    backend.reachable = True
+    # RETRY_INTERVAL_SEC later
+    spool._unreachable_until = 0
+    assert spool._replay()
+    assert [("gas", record) for record in records] == backend.records
+    statistics = spool.get_statistics()
+    assert 10 == statistics["spooled"]
+    assert 10 == statistics["replayed"]
+    assert 0 == statistics["pending_bytes"]
+    assert not statistics["unreachable"]
+
+
+def test_the_segments_left_by_a_closed_spool_are_replayed_by_the_next_one(tmp_path, backend):
+    directory = str(tmp_path / "spool")
+    first = WriteSpool(directory, backend.write_records)
+    first.append("light", [("ltr390", 1, {"visible_light_lux": 1.5})])
+    first.close()
+    assert [name.endswith(WriteSpool.SEALED_SUFFIX) for name in os.listdir(os.path.join(directory, "light"))] == [True]
+    backend.reachable = True
+    second = WriteSpool(directory, backend.write_records)
+    try:
+        assert second._replay()
+    finally:
+        second.close()
+    assert [("light", ("ltr390", 1, {"visible_light_lux": 1.5}))] == backend.records
+
+
+def test_a_torn_line_is_skipped(spool, backend, tmp_path):
+    spool.append("gas", [("scd41", 1, {"co2": 400})])
+    spool._segments["gas"].file.write(b"scd41 co2=4")
+    spool._segments["gas"].file.flush()
+    backend.reachable = True
+    assert spool._replay()
+    assert [("gas", ("scd41", 1, {"co2": 400}))] == backend.records
+    assert 1 == spool.get_statistics()["invalid_lines"]
+
+
+def test_append_after_close_raises(spool):
+    spool.close()
+    with pytest.raises(RuntimeError):
+        spool.append("gas", [("scd41", 1, {"co2": 400})])
@@ -1,56 +1,77 @@
 #!/usr/bin/env python3
 
-from sensirion_i2c_driver import LinuxI2cTransceiver, I2cConnection
-from sensirion_i2c_sgp4x import Sgp41I2cDevice
-from sensirion_gas_index_algorithm.voc_algorithm import VocAlgorithm
-from sensirion_gas_index_algorithm.nox_algorithm import NoxAlgorithm
-from persistent_storage import PersistentStorage
-from logger_configurator import LoggerConfigurator
 from datetime import datetime, timezone
+from i2c_sensor import I2CSensor, SharedI2CBus
+from persistent_storage import PersistentStorage
+from compensation_feed import CompensationFeed
 import time
-from constants import SLEEP_DURATION_SECONDS
-
-
-# Connect to I2C port
-logger = LoggerConfigurator.configure_logger("VocNoxSensor")
-persistent_storage = PersistentStorage()
-with LinuxI2cTransceiver('/dev/i2c-1') as i2c_transceiver:
-    sgp41 = Sgp41I2cDevice(I2cConnection(i2c_transceiver))
-
-    # Print serial number
-    logger.info(f"SGP41 Serial: {sgp41.get_serial_number()}")
-
-    # Initialize Gas Index Algorithm
-    voc_algorithm = VocAlgorithm()
-    nox_algorithm = NoxAlgorithm()
-
-    # First 10 seconds: conditioning (recommended by Sensirion)
-    logger.info("Running conditioning...")
-    for _ in range(10):
-        temperature, relative_humidity = persistent_storage.read_temperature_relative_humidity_data()
-        if temperature is not None and relative_humidity is not None:
-            logger.info(f"Using temperature: {temperature}, relative_humidity: {relative_humidity} for conditioning")
-            voc_raw = sgp41.conditioning(temperature=temperature, relative_humidity=relative_humidity)
-        else:
-            voc_raw = sgp41.conditioning()
-        voc_index = voc_algorithm.process(voc_raw.ticks)
-        logger.info(f"VOC index (conditioning): {voc_index}")
-        time.sleep(1)
-
-    logger.info("Measuring VOC+NOx...")
-    while True:
+
+
+class VocNoxSensor(I2CSensor):
+    """SGP41 VOC and NOx indexes, compensated with the temperature and relative
+    humidity of the other sensors when available. The Sensirion driver opens
+    its own handle of the bus, the shared lock still serializes the accesses."""
+    CONDITIONING_SEC = 10
+
+    def __init__(self, persistent_storage, bus: SharedI2CBus):
+        super().__init__(persistent_storage, bus)
+        self._compensation = CompensationFeed(persistent_storage)
+        from sensirion_i2c_driver import LinuxI2cTransceiver, I2cConnection
+        from sensirion_i2c_sgp4x import Sgp41I2cDevice
+        from sensirion_gas_index_algorithm.voc_algorithm import VocAlgorithm
+        from sensirion_gas_index_algorithm.nox_algorithm import NoxAlgorithm
+
+        # Connect to I2C port
+        self._i2c_transceiver = LinuxI2cTransceiver(SharedI2CBus.DEVICE)
+        try:
+            self._sgp41 = Sgp41I2cDevice(I2cConnection(self._i2c_transceiver))
+
+            # Print serial number
+            with self._bus.lock:
+                self._logger.info(f"SGP41 Serial: {self._sgp41.get_serial_number()}")
+
+            # Initialize Gas Index Algorithm
+            self._voc_algorithm = VocAlgorithm()
+            self._nox_algorithm = NoxAlgorithm()
+
+            # First 10 seconds: conditioning (recommended by Sensirion)
+            self._logger.info("Running conditioning...")
+            for _ in range(self.CONDITIONING_SEC):
+                temperature, relative_humidity = self._compensation.read()
+                with self._bus.lock:
+                    if temperature is not None and relative_humidity is not None:
+                        self._logger.info(f"Using temperature: {temperature}, relative_humidity: {relative_humidity} for conditioning")
+                        voc_raw = self._sgp41.conditioning(temperature=temperature, relative_humidity=relative_humidity)
+                    else:
+                        voc_raw = self._sgp41.conditioning()
+                voc_index = self._voc_algorithm.process(voc_raw.ticks)
+                self._logger.info(f"VOC index (conditioning): {voc_index}")
+                time.sleep(1)
+        except Exception:
+            self._i2c_transceiver.close()
+            raise
+        self._logger.info("Measuring VOC+NOx...")
+
+    def sample(self):
         timestamp = datetime.now(timezone.utc)
 
-        temperature, relative_humidity = persistent_storage.read_temperature_relative_humidity_data()
-        if temperature is not None and relative_humidity is not None:
-            raw_voc, raw_nox = sgp41.measure_raw(temperature=temperature, relative_humidity=relative_humidity)
-        else:
-            raw_voc, raw_nox = sgp41.measure_raw()
+        temperature, relative_humidity = self._compensation.read()
+        with self._bus.lock:
+            if temperature is not None and relative_humidity is not None:
+                raw_voc, raw_nox = self._sgp41.measure_raw(temperature=temperature, relative_humidity=relative_humidity)
+            else:
+                raw_voc, raw_nox = self._sgp41.measure_raw()
 
-        voc_index = voc_algorithm.process(raw_voc.ticks)
-        nox_index = nox_algorithm.process(raw_nox.ticks)
-        persistent_storage.write_sgp41_data(timestamp, voc_index, nox_index)
+        voc_index = self._voc_algorithm.process(raw_voc.ticks)
+        nox_index = self._nox_algorithm.process(raw_nox.ticks)
+        self._storage.write_sgp41_data(timestamp, voc_index, nox_index)
 
         local_time = timestamp.astimezone().strftime('%d/%m/%Y, %H:%M:%S')
         print(f'Timestamp: {local_time}, VOC index: {voc_index}, NOx index: {nox_index}', flush=True)
-        time.sleep(SLEEP_DURATION_SECONDS)
\ No newline at end of file
+
+    def close(self):
+        self._i2c_transceiver.close()
+
+
+if __name__ == "__main__":
+    VocNoxSensor(PersistentStorage(), SharedI2CBus()).run()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+import math
+import os
+import threading
+
+
+class WriteCompressor:
+    """Swinging door compression of the records written by a sensor service:
+    a record is dropped when the stored series, interpolated linearly between
+    the records kept before and after it, is within the tolerance of each of
+    its fields. Only the measurements of TOLERANCES are compressed, their
+    fields without a tolerance must stay on a straight line exactly.
+
+    For each measurement, the last record kept is the pivot of a door per
+    field: the range of slopes of the lines from the pivot that pass within
+    the tolerance of every record dropped since. The newest record is held
+    back until the next one arrives. If the line from the pivot to the next
+    one is within the door widened to the held record, the held record is
+    dropped. Otherwise it is written and becomes the pivot. It is also written when
+    HEARTBEAT_SEC passed since the pivot, so that the stored series never
+    has a gap longer than that while the sensor runs, and when a field
+    appears, disappears or has a value that is not a number. The held records
+    are written on close.
+
+    Enabled with AQ_WRITE_COMPRESSION=on, the tolerances and heartbeat can be
+    set instead of on, e.g. ltr390.visible_light_lux=2,bmp390l.pressure=0.1,heartbeat=120."""
+    # measurement: {field: largest error of the stored series}
+    TOLERANCES = {
+        "ltr390": {"visible_light_lux": 0.5, "uv_index": 0.05},
+        "bmp390l": {"temperature": 0.05, "pressure": 0.05, "altitude": 0.5},
+        "scd41": {"co2": 10, "temperature": 0.1, "relative_humidity": 0.5}
+    }
+    # below PersistentStorage.LATEST_MAX_AGE_SEC, when the latest records are read from the backend
+    HEARTBEAT_SEC = 5 * 60
+
+    class Series:
+        """Compression state of a measurement"""
+        def __init__(self, measurement):
+            self.measurement = measurement
+            self.pivot_ms = None
+            self.pivot = None # fields of the last record kept
+            self.held = None # newest record, not written yet
+            self.doors = {} # field: (lowest slope, highest slope) from the pivot
+            self.received = 0
+            self.stored = 0
+            self.shared = 0 # records kept for all the fields: first, heartbeat or other
+            self.breaks = {} # field: records kept because its door closed
+
+    def __init__(self, tolerances=None, heartbeat_sec=HEARTBEAT_SEC):
+        self._tolerances = self.TOLERANCES if tolerances is None else tolerances
+        self._heartbeat_ms = heartbeat_sec * 1000
+        self._lock = threading.Lock()
+        self._series = {} # (database, measurement): Series
+
+    @classmethod
+    def configured(cls):
+        """The WriteCompressor set by AQ_WRITE_COMPRESSION, None when disabled"""
+        value = os.environ.get("AQ_WRITE_COMPRESSION", "off").strip()
+        if value.lower() in ("off", "false", "0", ""):
+            return None
+        tolerances = {measurement: dict(fields) for measurement, fields in cls.TOLERANCES.items()}
+        heartbeat_sec = cls.HEARTBEAT_SEC
+        if value.lower() not in ("on", "true", "1"):
+            for entry in value.split(","):
+                try:
+                    name, number = entry.split("=")
+                    name = name.strip()
+                    if "heartbeat" == name:
+                        heartbeat_sec = float(number)
+                    else:
+                        measurement, field = name.split(".")
+                        tolerances.setdefault(measurement, {})[field] = float(number)
+                except ValueError:
+                    raise ValueError(f"Invalid AQ_WRITE_COMPRESSION entry '{entry}', "
+                                     f"expected <measurement>.<field>=<tolerance> or heartbeat=<sec>")
+        return cls(tolerances, heartbeat_sec)
+
+    @staticmethod
+    def _is_number(value):
+        return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+    def _open_doors(self, series, time_ms, fields):
+        """Doors of the fields once the held record is dropped, and the fields whose line from
+        the pivot to the record would then leave the door"""
+        tolerances = self._tolerances[series.measurement]
+        _, held_ms, held = series.held
+        doors = {}
+        broken = []
+        for field, value in fields.items():
+            pivot = series.pivot[field]
+            tolerance = tolerances.get(field, 0.0)
+            low = (held[field] - tolerance - pivot) / (held_ms - series.pivot_ms)
+            high = (held[field] + tolerance - pivot) / (held_ms - series.pivot_ms)
+            door = series.doors.get(field)
+            if door is not None:
+                low, high = max(low, door[0]), min(high, door[1])
+            slope = (value - pivot) / (time_ms - series.pivot_ms)
+            if not low <= slope <= high:
+                broken.append(field)
+            doors[field] = (low, high)
+        return doors, broken
+
+    def _keep(self, series, kept, record):
+        kept.append(record)
+        series.stored += 1
+        series.pivot_ms = record[1]
+        series.pivot = record[2]
+        series.doors = {}
+        series.held = None
+
+    def _compress(self, series, record, kept):
+        _, time_ms, fields = record
+        series.received += 1
+        last_ms = series.held[1] if series.held is not None else series.pivot_ms
+        if series.pivot is None or time_ms <= last_ms or fields.keys() != series.pivot.keys() or \
+                not all(self._is_number(value) for value in fields.values()):
+            # first record, out of order, other fields or values that cannot be interpolated
+            if series.held is not None:
+                self._keep(series, kept, series.held)
+                series.shared += 1
+            self._keep(series, kept, record)
+            series.shared += 1
+            return
+        if series.held is None:
+            if time_ms - series.pivot_ms >= self._heartbeat_ms:
+                self._keep(series, kept, record)
+                series.shared += 1
+            else:
+                series.held = record
+            return
+        if time_ms - series.pivot_ms >= self._heartbeat_ms:
+            series.shared += 1
+        else:
+            doors, broken = self._open_doors(series, time_ms, fields)
+            if not broken:
+                # the held record is on the line from the pivot to this one, within the tolerance
+                series.doors = doors
+                series.held = record
+                return
+            for field in broken:
+                series.breaks[field] = series.breaks.get(field, 0) + 1
+        self._keep(series, kept, series.held)
+        series.held = record
+
+    def compress(self, database, records):
+        """The records to write now among (measurement, time in ms, {field: value}) records, in the same order"""
+        kept = []
+        with self._lock:
+            for record in records:
+                measurement = record[0]
+                if measurement not in self._tolerances:
+                    kept.append(record)
+                    continue
+                series = self._series.get((database, measurement))
+                if series is None:
+                    series = WriteCompressor.Series(measurement)
+                    self._series[(database, measurement)] = series
+                self._compress(series, record, kept)
+        return kept
+
+    def flush(self):
+        """{database: records} held back, to write before closing"""
+        held = {}
+        with self._lock:
+            for (database, _), series in self._series.items():
+                if series.held is not None:
+                    held.setdefault(database, []).append(series.held)
+                    self._keep(series, [], series.held)
+                    series.shared += 1
+        return held
+
+    def get_statistics(self):
+        """{"<database>/<measurement>": {"received", "stored", "ratio", "fields": {field: {"stored", "ratio"}}}},
+        the records stored for a field being those kept because of it plus those kept for all the fields"""
+        with self._lock:
+            statistics = {}
+            for (database, measurement), series in self._series.items():
+                fields = {}
+                for field in series.pivot or {}:
+                    stored = series.shared + series.breaks.get(field, 0)
+                    fields[field] = {"stored": stored, "ratio": series.received / stored if stored else None}
+                statistics[f"{database}/{measurement}"] = {
+                    "received": series.received,
+                    "stored": series.stored,
+                    "ratio": series.received / series.stored if series.stored else None,
+                    "fields": fields
+                }
+            return statistics
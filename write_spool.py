@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+
+from logger_configurator import LoggerConfigurator
+from line_protocol import LineProtocol
+import os
+import threading
+import time
+
+
+class WriteSpool:
+    """Append only spool of the records that could not be written, one directory
+    per database holding line protocol segment files:
+
+        <first time in ms>-<pid>-<sequence>.open        being appended by pid
+        <first time in ms>-<pid>-<sequence>.lp          sealed, waiting for replay
+        <...>.lp renamed to <...>.<pid>.replaying       being replayed by pid
+
+    A process appends to its own open segment, which is sealed when it reaches
+    MAX_SEGMENT_BYTES or MAX_SEGMENT_AGE_SEC, or when the spool is closed. The
+    appends are flushed to the OS at once and fsynced by the background thread
+    every FSYNC_INTERVAL_SEC, so that a power loss costs at most that much.
+
+    The same thread replays the sealed segments, oldest first, every
+    REPLAY_INTERVAL_SEC in batches of REPLAY_BATCH_RECORDS. Any process can
+    replay any segment: it claims it with an atomic rename, and the segments
+    left open or claimed by a process that died are replayed too. A failed
+    segment is renamed back and retried later. Replaying a batch twice is
+    harmless, a record overwrites the same fields at the same time. Beyond
+    MAX_DATABASE_BYTES of sealed segments in a database, the oldest are deleted."""
+    MAX_SEGMENT_BYTES = 4 * 1024 * 1024
+    MAX_SEGMENT_AGE_SEC = 60
+    FSYNC_INTERVAL_SEC = 1
+    REPLAY_INTERVAL_SEC = 10
+    REPLAY_BATCH_RECORDS = 5000
+    # how long the writes go straight to the spool after a failed write
+    RETRY_INTERVAL_SEC = 30
+    MAX_DATABASE_BYTES = 256 * 1024 * 1024
+    OPEN_SUFFIX = ".open"
+    SEALED_SUFFIX = ".lp"
+    REPLAYING_SUFFIX = ".replaying"
+
+    class Segment:
+        def __init__(self, path):
+            self.path = path
+            self.file = open(path, "ab")
+            self.opened = time.monotonic()
+            self.size = 0
+            self.synced = True
+
+    def __init__(self, directory, write_records):
+        """write_records(database, records) writes a batch to the backend, raising when it fails"""
+        self._logger = LoggerConfigurator.configure_logger(self.__class__.__name__)
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._write_records = write_records
+        self._lock = threading.Lock()
+        self._segments = {} # database: open Segment of this process
+        self._sequence = 0
+        self._unreachable_until = 0
+        self._spooled_count = 0
+        self._replayed_count = 0
+        self._dropped_bytes = 0
+        self._invalid_line_count = 0
+        self._closed = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def is_unreachable(self):
+        """True if a write failed recently and the writes should go to the spool"""
+        return time.monotonic() < self._unreachable_until
+
+    def report_failure(self):
+        self._unreachable_until = time.monotonic() + self.RETRY_INTERVAL_SEC
+
+    def append(self, database, records):
+        lines = LineProtocol.encode_all(records)
+        if not lines:
+            return
+        data = lines.encode("utf-8")
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The write spool is closed")
+            segment = self._segments.get(database)
+            if segment is None:
+                segment = self._open_segment(database, records[0][1])
+            segment.file.write(data)
+            segment.file.flush()
+            segment.size += len(data)
+            segment.synced = False
+            self._spooled_count += len(records)
+            if segment.size >= self.MAX_SEGMENT_BYTES:
+                self._seal(database)
+
+    def _open_segment(self, database, time_ms):
+        # called with the lock held
+        directory = os.path.join(self._directory, database)
+        os.makedirs(directory, exist_ok=True)
+        self._sequence += 1
+        name = f"{int(time_ms):013d}-{os.getpid()}-{self._sequence:06d}{self.OPEN_SUFFIX}"
+        segment = WriteSpool.Segment(os.path.join(directory, name))
+        self._segments[database] = segment
+        return segment
+
+    def _seal(self, database):
+        # called with the lock held
+        segment = self._segments.pop(database)
+        segment.file.flush()
+        os.fsync(segment.file.fileno())
+        segment.file.close()
+        os.rename(segment.path, segment.path[:-len(self.OPEN_SUFFIX)] + self.SEALED_SUFFIX)
+        self._enforce_limit(database)
+
+    def _enforce_limit(self, database):
+        directory = os.path.join(self._directory, database)
+        sealed = sorted(name for name in os.listdir(directory) if name.endswith(self.SEALED_SUFFIX))
+        sizes = {name: os.path.getsize(os.path.join(directory, name)) for name in sealed}
+        total = sum(sizes.values())
+        while total > self.MAX_DATABASE_BYTES and len(sealed) > 1:
+            name = sealed.pop(0)
+            try:
+                os.unlink(os.path.join(directory, name))
+            except FileNotFoundError:
+                # claimed by a replayer meanwhile
+                pass
+            total -= sizes[name]
+            self._dropped_bytes += sizes[name]
+            self._logger.error(f"Spool of {database} is full, {name} deleted, {self._dropped_bytes} bytes dropped so far")
+
+    def _sync(self):
+        """fsync the appended segments, seal the ones due"""
+        with self._lock:
+            now = time.monotonic()
+            for database, segment in list(self._segments.items()):
+                if now - segment.opened >= self.MAX_SEGMENT_AGE_SEC:
+                    self._seal(database)
+                elif not segment.synced:
+                    os.fsync(segment.file.fileno())
+                    segment.synced = True
+
+    @staticmethod
+    def _is_alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _claimable(self, database):
+        """Segments of database that can be replayed, oldest first"""
+        names = []
+        for name in os.listdir(os.path.join(self._directory, database)):
+            try:
+                if name.endswith(self.SEALED_SUFFIX):
+                    names.append(name)
+                elif name.endswith(self.OPEN_SUFFIX):
+                    # left by a process that died
+                    if not self._is_alive(int(name.split("-")[1])):
+                        names.append(name)
+                elif name.endswith(self.REPLAYING_SUFFIX):
+                    # claimed by a process that died
+                    if not self._is_alive(int(name.split(".")[1])):
+                        names.append(name)
+            except (IndexError, ValueError):
+                continue
+        return sorted(names)
+
+    def _replay_segment(self, database, path):
+        """True if all the records of the segment were written"""
+        batch = []
+        with open(path, "rb") as segment:
+            for line in segment:
+                try:
+                    batch.append(LineProtocol.decode(line.decode("utf-8").rstrip("\n")))
+                except (ValueError, UnicodeDecodeError) as e:
+                    # the last line may be torn by a crash
+                    self._invalid_line_count += 1
+                    self._logger.warning(f"Invalid line skipped in {path}: {e}")
+                    continue
+                if len(batch) >= self.REPLAY_BATCH_RECORDS:
+                    if not self._replay_batch(database, batch):
+                        return False
+                    batch = []
+        return not batch or self._replay_batch(database, batch)
+
+    def _replay_batch(self, database, batch):
+        try:
+            self._write_records(database, batch)
+        except Exception as e:
+            self._logger.warning(f"Cannot replay {len(batch)} spooled records to {database}, retrying in {self.REPLAY_INTERVAL_SEC} s: {e}")
+            return False
+        self._replayed_count += len(batch)
+        return True
+
+    def _replay(self):
+        """Replay every claimable segment, False at the first one that fails"""
+        if not self.is_unreachable():
+            # the backend looks healthy, let the records of this process be replayed as well
+            with self._lock:
+                for database in list(self._segments):
+                    self._seal(database)
+        for database in sorted(os.listdir(self._directory)):
+            if not os.path.isdir(os.path.join(self._directory, database)):
+                continue
+            for name in self._claimable(database):
+                base = name.split(".")[0]
+                path = os.path.join(self._directory, database, name)
+                claimed = os.path.join(self._directory, database, f"{base}.{os.getpid()}{self.REPLAYING_SUFFIX}")
+                try:
+                    os.rename(path, claimed)
+                except FileNotFoundError:
+                    # claimed by another process
+                    continue
+                if not self._replay_segment(database, claimed):
+                    os.rename(claimed, os.path.join(self._directory, database, base + self.SEALED_SUFFIX))
+                    self.report_failure()
+                    return False
+                os.unlink(claimed)
+                self._logger.info(f"Replayed {name} of {database}, {self._replayed_count} records replayed so far")
+        self._unreachable_until = 0
+        return True
+
+    def _run(self):
+        last_replay = 0
+        while not self._stop.wait(self.FSYNC_INTERVAL_SEC):
+            try:
+                self._sync()
+                if time.monotonic() - last_replay >= self.REPLAY_INTERVAL_SEC:
+                    last_replay = time.monotonic()
+                    self._replay()
+            except Exception as e:
+                self._logger.error(f"Write spool error: {e}")
+
+    def close(self):
+        """Seal the segments of this process, they are replayed by the next process using the spool"""
+        self._stop.set()
+        self._thread.join()
+        with self._lock:
+            self._closed = True
+            for database in list(self._segments):
+                self._seal(database)
+
+    def get_statistics(self):
+        pending_bytes = 0
+        for database in os.listdir(self._directory):
+            directory = os.path.join(self._directory, database)
+            if os.path.isdir(directory):
+                for name in os.listdir(directory):
+                    try:
+                        pending_bytes += os.path.getsize(os.path.join(directory, name))
+                    except FileNotFoundError:
+                        pass
+        return {
+            "spooled": self._spooled_count,
+            "replayed": self._replayed_count,
+            "pending_bytes": pending_bytes,
+            "dropped_bytes": self._dropped_bytes,
+            "invalid_lines": self._invalid_line_count,
+            "unreachable": self.is_unreachable()
+        }